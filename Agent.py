@@ -7,15 +7,15 @@ class Agent:
     Attributes
     ----------
     state : int
-        State of the agent
+        State of the agent, the state of its group while it belongs to one
     group : Group
-        Group the agent belongs to
+        Group the agent belongs to, following merges
     position : tuple
         Position of the agent in the grid
     days_dissipate : int
         Number of days the agent has been dissipating
     center_group : tuple
-        The center position of the group
+        The center position of the group, as given by the group unless set explicitly
 
     Methods
     -------
@@ -33,21 +33,62 @@ class Agent:
         :param state: State of the agent
         """
         assert isinstance(state, (np.int32, np.int64)), "State must be an integer"
+        self._group = None
         self.state = state
-        self.group = None
         self.position = None
         self.days_dissipate = 0
-        self.center_group = None
-
-
-
-    def move(self, i, j, density_grid, grid):
+        self._center_group = None
+
+    @property
+    def state(self):
+        # Members take the state of their group, so group transitions touch no agent
+        group = self._group
+        if group is None:
+            return self._state
+        if group.merged_into is not None:
+            group = self.group
+        return group.state
+
+    @state.setter
+    def state(self, state):
+        # An agent with a state of its own no longer follows its group
+        self._state = state
+        self._group = None
+
+    @property
+    def group(self):
+        group = self._group
+        if getattr(group, 'merged_into', None) is None:
+            return group
+
+        # Follow merged groups to the group that absorbed them, and shorten the path
+        while group.merged_into is not None:
+            group = group.merged_into
+        self._group = group
+        return group
+
+    @group.setter
+    def group(self, group):
+        self._group = group
+
+    @property
+    def center_group(self):
+        if self._center_group is not None or self.group is None:
+            return self._center_group
+        return self.group.last_center
+
+    @center_group.setter
+    def center_group(self, center):
+        self._center_group = center
+
+    def move(self, i, j, density_grid, free_density):
         """
         Returns the new position of the agent if the agent is not dissipating
 
         :param i: Vertical position of the agent
         :param j: Horizontal position of the agent
-        :param grid: Grid with the densities of the agents
+        :param density_grid: Grid with the densities of the agents
+        :param free_density: Grid with the densities of the empty cells, 0 for occupied cells
         :return: New position of the agent
         """
 
@@ -58,9 +99,9 @@ class Agent:
                 if di == 0 and dj == 0:
                     continue
 
-                ni, nj = (i + di) % grid.shape[0], (j + dj) % density_grid.shape[1]
+                ni, nj = (i + di) % density_grid.shape[0], (j + dj) % density_grid.shape[1]
                 movement.append((ni, nj))
-                densities.append(density_grid[ni, nj] * (grid[ni, nj].state == 0))
+                densities.append(free_density[ni, nj])
         densities_sum = np.sum(densities)
 
         # Probabilistic movement when the agent is in state 1
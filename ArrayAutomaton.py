@@ -0,0 +1,766 @@
+import time
+
+import numpy as np
+from cluster_analysis import label_clusters, cluster_columns
+from startup import lazy_jit
+
+# Rows of the agent table, one column per agent
+STATE, DAYS, GROUP, POS_I, POS_J, NEXT = range(6)
+
+# Rows of the group table, one column per group slot
+G_STATE, G_STEPS, G_SIZE, G_HEAD, G_TAIL, G_CI, G_CJ, G_CGI, G_CGJ, G_MERGED, G_REFS, G_UID = range(12)
+
+# Entries of the counters
+N_LIVE, N_FREE, NEXT_UID, N_STEPS = range(4)
+
+# Entries of the parameters
+P_PROTO_SIZE, P_STAR_SIZE, P_STAR, P_DISSIPATION, P_RADIUS, P_CLUSTER_EVERY = range(6)
+
+# Columns of the per step statistics, after the counts of states 0 to 4, followed by the
+# cluster statistics of cluster_analysis when clusters are analyzed
+STAT_GROUPS, STAT_BORN, STAT_CLUSTERS = 5, 6, 7
+
+
+@lazy_jit(nopython=True)
+def _seed(seed):
+    """
+    Seeds the random generator of the compiled kernels
+
+    :param seed: Seed
+    """
+    np.random.seed(seed)
+
+
+@lazy_jit(nopython=True)
+def _density(occ, agents, density, tmp, radius):
+    """
+    Writes the density of agents in a given radius around each position, like density_grid,
+    with two sliding window passes instead of a full stencil per cell
+
+    :param occ: Agent in each cell
+    :param agents: Agent table
+    :param density: Output density of each cell
+    :param tmp: Scratch array with the shape of the grid
+    :param radius: Radius around the agent
+    """
+    n, m = occ.shape
+    for i in range(n):
+        total = 0
+        for dj in range(-radius, radius + 1):
+            total += agents[STATE, occ[i, dj % m]]
+        for j in range(m):
+            tmp[i, j] = total
+            total += agents[STATE, occ[i, (j + radius + 1) % m]] - agents[STATE, occ[i, (j - radius) % m]]
+
+    for j in range(m):
+        total = 0
+        for di in range(-radius, radius + 1):
+            total += tmp[di % n, j]
+        for i in range(n):
+            density[i, j] = 100 * (total - agents[STATE, occ[i, j]])
+            total += tmp[(i + radius + 1) % n, j] - tmp[(i - radius) % n, j]
+
+
+@lazy_jit(nopython=True)
+def _nearest(value):
+    """
+    Returns the nearest of -1, 0 and 1 to a value, ties going to the first, like find_nearest
+
+    :param value: Value
+    :return: Nearest of -1, 0 and 1
+    """
+    if value <= -0.5:
+        return -1
+    if value <= 0.5:
+        return 0
+    return 1
+
+
+@lazy_jit(nopython=True)
+def _new_group(agent, agents, groups, live, free, meta):
+    """
+    Creates a proto-star group containing one agent
+
+    :param agent: Agent starting the group
+    :param agents: Agent table
+    :param groups: Group table
+    :param live: Slots of the live groups, in creation order
+    :param free: Stack of free group slots
+    :param meta: Counters
+    :return: Slot of the new group
+    """
+    meta[N_FREE] -= 1
+    g = free[meta[N_FREE]]
+    groups[G_STATE, g] = 2
+    groups[G_STEPS, g] = 0
+    groups[G_SIZE, g] = 1
+    groups[G_HEAD, g] = agent
+    groups[G_TAIL, g] = agent
+    groups[G_MERGED, g] = 0
+    groups[G_REFS, g] = 0
+    groups[G_UID, g] = meta[NEXT_UID]
+    meta[NEXT_UID] += 1
+
+    agents[STATE, agent] = 2
+    agents[GROUP, agent] = g
+    agents[NEXT, agent] = -1
+
+    live[meta[N_LIVE]] = g
+    meta[N_LIVE] += 1
+    return g
+
+
+@lazy_jit(nopython=True)
+def _append(g, agent, agents, groups):
+    """
+    Appends an agent to a group
+
+    :param g: Group slot
+    :param agent: Agent to be added to the group
+    :param agents: Agent table
+    :param groups: Group table
+    """
+    agents[STATE, agent] = groups[G_STATE, g]
+    agents[GROUP, agent] = g
+    agents[NEXT, agent] = -1
+    agents[NEXT, groups[G_TAIL, g]] = agent
+    groups[G_TAIL, g] = agent
+    groups[G_SIZE, g] += 1
+
+
+@lazy_jit(nopython=True)
+def _merge(a, b, agents, groups):
+    """
+    Merges group b into group a
+
+    :param a: Slot of the group that remains
+    :param b: Slot of the group that is merged
+    :param agents: Agent table
+    :param groups: Group table
+    """
+    member = groups[G_HEAD, b]
+    while member != -1:
+        agents[STATE, member] = groups[G_STATE, a]
+        agents[GROUP, member] = a
+        member = agents[NEXT, member]
+
+    agents[NEXT, groups[G_TAIL, a]] = groups[G_HEAD, b]
+    groups[G_TAIL, a] = groups[G_TAIL, b]
+    groups[G_SIZE, a] += groups[G_SIZE, b]
+    groups[G_MERGED, b] = 1
+    groups[G_STEPS, a] = max(groups[G_STEPS, a], groups[G_STEPS, b])
+
+
+@lazy_jit(nopython=True)
+def _set_members(g, state, agents, groups):
+    """
+    Sets the state of every member of a group
+
+    :param g: Group slot
+    :param state: New state
+    :param agents: Agent table
+    :param groups: Group table
+    """
+    member = groups[G_HEAD, g]
+    while member != -1:
+        agents[STATE, member] = state
+        member = agents[NEXT, member]
+
+
+@lazy_jit(nopython=True)
+def _center(g, agents, groups):
+    """
+    Calculates the center of a group from the positions of its members
+
+    :param g: Group slot
+    :param agents: Agent table
+    :param groups: Group table
+    :return: Center of the group
+    """
+    total_i = 0
+    total_j = 0
+    counter = 0
+    member = groups[G_HEAD, g]
+    while member != -1:
+        total_i += agents[POS_I, member]
+        total_j += agents[POS_J, member]
+        counter += 1
+        member = agents[NEXT, member]
+    return int(np.rint(total_i / counter)), int(np.rint(total_j / counter))
+
+
+@lazy_jit(nopython=True)
+def _dissipate(agent, i, j, size, agents, groups):
+    """
+    Returns the new position of a dissipating agent, like Agent.dissipate
+
+    :param agent: Dissipating agent
+    :param i: Vertical position of the agent
+    :param j: Horizontal position of the agent
+    :param size: Size of the grid
+    :param agents: Agent table
+    :param groups: Group table
+    :return: New position of the agent
+    """
+    g = agents[GROUP, agent]
+    quarter = groups[G_SIZE, g] / 4
+    far_i = abs(groups[G_CGI, g] - i) > quarter
+    far_j = abs(groups[G_CGJ, g] - j) > quarter
+
+    if far_i and far_j:
+        return (i - _nearest(i - size / 2)) % size, (j - _nearest(j - size / 2)) % size
+
+    move_i = _nearest(i - groups[G_CI, g])
+    move_j = _nearest(j - groups[G_CJ, g])
+
+    # If the direction is 0,0, choose a random direction
+    if move_i == 0 and move_j == 0:
+        direction = np.random.randint(0, 8)
+        move_i = (-1, 1, 0, 0, -1, -1, 1, 1)[direction]
+        move_j = (0, 0, -1, 1, -1, 1, -1, 1)[direction]
+
+    i = i - move_i if far_i else i + move_i
+    j = j - move_j if far_j else j + move_j
+    return i % size, j % size
+
+
+@lazy_jit(nopython=True)
+def _move(agent, i, j, occ, agents, density):
+    """
+    Returns the new position of a gas, proto-star or star agent, like Agent.move
+
+    :param agent: Moving agent
+    :param i: Vertical position of the agent
+    :param j: Horizontal position of the agent
+    :param occ: Agent in each cell before moving
+    :param agents: Agent table
+    :param density: Density of each cell
+    :return: New position of the agent, or (-1, -1) if it stays
+    """
+    n, m = occ.shape
+    total = 0
+    best = -1
+    best_i, best_j = -1, -1
+    for di in range(-1, 2):
+        for dj in range(-1, 2):
+            if di == 0 and dj == 0:
+                continue
+            ni, nj = (i + di) % n, (j + dj) % m
+            weight = density[ni, nj] if agents[STATE, occ[ni, nj]] == 0 else 0
+            total += weight
+            if weight > best:
+                best, best_i, best_j = weight, ni, nj
+
+    # Probabilistic movement when the agent is in state 1
+    if agents[STATE, agent] == 1:
+        if total == 0:
+            k = np.random.randint(0, 8)
+        else:
+            u = np.random.random() * total
+            acc = 0
+            k = 0
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    if di == 0 and dj == 0:
+                        continue
+                    ni, nj = (i + di) % n, (j + dj) % m
+                    weight = density[ni, nj] if agents[STATE, occ[ni, nj]] == 0 else 0
+                    acc += weight
+                    if weight > 0 and acc > u:
+                        return ni, nj
+            return best_i, best_j
+
+        k = k + 1 if k >= 4 else k
+        return (i + k // 3 - 1) % n, (j + k % 3 - 1) % m
+
+    # Deterministic movement when the agent is in state 2 or 3
+    if density[i, j] < density[best_i, best_j]:
+        return best_i, best_j
+    return -1, -1
+
+
+@lazy_jit(nopython=True)
+def _interact(occ, agents, groups, live, free, meta, params):
+    """
+    Forms, grows and merges groups in row-major order, like the second loop of
+    CellularAutomaton.update
+
+    :param occ: Agent in each cell
+    :param agents: Agent table
+    :param groups: Group table
+    :param live: Slots of the live groups, in creation order
+    :param free: Stack of free group slots
+    :param meta: Counters
+    :param params: Parameters
+    """
+    n, m = occ.shape
+    for i in range(n):
+        for j in range(m):
+            agent = occ[i, j]
+            state = agents[STATE, agent]
+
+            if state == 1:
+                # Count neighbours in state 1
+                count = 0
+                for di in range(-3, 4):
+                    for dj in range(-3, 4):
+                        if (di != 0 or dj != 0) and agents[STATE, occ[(i + di) % n, (j + dj) % m]] == 1:
+                            count += 1
+
+                if count > params[P_PROTO_SIZE]:
+                    g = _new_group(agent, agents, groups, live, free, meta)
+                    for di in range(-3, 4):
+                        for dj in range(-3, 4):
+                            neighbour = occ[(i + di) % n, (j + dj) % m]
+                            if (di != 0 or dj != 0) and agents[STATE, neighbour] == 1:
+                                _append(g, neighbour, agents, groups)
+                    continue
+
+                # Join the group of the first neighbour in state 2, otherwise state 3
+                for target in (2, 3):
+                    joined = False
+                    for di in range(-1, 2):
+                        for dj in range(-1, 2):
+                            neighbour = occ[(i + di) % n, (j + dj) % m]
+                            if not joined and (di != 0 or dj != 0) and agents[STATE, neighbour] == target:
+                                _append(agents[GROUP, neighbour], agent, agents, groups)
+                                joined = True
+                    if joined:
+                        break
+
+            elif state == 2 or state == 3:
+                # Neighbours in state 2 or 3 are listed before any merge
+                listed = 0
+                bit = 0
+                for di in range(-1, 2):
+                    for dj in range(-1, 2):
+                        if di != 0 or dj != 0:
+                            if 2 <= agents[STATE, occ[(i + di) % n, (j + dj) % m]] <= 3:
+                                listed |= 1 << bit
+                            bit += 1
+
+                bit = 0
+                for di in range(-1, 2):
+                    for dj in range(-1, 2):
+                        if di == 0 and dj == 0:
+                            continue
+                        if listed & (1 << bit):
+                            neighbour = occ[(i + di) % n, (j + dj) % m]
+                            own, other = agents[GROUP, agent], agents[GROUP, neighbour]
+                            if own != other:
+                                # Merge lower state group into higher state group
+                                if agents[STATE, neighbour] > agents[STATE, agent]:
+                                    _merge(other, own, agents, groups)
+                                else:
+                                    _merge(own, other, agents, groups)
+                        bit += 1
+
+
+@lazy_jit(nopython=True)
+def _update_groups(agents, groups, live, free, meta, params):
+    """
+    Updates every live group like Group.update and drops merged and dissipated groups
+
+    :param agents: Agent table
+    :param groups: Group table
+    :param live: Slots of the live groups, in creation order
+    :param free: Stack of free group slots
+    :param meta: Counters
+    :param params: Parameters
+    :return: Number of groups that became a star
+    """
+    born = 0
+    kept = 0
+    for k in range(meta[N_LIVE]):
+        g = live[k]
+
+        # Merged groups have no members left
+        if groups[G_MERGED, g]:
+            free[meta[N_FREE]] = g
+            meta[N_FREE] += 1
+            continue
+
+        ci, cj = _center(g, agents, groups)
+        groups[G_CGI, g] = ci
+        groups[G_CGJ, g] = cj
+
+        if groups[G_STATE, g] == 2:
+            # Check if the group is big enough to become a star
+            if groups[G_STEPS, g] >= params[P_STAR] and groups[G_SIZE, g] >= params[P_STAR_SIZE]:
+                groups[G_STATE, g] = 3
+                _set_members(g, 3, agents, groups)
+                groups[G_STEPS, g] = 0
+                born += 1
+
+        elif groups[G_STEPS, g] >= params[P_DISSIPATION]:
+            # The slot is freed once every member went back to gas
+            groups[G_STATE, g] = 4
+            _set_members(g, 4, agents, groups)
+            groups[G_REFS, g] = groups[G_SIZE, g]
+            continue
+
+        groups[G_CI, g] = ci
+        groups[G_CJ, g] = cj
+        groups[G_STEPS, g] += 1
+        live[kept] = g
+        kept += 1
+
+    meta[N_LIVE] = kept
+    return born
+
+
+@lazy_jit(nopython=True)
+def _move_all(current, following, agents, groups, density, free, meta):
+    """
+    Moves every agent, reading the old occupation buffer and writing the new one, and
+    advances the dissipating agents
+
+    :param current: Agent in each cell before the moves
+    :param following: Agent in each cell after the moves, overwritten
+    :param agents: Agent table
+    :param groups: Group table
+    :param density: Density of each cell
+    :param free: Stack of free group slots
+    :param meta: Counters
+    """
+    n, m = current.shape
+    following[:, :] = current
+    for i in range(n):
+        for j in range(m):
+            agent = current[i, j]
+            agents[POS_I, agent] = i
+            agents[POS_J, agent] = j
+            state = agents[STATE, agent]
+
+            if 1 <= state <= 3:
+                new_i, new_j = _move(agent, i, j, current, agents, density)
+                if new_i >= 0 and agents[STATE, following[new_i, new_j]] == 0:
+                    following[new_i, new_j], following[i, j] = following[i, j], following[new_i, new_j]
+                    agents[POS_I, agent] = new_i
+                    agents[POS_J, agent] = new_j
+
+            elif state == 4:
+                new_i, new_j = _dissipate(agent, i, j, n, agents, groups)
+                following[new_i, new_j], following[i, j] = following[i, j], following[new_i, new_j]
+                agents[POS_I, agent] = new_i
+                agents[POS_J, agent] = new_j
+
+                # Update dissipation days and state
+                agents[DAYS, agent] += 1
+                if agents[DAYS, agent] >= 5:
+                    agents[DAYS, agent] = 0
+                    agents[STATE, agent] = 1
+                    g = agents[GROUP, agent]
+                    groups[G_REFS, g] -= 1
+                    if groups[G_REFS, g] == 0:
+                        free[meta[N_FREE]] = g
+                        meta[N_FREE] += 1
+
+
+@lazy_jit(nopython=True)
+def _record(stats, current, tmp, agents, meta, params, born, parent, flags, sizes):
+    """
+    Writes the statistics of a step and counts the step
+
+    :param stats: Output statistics of the step
+    :param current: Agent in each cell
+    :param tmp: Scratch buffer
+    :param agents: Agent table
+    :param meta: Counters
+    :param params: Parameters
+    :param born: Number of groups and stars formed during the step
+    :param parent: Cluster labeling scratch array, one entry per cell
+    :param flags: Cluster labeling scratch array, one entry per cell
+    :param sizes: Cluster labeling scratch array, one entry per cell
+    """
+    n, m = current.shape
+    for state in range(5):
+        stats[state] = 0
+    for i in range(n):
+        for j in range(m):
+            stats[agents[STATE, current[i, j]]] += 1
+    stats[STAT_GROUPS] = meta[N_LIVE]
+    stats[STAT_BORN] = born
+
+    # Label clusters on the state plane, the density scratch buffer is free by now
+    every = params[P_CLUSTER_EVERY]
+    if every > 0:
+        if meta[N_STEPS] % every == 0:
+            for i in range(n):
+                for j in range(m):
+                    tmp[i, j] = agents[STATE, current[i, j]]
+            label_clusters(tmp, parent, flags, sizes, stats[STAT_CLUSTERS:], True)
+        else:
+            stats[STAT_CLUSTERS:] = -1
+    meta[N_STEPS] += 1
+
+
+@lazy_jit(nopython=True)
+def _run(occ, occ_new, density, tmp, agents, groups, live, free, meta, params, stats, parent, flags, sizes):
+    """
+    Runs one complete step per row of stats without allocating, swapping the two
+    occupation buffers every step. Every params[P_CLUSTER_EVERY] steps the clusters of
+    occupied cells are labeled into the columns from STAT_CLUSTERS, other rows hold -1.
+
+    :param occ: Agent in each cell
+    :param occ_new: Second occupation buffer
+    :param density: Density buffer
+    :param tmp: Scratch buffer
+    :param agents: Agent table
+    :param groups: Group table
+    :param live: Slots of the live groups, in creation order
+    :param free: Stack of free group slots
+    :param meta: Counters
+    :param params: Parameters
+    :param stats: Output statistics, one row per step
+    :param parent: Cluster labeling scratch array, one entry per cell
+    :param flags: Cluster labeling scratch array, one entry per cell
+    :param sizes: Cluster labeling scratch array, one entry per cell
+    """
+    current, following = occ, occ_new
+    for step in range(stats.shape[0]):
+        _density(current, agents, density, tmp, params[P_RADIUS])
+        _move_all(current, following, agents, groups, density, free, meta)
+        current, following = following, current
+
+        _interact(current, agents, groups, live, free, meta, params)
+        born = _update_groups(agents, groups, live, free, meta, params)
+        _record(stats[step], current, tmp, agents, meta, params, born, parent, flags, sizes)
+
+
+class GroupRecord:
+    """
+    Class describing a live group of an ArrayAutomaton, groups compare equal by id
+
+    Attributes
+    ----------
+    id : int
+        Unique id of the group
+    state : int
+        State of the group
+    size : int
+        Size of the group
+    steps : int
+        Counter used to determine when transitions happen
+    center : tuple
+        Center of the group
+    """
+    def __init__(self, id, state, size, steps, center):
+        self.id = id
+        self.state = state
+        self.size = size
+        self.steps = steps
+        self.center = center
+
+    def __eq__(self, other):
+        return isinstance(other, GroupRecord) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class ArrayAutomaton:
+    """
+    Class running the rules of CellularAutomaton on preallocated arrays with a compiled
+    step, for long production runs. Agents and groups live in integer tables, and one
+    call runs any number of complete steps without returning to Python or allocating.
+    The random numbers come from numba's generator, so runs match the reference
+    engine statistically but not bit for bit.
+
+    Attributes
+    ----------
+    size : int
+        Size of the grid
+    proto_size : int
+        Size of the proto groups before they become a star group
+    star_size : int
+        Size of the star groups before they dissipate
+    star : int
+        Time needed for a proto-star to become a star
+    dissipation : int
+        Time needed for a star to dissipate
+    occ : numpy.ndarray
+        Agent in each cell
+    agents : numpy.ndarray
+        Agent table: state, dissipation days, group slot, position and next group member
+    group_table : numpy.ndarray
+        Group table, one column per group slot
+    cluster_every : int
+        Steps between two cluster labelings, 0 to not label clusters
+    telemetry : Telemetry
+        Receives the steps and the time of each phase of a step, None to run steps fused
+
+    Methods
+    -------
+    update(frame)
+        Runs one step
+    run(steps)
+        Runs several steps in one compiled call
+    get_grid_states()
+        Returns the grid states
+    get_group_labels()
+        Returns the id of the group each agent belongs to
+    get_group_statistics()
+        Returns the size, state and step counter of each group
+    """
+    def __init__(self, size, agent_probs, proto_size, star_size, steps_dissipating, initial_states=None, seed=None, cluster_every=0, telemetry=None):
+        """
+        Constructs a new array automaton
+
+        :param size: Size of the grid
+        :param agent_probs: Probabilities of an agent being in state 1
+        :param proto_size: Size of the proto groups before they become a star group
+        :param star_size: Size of the star groups before they dissipate
+        :param steps_dissipating: Steps dissipation
+        :param initial_states: Optional size x size array of initial states, used instead of agent_probs
+        :param seed: Seed of the compiled random generator, unseeded if None
+        :param cluster_every: Steps between two cluster labelings, 0 to not label clusters
+        :param telemetry: Optional Telemetry receiving the steps and the time of each phase of a step,
+                          steps then run one phase per compiled call
+        """
+        assert isinstance(size, int) and size > 0, "Size must be a positive integer"
+        assert isinstance(proto_size, int) and proto_size > 0, "Proto size must be a positive integer"
+        assert isinstance(star_size, int) and star_size > 0, "Star size must be a positive integer"
+        assert isinstance(agent_probs, (list, np.ndarray)), "agent_probs must be a list or numpy array"
+        assert isinstance(steps_dissipating, int) and steps_dissipating > 0, "Steps dissipating must be a positive integer"
+        assert all(0 <= p <= 1 for p in agent_probs), "Probabilities in agent_probs must be between 0 and 1"
+        assert initial_states is None or np.shape(initial_states) == (size, size), "initial_states must have shape (size, size)"
+        assert isinstance(cluster_every, int) and cluster_every >= 0, "cluster_every must be a non-negative integer"
+
+        self.size = size
+        self.cluster_every = cluster_every
+        self.telemetry = telemetry
+        self.proto_size = proto_size
+        self.star_size = star_size
+        self.star = 10
+        self.dissipation = steps_dissipating
+
+        if initial_states is None:
+            initial_states = np.random.choice([0, 1], size*size, p=agent_probs).reshape(size, size)
+        initial_states = np.asarray(initial_states, dtype=np.int64)
+
+        # Agent k starts in cell k
+        self.occ = np.arange(size * size, dtype=np.int64).reshape(size, size)
+        self.occ_new = np.empty_like(self.occ)
+        self.density = np.empty((size, size), dtype=np.int64)
+        self.tmp = np.empty((size, size), dtype=np.int64)
+
+        self.agents = np.zeros((6, size * size), dtype=np.int64)
+        self.agents[STATE] = initial_states.ravel()
+        self.agents[GROUP] = -1
+        self.agents[NEXT] = -1
+
+        # Every group slot in use holds a member, or was merged during the current step
+        capacity = 2 * int(np.count_nonzero(initial_states)) + 2
+        self.group_table = np.zeros((12, capacity), dtype=np.int64)
+        self.live = np.zeros(capacity, dtype=np.int64)
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int64)
+        self.meta = np.array([0, capacity, 0, 0], dtype=np.int64)
+        self.params = np.array([proto_size, star_size, self.star, steps_dissipating, 5, cluster_every], dtype=np.int64)
+
+        # Cluster labeling buffers, only allocated when clusters are analyzed
+        cells = size * size if cluster_every else 0
+        self.parent = np.empty(cells, dtype=np.int64)
+        self.flags = np.empty(cells, dtype=np.int8)
+        self.sizes = np.empty(cells, dtype=np.int64)
+
+        if seed is not None:
+            _seed(seed)
+
+    def run(self, steps):
+        """
+        Runs several steps in one compiled call
+
+        :param steps: Number of steps
+        :return: Statistics of each step: counts of states 0 to 4, number of groups and stars formed,
+                 and the cluster statistics from STAT_CLUSTERS if clusters are analyzed
+        """
+        columns = STAT_CLUSTERS + (cluster_columns(self.size) if self.cluster_every else 0)
+        stats = np.zeros((steps, columns), dtype=np.int64)
+        if self.telemetry:
+            self._run_phases(stats)
+            return stats
+
+        _run(self.occ, self.occ_new, self.density, self.tmp, self.agents, self.group_table,
+             self.live, self.free, self.meta, self.params, stats, self.parent, self.flags, self.sizes)
+
+        # The kernel swaps the buffers every step
+        if steps % 2:
+            self.occ, self.occ_new = self.occ_new, self.occ
+        return stats
+
+    def _run_phases(self, stats):
+        """
+        Runs one step per row of stats like _run, with one compiled call per phase so the
+        telemetry can time the phases. The steps and the random stream are the same.
+
+        :param stats: Output statistics, one row per step
+        """
+        telemetry = self.telemetry
+        for step in range(stats.shape[0]):
+            mark = time.perf_counter()
+            _density(self.occ, self.agents, self.density, self.tmp, self.params[P_RADIUS])
+            mark = telemetry.lap('density', mark)
+
+            _move_all(self.occ, self.occ_new, self.agents, self.group_table, self.density, self.free, self.meta)
+            self.occ, self.occ_new = self.occ_new, self.occ
+            mark = telemetry.lap('movement', mark)
+
+            _interact(self.occ, self.agents, self.group_table, self.live, self.free, self.meta, self.params)
+            mark = telemetry.lap('interaction', mark)
+
+            born = _update_groups(self.agents, self.group_table, self.live, self.free, self.meta, self.params)
+            _record(stats[step], self.occ, self.tmp, self.agents, self.meta, self.params, born, self.parent, self.flags, self.sizes)
+            telemetry.lap('groups', mark)
+            telemetry.step()
+
+    def update(self, frame):
+        """
+        Update the grid
+
+        :param frame: Current frame
+        :return: States of each agent in the grid
+        """
+        self.run(1)
+        return self.get_grid_states()
+
+    def get_grid_states(self):
+        """
+        Returns the state of each agent in the grid
+
+        :return: State of agents
+        """
+        return self.agents[STATE][self.occ]
+
+    def get_group_labels(self):
+        """
+        Returns the id of the group each agent belongs to
+
+        :return: Group id of each agent, -1 for agents in state 0 or 1
+        """
+        states = self.agents[STATE][self.occ]
+        labels = self.group_table[G_UID][self.agents[GROUP][self.occ]]
+        return np.where(states >= 2, labels, -1)
+
+    def get_group_statistics(self):
+        """
+        Returns the size, state and step counter of each group, sorted so engines with
+        different group ids or group orders can be compared
+
+        :return: Array with one (size, state, steps) row per group
+        """
+        slots = self.live[:self.meta[N_LIVE]]
+        statistics = sorted(zip(*(self.group_table[row, slots].tolist() for row in (G_SIZE, G_STATE, G_STEPS))))
+        return np.array(statistics, dtype=np.int64).reshape(-1, 3)
+
+    @property
+    def groups(self):
+        """
+        Live groups, in creation order
+
+        :return: List of GroupRecord
+        """
+        table = self.group_table
+        return [GroupRecord(int(table[G_UID, g]), int(table[G_STATE, g]), int(table[G_SIZE, g]),
+                            int(table[G_STEPS, g]), (int(table[G_CI, g]), int(table[G_CJ, g])))
+                for g in self.live[:self.meta[N_LIVE]]]
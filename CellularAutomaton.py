@@ -1,9 +1,13 @@
+import heapq
+import time
+
 import numpy as np
 from Group import Group
+from events import FORMED, MERGED, STAR, DISSIPATED, GAS
 from Agent import Agent
-from numba import jit
+from startup import lazy_jit
 
-@jit(nopython=True, parallel=True)
+@lazy_jit(warmup_args=lambda: (np.zeros((2, 2), dtype=np.int64),), nopython=True, parallel=True)
 def density_grid(states, radius=5):
     """
     Returns the density of agents in a given radius around a position
@@ -32,6 +36,22 @@ def density_grid(states, radius=5):
                     density[i, j] += (states[ni, nj] * 100)
     return density
 
+def _by_label(labels, rows, cols):
+    """
+    Splits cells by the group label at each of them
+
+    :param labels: Label of each cell
+    :param rows: Vertical position of each cell
+    :param cols: Horizontal position of each cell
+    :return: Pairs of a label and the list of its (i, j) cells
+    """
+    order = np.argsort(labels, kind='stable')
+    labels, rows, cols = labels[order], rows[order].tolist(), cols[order].tolist()
+    unique, starts = np.unique(labels, return_index=True)
+    bounds = starts.tolist() + [len(labels)]
+    return [(label, list(zip(rows[bounds[k]:bounds[k + 1]], cols[bounds[k]:bounds[k + 1]])))
+            for k, label in enumerate(unique.tolist())]
+
 class CellularAutomaton:
     """
     Class representing a cellular automaton
@@ -52,6 +72,17 @@ class CellularAutomaton:
         Time needed for a proto-star to become a star
     dissipation : int
         Time needed for a star to dissipate
+    events : EventLog
+        Log receiving the lifecycle events of the groups, None to not log them
+    telemetry : Telemetry
+        Reporter receiving the steps and phase timings, None to not time them
+    tuner : AutoTuner
+        Tuner choosing the backend of the densities and gas counts, None for the direct stencil
+    labels : numpy.ndarray
+        Id of the group of the member at each cell, moved along with the agents; only
+        meaningful for cells in state 2 or 3
+    frame : int
+        Current frame
 
     Methods
     -------
@@ -61,11 +92,23 @@ class CellularAutomaton:
         Returns a list of neighbours in a given radius around a position
     update(frame)
         Updates the grid and groups
+    track_moves(moves, states, moved_states)
+        Applies the swaps of the movement to the state and label planes and group frontiers
+    interaction_candidates(states=None)
+        Returns the cells where a group can form, grow or merge
+    interact(i, j)
+        Forms, grows or merges groups around an agent
+    emit(kind, group, size=None, parent=-1)
+        Logs a lifecycle event of a group
     get_grid_states()
         Returns the grid states
+    get_group_labels()
+        Returns the id of the group each agent belongs to
+    get_group_statistics()
+        Returns the size, state and step counter of each group
 
     """
-    def __init__(self, size, agent_probs, proto_size, star_size, steps_dissipating):
+    def __init__(self, size, agent_probs, proto_size, star_size, steps_dissipating, initial_states=None, events=None, telemetry=None, tuner=None):
         """
         Constructs a new cellular automaton
 
@@ -73,6 +116,10 @@ class CellularAutomaton:
         :param agent_probs: Probabilities of an agent being in state 1
         :param proto_size: Size of the proto groups before they become a star group
         :param star_size: Size of the star groups before they dissipate
+        :param initial_states: Optional size x size array of initial states, used instead of agent_probs
+        :param events: Optional EventLog receiving the lifecycle events of the groups
+        :param telemetry: Optional Telemetry receiving the steps and the time of each phase of a step
+        :param tuner: Optional AutoTuner choosing the fastest backend of the densities and gas counts, same results
         """
         assert isinstance(size, int) and size > 0, "Size must be a positive integer"
         assert isinstance(proto_size, int) and proto_size > 0, "Proto size must be a positive integer"
@@ -80,14 +127,28 @@ class CellularAutomaton:
         assert isinstance(agent_probs, (list, np.ndarray)), "agent_probs must be a list or numpy array"
         assert isinstance(steps_dissipating, int) and steps_dissipating > 0, "Steps dissipating must be a positive integer"
         assert all(0 <= p <= 1 for p in agent_probs), "Probabilities in agent_probs must be between 0 and 1"
+        assert initial_states is None or np.shape(initial_states) == (size, size), "initial_states must have shape (size, size)"
 
         self.size = size
         self.proto_size = proto_size
         self.star_size = star_size
-        self.grid = np.array([[Agent(state) for state in row] for row in np.random.choice([0, 1], size*size, p=agent_probs).reshape(size, size)], dtype=Agent)
+        if initial_states is None:
+            initial_states = np.random.choice([0, 1], size*size, p=agent_probs).reshape(size, size)
+        initial_states = np.asarray(initial_states, dtype=np.int64)
+
+        # Empty cells are never grouped nor change state, so they can share one agent and
+        # only gas cells need an agent of their own
+        self.grid = np.full((size, size), Agent(np.int64(0)), dtype=Agent)
+        occupied = np.nonzero(initial_states)
+        self.grid[occupied] = [Agent(state) for state in initial_states[occupied]]
         self.groups = []
         self.star = 10
         self.dissipation = steps_dissipating
+        self.events = events
+        self.telemetry = telemetry
+        self.tuner = tuner
+        self.frame = 0
+        self.labels = np.full((size, size), -1, dtype=np.int64)
 
     def get_density(self, i, j, radius=3):
         """
@@ -154,23 +215,41 @@ class CellularAutomaton:
         :param frame: Current frame
         :return: States of each agent in the grid
         """
-        # Get densities
-        densities = density_grid(self.get_grid_states())
+        self.frame = frame
+        telemetry = self.telemetry
+        if telemetry:
+            mark = time.perf_counter()
+
+        # Get densities, agents can only move to empty cells
+        states = self.get_grid_states()
+        densities = self.tuner.density(states) if self.tuner else density_grid(states)
+        free_densities = densities * (states == 0)
+        if telemetry:
+            mark = telemetry.lap('density', mark)
 
         # Create a new grid
         newGrid = np.copy(self.grid)
 
+        # Agents returning to gas, per group
+        returned = {}
+
+        # Swapped cells, and the states the agents leave the movement with, so the grid
+        # after moving needs no scan of the agents
+        moves = []
+        moved_states = states.copy()
+
         # Loop through each agent
         for i in range(self.size):
             for j in range(self.size):
                 # Get agent
                 agent = self.grid[i, j]
                 agent.position = (i, j)
+                state = states[i, j]
 
                 # If agent is not in state 0 nor 4
-                if agent.state == 1 or agent.state == 2 or agent.state == 3:
+                if state == 1 or state == 2 or state == 3:
                     # Determine direction to move
-                    direction = agent.move(i, j, densities, self.grid)
+                    direction = agent.move(i, j, densities, free_densities)
                     if direction:
                         new_i, new_j = direction
 
@@ -178,81 +257,55 @@ class CellularAutomaton:
                         if newGrid[new_i, new_j].state == 0:
                             newGrid[new_i, new_j], newGrid[i, j] = newGrid[i, j], newGrid[new_i, new_j]
                             agent.position = (new_i, new_j)
+                            moves.append((i * self.size + j, new_i * self.size + new_j))
 
                 # If agent is dissipating
-                if agent.state == 4:
+                if state == 4:
                     direction = agent.dissipate(i, j, self.size)
                     new_i, new_j = direction
 
                     # Update position
                     newGrid[new_i, new_j], newGrid[i, j] = newGrid[i, j], newGrid[new_i, new_j]
                     agent.position = (new_i, new_j)
+                    moves.append((i * self.size + j, new_i * self.size + new_j))
 
                     # Update dissipation days and state
                     agent.days_dissipate += 1
                     if agent.days_dissipate >= 5:
+                        if self.events:
+                            returned[agent.group] = returned.get(agent.group, 0) + 1
                         agent.days_dissipate = 0
                         agent.state = 1
+                        moved_states[i, j] = 1
 
 
 
         # Update grid
         self.grid = newGrid
 
-        # Check if any agents are next to each other
-        for i in range(self.size):
-            for j in range(self.size):
-                agent = self.grid[i, j]
-
-                # If agent is in state 1
-                if agent.state == 1:
-                    # Get neighbours
-                    neighbours = self.neighbours(i, j, 3, [1])
-                    if len(neighbours) > self.proto_size:
-                        # Create new group
-                        new_group = Group(agent, self.star_size, self.star, self.dissipation)
-                        for neighboursAgent in neighbours:
-                            if neighboursAgent.state == 1:
-                                new_group.append(neighboursAgent)
-
-                        # Add group to list
-                        self.groups.append(new_group)
-                        continue
-
-                    # If agent is next to an agent in state 2
-                    neighbours = self.neighbours(i, j, 1, [2])
-                    if len(neighbours) > 0:
-                        for neighbour in neighbours:
-                            if neighbour.group:
-                                neighbour.group.append(agent)
-                                break
-                        continue
-
-
-                    # If next to an agent in state 3
-                    neighbours = self.neighbours(i, j, 1, [3])
-                    if len(neighbours) > 0:
-                        for neighbour in neighbours:
-                            if neighbour.group:
-                                neighbour.group.append(agent)
-                                break
-                        continue
-
-                # Check for merging groups
-                elif agent.state == 2 or agent.state == 3:
-                    neighbours = self.neighbours(i, j, 1, [2, 3])
-                    if len(neighbours) > 0:
-                        for neighbour in neighbours:
-                            # Both agents have a group
-                            if agent.group and neighbour.group:
-                                # If they are not in the same group
-                                if neighbour.group != agent.group and neighbour.group:
-                                    # Merge lower state group into higher state group
-                                    if neighbour.state > agent.state:
-                                        neighbour.group.merge(agent.group)
-                                    else:
-                                        agent.group.merge(neighbour.group)
-                        continue
+        for group, count in returned.items():
+            self.emit(GAS, group, count)
+        if telemetry:
+            mark = telemetry.lap('movement', mark)
+
+        # Check if any agents are next to each other. Only cells where something can happen
+        # are visited, in the same row-major order as a scan of the whole grid.
+        candidates = self.interaction_candidates(self.track_moves(moves, states, moved_states))
+        queued = set(candidates)
+        while candidates:
+            index = heapq.heappop(candidates)
+            i, j = divmod(index, self.size)
+
+            # Cells that joined a group may let later cells join or merge
+            for gi, gj in self.interact(i, j):
+                for di in range(-1, 2):
+                    for dj in range(-1, 2):
+                        neighbour_index = ((gi + di) % self.size) * self.size + (gj + dj) % self.size
+                        if neighbour_index > index and neighbour_index not in queued:
+                            queued.add(neighbour_index)
+                            heapq.heappush(candidates, neighbour_index)
+        if telemetry:
+            mark = telemetry.lap('interaction', mark)
 
         # Storing groups that are not deleted
         updated_groups = []
@@ -265,20 +318,248 @@ class CellularAutomaton:
                 continue
 
             # Check if still a star
+            state = group.state
             is_star = group.update()
             if is_star:
                 updated_groups.append(group)
+                if group.state != state:
+                    self.emit(STAR, group)
 
 
             # Is dissipating
             else:
+                self.emit(DISSIPATED, group)
                 del group
 
         # Update groups
         self.groups = updated_groups
+        if telemetry:
+            telemetry.lap('groups', mark)
+            telemetry.step()
         return self.get_grid_states()
 
 
+    def track_moves(self, moves, states, moved_states):
+        """
+        Applies the swaps of the movement to the state and label planes, and updates the
+        group frontiers: cells members left are removed from the frontier of their group,
+        and members next to a cell whose agent changed are added to the frontier of theirs.
+
+        :param moves: Swapped cells of the new grid as pairs of row-major indices, in order
+        :param states: State of each cell before the movement
+        :param moved_states: State of each agent after the movement, at its old position
+        :return: State of each cell after the movement
+        """
+        origin = list(range(self.size * self.size))
+        for first, second in moves:
+            origin[first], origin[second] = origin[second], origin[first]
+        origin = np.array(origin)
+        old_labels = self.labels
+        self.labels = old_labels.ravel()[origin].reshape(self.size, self.size)
+        states_after = moved_states.ravel()[origin].reshape(self.size, self.size)
+        if not moves:
+            return states_after
+
+        groups = {group.id: group for group in self.groups}
+        changed = np.unique(np.array(moves))
+        changed_i, changed_j = np.divmod(changed, self.size)
+
+        # Cells whose member left, or that now belong to another group
+        was_grouped = ((states == 2) | (states == 3))[changed_i, changed_j]
+        same = self.labels[changed_i, changed_j] == old_labels[changed_i, changed_j]
+        grouped = ((states_after == 2) | (states_after == 3))
+        left = was_grouped & ~(same & grouped[changed_i, changed_j])
+        for label, cells in _by_label(old_labels[changed_i, changed_j][left], changed_i[left], changed_j[left]):
+            if label in groups:
+                groups[label].remove_cells(cells)
+
+        # Members around the changed cells may now have a neighbour outside their group
+        offsets = np.arange(-1, 2)
+        around_i = (changed_i[:, None, None] + offsets[None, :, None]) % self.size
+        around_j = (changed_j[:, None, None] + offsets[None, None, :]) % self.size
+        around = np.unique((around_i * self.size + around_j).ravel())
+        around_i, around_j = np.divmod(around, self.size)
+        member = grouped[around_i, around_j]
+        for label, cells in _by_label(self.labels[around_i, around_j][member], around_i[member], around_j[member]):
+            groups[label].add_cells(cells)
+
+        return states_after
+
+    def interaction_candidates(self, states=None):
+        """
+        Returns the cells where a group can form, grow or merge this step: gas cells with
+        enough gas around them or next to a group, and the frontier cells of each group.
+        Only the cells of the group frontiers are visited: cells that left a group or are
+        surrounded by their own group are dropped from the frontier, and the bounding box
+        of each group is fitted to what remains.
+
+        :param states: State of each cell, read from the agents if None
+        :return: Row-major indices of the candidate cells, sorted
+        """
+        if states is None:
+            states = self.get_grid_states()
+
+        # Frontier cells have a neighbour outside their own group, gas neighbours touch the group
+        candidates = set()
+        cells = [cell for group in self.groups for cell in group.frontier]
+        owners = np.repeat(np.arange(len(self.groups)), [len(group.frontier) for group in self.groups])
+        if cells:
+            cells_i, cells_j = np.array(cells, dtype=np.int64).T
+            ids = np.array([group.id for group in self.groups], dtype=np.int64)[owners]
+            grouped = (states == 2) | (states == 3)
+            member = grouped[cells_i, cells_j] & (self.labels[cells_i, cells_j] == ids)
+            interior = member.copy()
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    if di == 0 and dj == 0:
+                        continue
+                    ni, nj = (cells_i + di) % self.size, (cells_j + dj) % self.size
+                    interior &= grouped[ni, nj] & (self.labels[ni, nj] == ids)
+                    touching = member & (states[ni, nj] == 1)
+                    candidates.update((ni[touching] * self.size + nj[touching]).tolist())
+
+            # Cells that left their group or are surrounded by it leave the frontier
+            keep = member & ~interior
+            cells_i, cells_j, owners = cells_i[keep], cells_j[keep], owners[keep]
+            candidates.update((cells_i * self.size + cells_j).tolist())
+
+        # Bounding box of each group, a group touching an edge may wrap so its box spans the axis
+        for group in self.groups:
+            group.frontier = set()
+            group.bbox = None
+        if cells and len(owners):
+            edge = self.size - 1
+            on_row_edge = (cells_i == 0) | (cells_i == edge)
+            on_col_edge = (cells_j == 0) | (cells_j == edge)
+            low = np.full((4, len(self.groups)), self.size, dtype=np.int64)
+            high = np.full((4, len(self.groups)), -1, dtype=np.int64)
+            np.minimum.at(low[0], owners, np.where(on_row_edge, 0, cells_i))
+            np.maximum.at(high[1], owners, np.where(on_row_edge, edge, cells_i))
+            np.minimum.at(low[2], owners, np.where(on_col_edge, 0, cells_j))
+            np.maximum.at(high[3], owners, np.where(on_col_edge, edge, cells_j))
+            for owner, rows, cols in zip(owners.tolist(), cells_i.tolist(), cells_j.tolist()):
+                self.groups[owner].frontier.add((rows, cols))
+            for owner in np.unique(owners).tolist():
+                self.groups[owner].bbox = (int(low[0, owner]), int(high[1, owner]), int(low[2, owner]), int(high[3, owner]))
+
+        # Gas cells with more than proto_size gas neighbours, counts only drop during the scan
+        gas = (states == 1).astype(np.int64)
+        if self.tuner:
+            crowded = self.tuner.box_sum('gas', gas, 3) - gas > self.proto_size
+        else:
+            rows = sum(np.roll(gas, d, 1) for d in range(-3, 4))
+            crowded = sum(np.roll(rows, d, 0) for d in range(-3, 4)) - gas > self.proto_size
+        candidates.update(np.flatnonzero(gas.astype(bool) & crowded).tolist())
+
+        return sorted(candidates)
+
+    def extend_bbox(self, group, i, j):
+        """
+        Extends the bounding box of a group with a cell, see Group.extend_bbox
+
+        :param group: Group
+        :param i: Vertical position of the cell
+        :param j: Horizontal position of the cell
+        """
+        group.extend_bbox(i, j, self.size)
+
+    def near_other_group(self, group):
+        """
+        Checks if the bounding box of another live group overlaps or is adjacent to the
+        bounding box of a group
+
+        :param group: Group
+        :return: Boolean indicating if another group may touch the group
+        """
+        if group.bbox is None:
+            return True
+        min_i, max_i, min_j, max_j = group.bbox
+        for other in self.groups:
+            if other is group or other.merged or other.state not in (2, 3):
+                continue
+            if other.bbox is None:
+                return True
+            if other.bbox[0] <= max_i + 1 and min_i - 1 <= other.bbox[1] and other.bbox[2] <= max_j + 1 and min_j - 1 <= other.bbox[3]:
+                return True
+        return False
+
+    def interact(self, i, j):
+        """
+        Forms, grows or merges groups around an agent
+
+        :param i: Vertical position of the agent
+        :param j: Horizontal position of the agent
+        :return: Cells that joined a group
+        """
+        agent = self.grid[i, j]
+
+        # If agent is in state 1
+        if agent.state == 1:
+            # Get neighbours
+            neighbours = self.neighbours(i, j, 3, [1])
+            if len(neighbours) > self.proto_size:
+                # Create new group
+                new_group = Group(agent, self.star_size, self.star, self.dissipation)
+                for neighboursAgent in neighbours:
+                    if neighboursAgent.state == 1:
+                        new_group.append(neighboursAgent)
+
+                # Add group to list
+                self.groups.append(new_group)
+                self.emit(FORMED, new_group)
+
+                # Cells of the new group
+                cells = [((i + di) % self.size, (j + dj) % self.size) for di in range(-3, 4) for dj in range(-3, 4)]
+                cells = [(ni, nj) for ni, nj in cells if self.grid[ni, nj].group is new_group]
+                for ni, nj in cells:
+                    new_group.add_cell(ni, nj, self.size)
+                    self.labels[ni, nj] = new_group.id
+                return cells
+
+            # If agent is next to an agent in state 2, otherwise in state 3
+            for state in (2, 3):
+                neighbours = self.neighbours(i, j, 1, [state])
+                if len(neighbours) > 0:
+                    for neighbour in neighbours:
+                        if neighbour.group:
+                            neighbour.group.append(agent)
+                            neighbour.group.add_cell(i, j, self.size)
+                            self.labels[i, j] = neighbour.group.id
+                            return [(i, j)]
+                    return []
+
+        # Check for merging groups, only groups close to another group can merge
+        elif (agent.state == 2 or agent.state == 3) and self.near_other_group(agent.group):
+            neighbours = self.neighbours(i, j, 1, [2, 3])
+            for neighbour in neighbours:
+                # Both agents have a group
+                if agent.group and neighbour.group:
+                    # If they are not in the same group
+                    if neighbour.group != agent.group and neighbour.group:
+                        # Merge lower state group into higher state group
+                        if neighbour.state > agent.state:
+                            merged, absorbed = neighbour.group, agent.group
+                        else:
+                            merged, absorbed = agent.group, neighbour.group
+                        merged.merge(absorbed)
+                        self.labels[self.labels == absorbed.id] = merged.id
+                        self.emit(MERGED, merged, parent=absorbed.id)
+
+        return []
+
+    def emit(self, kind, group, size=None, parent=-1):
+        """
+        Logs a lifecycle event of a group, if the automaton has an event log
+
+        :param kind: Kind of the event, see events
+        :param group: Group
+        :param size: Size of the event, the size of the group if None
+        :param parent: Id of the group absorbed by a merge
+        """
+        if self.events:
+            center = group.last_center if group.last_center is not None else group.calculate_center()
+            self.events.emit(self.frame, kind, group.id, group.size if size is None else size, center, parent)
+
     def get_grid_states(self):
         """
         Returns the state of each agent in the grid
@@ -287,3 +568,20 @@ class CellularAutomaton:
         """
         return np.array([[agent.state for agent in row] for row in self.grid])
 
+    def get_group_labels(self):
+        """
+        Returns the id of the group each agent belongs to
+
+        :return: Group id of each agent, -1 for agents in state 0 or 1
+        """
+        return np.array([[agent.group.id if agent.group and agent.state in (2, 3, 4) else -1 for agent in row] for row in self.grid])
+
+    def get_group_statistics(self):
+        """
+        Returns the size, state and step counter of each group, sorted so engines with
+        different group ids or group orders can be compared
+
+        :return: Array with one (size, state, steps) row per group
+        """
+        statistics = sorted((group.size, group.state, group.steps) for group in self.groups)
+        return np.array(statistics, dtype=np.int64).reshape(-1, 3)
@@ -6,6 +6,8 @@ class Group:
 
     Attributes
     ----------
+    id : int
+        Unique id of the group
     agents : list
         List of agents in the group
     star_size : int
@@ -20,13 +22,32 @@ class Group:
         Time needed for a star to dissipate
     state : int
         State of the group
+    center : tuple
+        Center of the group after its last update that did not dissipate it
+    last_center : tuple
+        Center of the group at its last update, the center_group of its agents
     merged : boolean
         Boolean indicating if the group has been merged with another group
+    merged_into : Group
+        Group this group has been merged into, None if not merged
+    frontier : set
+        Cells of the group that may be next to a cell outside the group, kept up to date as
+        members join, move and merge, and trimmed to the true frontier once per step
+    bbox : tuple
+        Bounding box (min_i, max_i, min_j, max_j) covering the frontier, None if unknown
 
     Methods
     -------
     append(agent)
         Appends an agent to the group
+    add_cell(i, j, size)
+        Adds the cell of a new member to the frontier and bounding box
+    add_cells(cells)
+        Adds cells whose neighbourhood changed to the frontier
+    remove_cells(cells)
+        Removes cells members left from the frontier
+    extend_bbox(i, j, size)
+        Extends the bounding box with a cell
     calculate_center()
         Calculates the center of the group
     update()
@@ -35,6 +56,9 @@ class Group:
         Merges another group into this group
 
     """
+    # Counter used to hand out unique group ids
+    next_id = 0
+
     def __init__(self, agent, star_size, star, dissipation):
         """
         Constructs a new group
@@ -48,6 +72,8 @@ class Group:
         assert isinstance(star, int) and star_size > 0, "star must be a positive integer"
         assert isinstance(dissipation, int) and star_size > 0, "dissipation must be a positive integer"
 
+        self.id = Group.next_id
+        Group.next_id += 1
         self.agents = [agent]
         self.star_size = star_size
         self.size = 1
@@ -56,8 +82,11 @@ class Group:
         self.dissipation = dissipation
         self.state = 2
         self.center = None
+        self.last_center = None
         self.merged = False
-        agent.state = self.state
+        self.merged_into = None
+        self.frontier = set()
+        self.bbox = None
         agent.group = self
 
     def append(self, agent):
@@ -68,9 +97,53 @@ class Group:
         """
         self.agents.append(agent)
         self.size += 1
-        agent.state = self.state
         agent.group = self
 
+    def add_cell(self, i, j, size):
+        """
+        Adds the cell of a new member to the frontier and bounding box
+
+        :param i: Vertical position of the cell
+        :param j: Horizontal position of the cell
+        :param size: Size of the grid
+        """
+        self.frontier.add((i, j))
+        self.extend_bbox(i, j, size)
+
+    def add_cells(self, cells):
+        """
+        Adds cells of members that moved, or whose neighbourhood changed, to the frontier.
+        The bounding box is fitted to the frontier before the next interactions.
+
+        :param cells: Cells as (i, j) tuples
+        """
+        self.frontier.update(cells)
+
+    def remove_cells(self, cells):
+        """
+        Removes cells members left from the frontier
+
+        :param cells: Cells as (i, j) tuples
+        """
+        self.frontier.difference_update(cells)
+
+    def extend_bbox(self, i, j, size):
+        """
+        Extends the bounding box with a cell. A group touching the edge of the grid may
+        wrap around, so its box then spans the whole axis.
+
+        :param i: Vertical position of the cell
+        :param j: Horizontal position of the cell
+        :param size: Size of the grid
+        """
+        edge = size - 1
+        rows = (0, edge) if i == 0 or i == edge else (i, i)
+        cols = (0, edge) if j == 0 or j == edge else (j, j)
+        if self.bbox:
+            rows = (min(rows[0], self.bbox[0]), max(rows[1], self.bbox[1]))
+            cols = (min(cols[0], self.bbox[2]), max(cols[1], self.bbox[3]))
+        self.bbox = (rows[0], rows[1], cols[0], cols[1])
+
     def calculate_center(self):
         """
         Calculates the center of the group
@@ -100,42 +173,24 @@ class Group:
 
         :return: boolean indicating if the group has dissipated
         """
-        # Proto-star group
-        if self.state == 2:
-            center = self.calculate_center()
+        # Agents take their state and center from the group, so only the group is updated
+        if self.state == 2 or self.state == 3:
+            self.last_center = self.calculate_center()
 
-            for agent in self.agents:
-                agent.center_group = center
-
-            # Check if the group is big enough to become a star
+        # Proto-star group, check if the group is big enough to become a star
+        if self.state == 2:
             if self.steps >= self.star and self.size >= self.star_size:
                 self.state = 3
-                for agent in self.agents:
-                    agent.state = self.state
                 self.steps = 0
 
-        # Star group
+        # Star group, check if the group is old enough to dissipate
         elif self.state == 3:
-            center = self.calculate_center()
-            for agent in self.agents:
-                agent.center_group = center
-
-
-            # Check if the group is big enough to dissipate
             if self.steps >= self.dissipation:
-                
                 self.state = 4
-
-                for agent in self.agents:
-                    agent.state = self.state
                 return False
 
-        # Make sure all agents are linked to this group
-        for agent in self.agents:
-            agent.group = self
-
-        # Recalculate center
-        self.center = self.calculate_center()
+        # The agents have not moved since the center was calculated
+        self.center = self.last_center
 
         # Update steps
         self.steps += 1
@@ -148,12 +203,21 @@ class Group:
 
         :param group: Group to be merged with
         """
-        # Add all agents from the other group to this group
-        for agent in group.agents:
-            self.append(agent)
+        # Add all agents from the other group to this group, they follow merged_into to this group
+        self.agents.extend(group.agents)
+        self.size += group.size
+
+        # Take over the frontier and bounding box of the other group
+        self.frontier |= group.frontier
+        if self.bbox and group.bbox:
+            self.bbox = (min(self.bbox[0], group.bbox[0]), max(self.bbox[1], group.bbox[1]),
+                         min(self.bbox[2], group.bbox[2]), max(self.bbox[3], group.bbox[3]))
+        else:
+            self.bbox = None
 
         # Set the other group to be merged
         group.merged = True
+        group.merged_into = self
 
         # Update the steps
         self.steps = max(self.steps, group.steps)
\ No newline at end of file
@@ -0,0 +1,353 @@
+import json
+import os
+import platform
+import time
+
+import numpy as np
+from startup import lazy_jit
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on this platform, concurrent plan updates may then lose a plan
+    fcntl = None
+
+# Parallel loops of the kernels, numba's prange once they are compiled
+prange = range
+
+# Lowest occupancy bucket, occupancies below 2^MIN_BUCKET share it
+MIN_BUCKET = -16
+
+
+def _warmup_args():
+    """
+    Returns example arguments of the box sum kernels
+
+    :return: Values and radius
+    """
+    return np.ones((4, 4), dtype=np.int64), 1
+
+
+@lazy_jit(warmup_args=_warmup_args, nopython=True)
+def _box_direct(values, radius):
+    """
+    Returns the sum of the values in the square window of a radius around each cell of a
+    torus, gathering the window of every cell
+
+    :param values: Integer values of each cell
+    :param radius: Radius of the window
+    :return: Window sum of each cell, including the cell itself
+    """
+    n, m = values.shape
+    out = np.zeros((n, m), dtype=np.int64)
+    for i in range(n):
+        for j in range(m):
+            total = 0
+            for di in range(-radius, radius + 1):
+                ni = (i + di) % n
+                for dj in range(-radius, radius + 1):
+                    total += values[ni, (j + dj) % m]
+            out[i, j] = total
+    return out
+
+
+@lazy_jit(warmup_args=_warmup_args, nopython=True, parallel=True)
+def _box_threaded(values, radius):
+    """
+    Returns the window sums like _box_direct, with the rows split over threads
+
+    :param values: Integer values of each cell
+    :param radius: Radius of the window
+    :return: Window sum of each cell, including the cell itself
+    """
+    n, m = values.shape
+    out = np.zeros((n, m), dtype=np.int64)
+    for i in prange(n):
+        for j in range(m):
+            total = 0
+            for di in range(-radius, radius + 1):
+                ni = (i + di) % n
+                for dj in range(-radius, radius + 1):
+                    total += values[ni, (j + dj) % m]
+            out[i, j] = total
+    return out
+
+
+@lazy_jit(warmup_args=_warmup_args, nopython=True)
+def _box_sparse(values, radius):
+    """
+    Returns the window sums like _box_direct, scattering the value of every occupied cell
+    over its window, so the cost scales with the number of occupied cells
+
+    :param values: Integer values of each cell
+    :param radius: Radius of the window
+    :return: Window sum of each cell, including the cell itself
+    """
+    n, m = values.shape
+    out = np.zeros((n, m), dtype=np.int64)
+    for i in range(n):
+        for j in range(m):
+            value = values[i, j]
+            if value != 0:
+                for di in range(-radius, radius + 1):
+                    ni = (i + di) % n
+                    for dj in range(-radius, radius + 1):
+                        out[ni, (j + dj) % m] += value
+    return out
+
+
+def _box_prefix(values, radius):
+    """
+    Returns the window sums like _box_direct, from a summed area table of the grid padded
+    with its periodic images
+
+    :param values: Integer values of each cell
+    :param radius: Radius of the window
+    :return: Window sum of each cell, including the cell itself
+    """
+    width = 2 * radius + 1
+    padded = np.pad(np.asarray(values, dtype=np.int64), radius, mode='wrap')
+    table = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(padded, axis=0), axis=1, out=table[1:, 1:])
+    return table[width:, width:] - table[:-width, width:] - table[width:, :-width] + table[:-width, :-width]
+
+
+# Spectrum of the window of each grid shape and radius
+_SPECTRA = {}
+
+
+def _box_fft(values, radius):
+    """
+    Returns the window sums like _box_direct, as a periodic convolution with the window
+    computed by FFT. The sums are integers, so rounding recovers them exactly as long as
+    the rounding error stays below one half, which the tuner checks against _box_direct.
+
+    :param values: Integer values of each cell
+    :param radius: Radius of the window
+    :return: Window sum of each cell, including the cell itself
+    """
+    shape = values.shape
+    spectrum = _SPECTRA.get((shape, radius))
+    if spectrum is None:
+        window = np.zeros(shape)
+        offsets = np.arange(-radius, radius + 1)
+        np.add.at(window, np.ix_(offsets % shape[0], offsets % shape[1]), 1)
+        spectrum = _SPECTRA[(shape, radius)] = np.fft.rfft2(window)
+    return np.rint(np.fft.irfft2(np.fft.rfft2(values) * spectrum, s=shape)).astype(np.int64)
+
+
+# Backends computing periodic window sums, all return the same integers
+BACKENDS = {
+    'direct': _box_direct,
+    'threaded': _box_threaded,
+    'sparse': _box_sparse,
+    'prefix': _box_prefix,
+    'fft': _box_fft,
+}
+
+# Backends using one core, for runs sharing the cores with other worker processes
+SERIAL_BACKENDS = [backend for backend in BACKENDS if backend != 'threaded']
+
+
+def machine_id():
+    """
+    Returns an id of the machine, plans measured on one machine are not reused on another
+
+    :return: Host name, architecture and number of cores
+    """
+    return f'{platform.node()}-{platform.machine()}-{os.cpu_count()}'
+
+
+def default_path():
+    """
+    Returns the plan cache of this machine
+
+    :return: Path of the plan cache in the user cache directory
+    """
+    return os.path.join(os.path.expanduser('~'), '.cache', 'star_formation', f'plans-{machine_id()}.json')
+
+
+def occupancy_bucket(values):
+    """
+    Returns the occupancy bucket of a grid, occupancies within a factor two share a bucket
+
+    :param values: Values of each cell
+    :return: Floor of the base 2 logarithm of the fraction of non-zero cells
+    """
+    occupied = np.count_nonzero(values)
+    if occupied == 0:
+        return MIN_BUCKET
+    return max(int(np.floor(np.log2(occupied / values.size))), MIN_BUCKET)
+
+
+class AutoTuner:
+    """
+    Class choosing the fastest backend of the window sums of the automaton (the densities
+    and the gas neighbour counts) for each grid size, radius and occupancy. The first time
+    a configuration is met every backend is timed on the actual grid, backends that do not
+    return the exact sums of the direct stencil are left out, and the winner is stored in
+    a plan cache on disk. The occupancy is checked at every call, so a run whose occupancy
+    changes by a factor two, for example when a star dissipates, switches to the plan of
+    its new bucket. A plan stores the times of every backend timed, so a tuner restricted
+    to fewer backends, like the workers of a sweep that leave out 'threaded', picks the
+    fastest of its own backends from the plans of other tuners.
+
+    Attributes
+    ----------
+    path : str
+        JSON file of the plan cache, None to keep the plans in memory
+    repeats : int
+        Number of timed calls per backend, the fastest counts
+    backends : list
+        Names of the backends to choose from, see BACKENDS
+    plans : dict
+        Plan of each kernel, grid shape, radius and occupancy bucket: the backend and the timings
+    selected : list
+        Every plan selected during the run, as (kernel, key, backend)
+
+    Methods
+    -------
+    box_sum(kernel, values, radius)
+        Returns the window sums of a grid with the planned backend
+    density(states, radius=5)
+        Returns the density of agents around each cell, like density_grid
+    plan(kernel, values, radius)
+        Returns the backend of a configuration, timing the backends if it has no plan
+    benchmark(values, radius)
+        Times the backends on a grid
+    """
+    def __init__(self, path=None, repeats=3, backends=None):
+        """
+        Constructs a new tuner, loading the plans measured before
+
+        :param path: JSON file of the plan cache, default_path() if None, False to keep the plans in memory
+        :param repeats: Number of timed calls per backend
+        :param backends: Names of the backends to choose from, all if None
+        """
+        assert isinstance(repeats, int) and repeats > 0, "Repeats must be a positive integer"
+        assert backends is None or all(backend in BACKENDS for backend in backends), "Unknown backend"
+
+        self.path = default_path() if path is None else (path or None)
+        self.repeats = repeats
+        self.backends = list(backends or BACKENDS)
+        self.plans = self._load()
+        self.selected = []
+        self.current = {}
+
+    def box_sum(self, kernel, values, radius):
+        """
+        Returns the window sums of a grid with the backend planned for its configuration
+
+        :param kernel: Name of the kernel, plans are kept per kernel
+        :param values: Integer values of each cell
+        :param radius: Radius of the window
+        :return: Window sum of each cell, including the cell itself
+        """
+        key = self._key(kernel, values, radius)
+        current = self.current.get(kernel)
+        if current is None or current[0] != key:
+            backend = self.plan(kernel, values, radius, key)
+            self.selected.append((kernel, key, backend))
+            self.current[kernel] = current = (key, BACKENDS[backend])
+        return current[1](values, radius)
+
+    def density(self, states, radius=5):
+        """
+        Returns the density of agents in a given radius around each cell, the same values
+        as density_grid
+
+        :param states: States of the agents
+        :param radius: Radius around the agent
+        :return: Density of agents around each cell
+        """
+        states = np.asarray(states, dtype=np.int64)
+        return (100 * (self.box_sum('density', states, radius) - states)).astype(np.float64)
+
+    def plan(self, kernel, values, radius, key=None):
+        """
+        Returns the backend of a configuration, timing the backends and storing the plan
+        if the configuration has none yet
+
+        :param kernel: Name of the kernel
+        :param values: Integer values of each cell
+        :param radius: Radius of the window
+        :param key: Key of the configuration, computed if None
+        :return: Name of the backend
+        """
+        key = key or self._key(kernel, values, radius)
+        plan = self.plans.get(key, {'times': {}})
+        times = {backend: seconds for backend, seconds in plan['times'].items() if backend in self.backends}
+        if not times:
+            times = self.benchmark(values, radius)
+            merged = dict(plan['times'], **times)
+            self.plans[key] = {'backend': min(merged, key=merged.get), 'times': merged}
+            self._save(key)
+        return min(times, key=times.get)
+
+    def benchmark(self, values, radius):
+        """
+        Times the backends on a grid, after one untimed call that also compiles them
+
+        :param values: Integer values of each cell
+        :param radius: Radius of the window
+        :return: Dictionary mapping each backend returning the exact sums to its fastest time
+        """
+        reference = _box_direct(values, radius)
+        times = {}
+        for backend in self.backends:
+            function = BACKENDS[backend]
+            if not np.array_equal(function(values, radius), reference):
+                continue
+            best = np.inf
+            for _ in range(self.repeats):
+                start = time.perf_counter()
+                function(values, radius)
+                best = min(best, time.perf_counter() - start)
+            times[backend] = best
+        return times
+
+    def _key(self, kernel, values, radius):
+        """
+        Returns the key of a configuration in the plan cache
+
+        :param kernel: Name of the kernel
+        :param values: Values of each cell
+        :param radius: Radius of the window
+        :return: Kernel, grid shape, radius and occupancy bucket
+        """
+        return f'{kernel}:{values.shape[0]}x{values.shape[1]}:{radius}:{occupancy_bucket(values)}'
+
+    def _load(self):
+        """
+        Loads the plan cache
+
+        :return: Plans on disk, empty if there are none
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        with open(self.path) as file:
+            return json.load(file)
+
+    def _save(self, key):
+        """
+        Adds a plan to the plan cache, keeping the plans other processes stored meanwhile.
+        The cache is read, merged and replaced under an exclusive lock on a sidecar file,
+        so two processes planning at once do not drop each other's plans.
+
+        :param key: Key of the new plan
+        """
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f'{self.path}.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            plans = self._load()
+            plans[key] = self.plans[key]
+            self.plans.update(plans)
+
+            # Replace the file at once, so readers never see half a cache
+            temporary = f'{self.path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as file:
+                json.dump(plans, file, indent=1, sort_keys=True)
+            os.replace(temporary, self.path)
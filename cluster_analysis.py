@@ -0,0 +1,199 @@
+import numpy as np
+from startup import lazy_jit
+
+# Columns of a row of cluster statistics, followed by the size histogram
+CLUSTER_COUNT, CLUSTER_LARGEST, CLUSTER_PERCOLATES, CLUSTER_HISTOGRAM = range(4)
+
+# Flags of the grid edges a cluster touches
+TOP, BOTTOM, LEFT, RIGHT = 1, 2, 4, 8
+
+
+def histogram_bins(size):
+    """
+    Returns the number of bins of the cluster size histogram of a grid, bin k counts the
+    clusters with 2^k to 2^(k+1) - 1 cells
+
+    :param size: Size of the grid
+    :return: Number of bins
+    """
+    return (size * size).bit_length()
+
+
+def cluster_columns(size):
+    """
+    Returns the number of columns of a row of cluster statistics
+
+    :param size: Size of the grid
+    :return: Number of columns
+    """
+    return CLUSTER_HISTOGRAM + histogram_bins(size)
+
+
+@lazy_jit(nopython=True)
+def _find(parent, k):
+    """
+    Returns the root of a cell, halving the path on the way
+
+    :param parent: Parent of each cell
+    :param k: Cell
+    :return: Root of the cell
+    """
+    while parent[k] != k:
+        parent[k] = parent[parent[k]]
+        k = parent[k]
+    return k
+
+
+@lazy_jit(nopython=True)
+def _union(parent, a, b):
+    """
+    Joins the clusters of two cells, the smallest root remains
+
+    :param parent: Parent of each cell
+    :param a: First cell
+    :param b: Second cell
+    """
+    a = _find(parent, a)
+    b = _find(parent, b)
+    if a < b:
+        parent[b] = a
+    elif b < a:
+        parent[a] = b
+
+
+@lazy_jit(warmup_args=lambda: (np.ones((2, 2), dtype=np.int64), np.empty(4, dtype=np.int64), np.empty(4, dtype=np.int8),
+                               np.empty(4, dtype=np.int64), np.zeros(cluster_columns(2), dtype=np.int64), True), nopython=True)
+def label_clusters(states, parent, flags, sizes, out, diagonal):
+    """
+    Labels the clusters of occupied (non-zero) cells with a union-find over the torus and
+    writes their count, the size of the largest, whether one spans the grid and the size
+    histogram. A cluster percolates when it connects opposite edges without wrapping.
+
+    :param states: State of each cell
+    :param parent: Scratch array with one entry per cell, holds the root of each occupied cell afterwards
+    :param flags: Scratch array with one entry per cell
+    :param sizes: Scratch array with one entry per cell
+    :param out: Output row of cluster statistics
+    :param diagonal: Whether diagonal neighbours are connected
+    """
+    n, m = states.shape
+    for k in range(n * m):
+        parent[k] = k
+        flags[k] = 0
+        sizes[k] = 0
+
+    # Join each cell with its occupied neighbours above and to the left, inside the grid
+    for i in range(n):
+        for j in range(m):
+            if states[i, j] == 0:
+                continue
+            k = i * m + j
+            if j > 0 and states[i, j - 1] != 0:
+                _union(parent, k, k - 1)
+            if i > 0:
+                if states[i - 1, j] != 0:
+                    _union(parent, k, k - m)
+                if diagonal and j > 0 and states[i - 1, j - 1] != 0:
+                    _union(parent, k, k - m - 1)
+                if diagonal and j < m - 1 and states[i - 1, j + 1] != 0:
+                    _union(parent, k, k - m + 1)
+
+    # Percolation is decided before the clusters are joined across the periodic edges
+    for j in range(m):
+        if states[0, j] != 0:
+            flags[_find(parent, j)] |= TOP
+        if states[n - 1, j] != 0:
+            flags[_find(parent, (n - 1) * m + j)] |= BOTTOM
+    for i in range(n):
+        if states[i, 0] != 0:
+            flags[_find(parent, i * m)] |= LEFT
+        if states[i, m - 1] != 0:
+            flags[_find(parent, i * m + m - 1)] |= RIGHT
+    percolates = 0
+    for k in range(n * m):
+        if (flags[k] & (TOP | BOTTOM)) == TOP | BOTTOM or (flags[k] & (LEFT | RIGHT)) == LEFT | RIGHT:
+            percolates = 1
+
+    # Join across the periodic edges
+    for j in range(m):
+        if states[n - 1, j] == 0:
+            continue
+        for dj in range(-1, 2):
+            if (dj == 0 or diagonal) and states[0, (j + dj) % m] != 0:
+                _union(parent, (n - 1) * m + j, (j + dj) % m)
+    for i in range(n):
+        if states[i, m - 1] == 0:
+            continue
+        for di in range(-1, 2):
+            if (di == 0 or diagonal) and states[(i + di) % n, 0] != 0:
+                _union(parent, i * m + m - 1, ((i + di) % n) * m)
+
+    # Count the cells of each cluster, and point every cell at its root
+    for i in range(n):
+        for j in range(m):
+            if states[i, j] != 0:
+                root = _find(parent, i * m + j)
+                parent[i * m + j] = root
+                sizes[root] += 1
+
+    for c in range(out.shape[0]):
+        out[c] = 0
+    for k in range(n * m):
+        size = sizes[k]
+        if size > 0:
+            out[CLUSTER_COUNT] += 1
+            out[CLUSTER_LARGEST] = max(out[CLUSTER_LARGEST], size)
+            level = 0
+            while size > 1:
+                size >>= 1
+                level += 1
+            out[CLUSTER_HISTOGRAM + level] += 1
+    out[CLUSTER_PERCOLATES] = percolates
+
+
+class ClusterAnalyzer:
+    """
+    Class labeling the connected clusters of occupied cells of a grid, with buffers
+    allocated once so every step of a large run can be analyzed. Clusters are labeled
+    on the torus, like the neighbourhoods of the automaton, independently of the groups.
+
+    Attributes
+    ----------
+    size : int
+        Size of the grid
+    diagonal : bool
+        Whether diagonal neighbours are connected
+    labels : numpy.ndarray
+        Root cell of the cluster of each cell after analyze(), for occupied cells
+
+    Methods
+    -------
+    analyze(states)
+        Returns the cluster statistics of a grid of states
+    """
+    def __init__(self, size, diagonal=True):
+        """
+        Constructs a new analyzer
+
+        :param size: Size of the grid
+        :param diagonal: Whether diagonal neighbours are connected, as in the neighbourhoods of the automaton
+        """
+        assert isinstance(size, int) and size > 0, "Size must be a positive integer"
+
+        self.size = size
+        self.diagonal = diagonal
+        self.labels = np.empty(size * size, dtype=np.int64)
+        self.flags = np.empty(size * size, dtype=np.int8)
+        self.sizes = np.empty(size * size, dtype=np.int64)
+
+    def analyze(self, states):
+        """
+        Returns the cluster statistics of a grid of states
+
+        :param states: State of each cell, 0 for empty cells
+        :return: Row with the number of clusters, the largest cluster size, whether a cluster
+                 percolates and the size histogram, see cluster_columns
+        """
+        out = np.zeros(cluster_columns(self.size), dtype=np.int64)
+        label_clusters(np.ascontiguousarray(states, dtype=np.int64), self.labels, self.flags, self.sizes, out, self.diagonal)
+        return out
@@ -0,0 +1,220 @@
+import numpy as np
+
+from CellularAutomaton import CellularAutomaton
+
+
+class Divergence:
+    """
+    Class describing the first difference found between two engines
+
+    Attributes
+    ----------
+    step : int
+        Step at which the engines diverged (0 is the initial grid)
+    kind : str
+        What diverged: 'states', 'groups' or 'statistics'
+    cell : tuple
+        First diverging cell in row-major order, None for statistics
+    expected : int or numpy.ndarray
+        Value of the reference engine
+    actual : int or numpy.ndarray
+        Value of the candidate engine
+    """
+    def __init__(self, step, kind, cell=None, expected=None, actual=None):
+        """
+        Constructs a new divergence
+
+        :param step: Step at which the engines diverged
+        :param kind: What diverged
+        :param cell: First diverging cell
+        :param expected: Value of the reference engine
+        :param actual: Value of the candidate engine
+        """
+        self.step = step
+        self.kind = kind
+        self.cell = cell
+        self.expected = expected
+        self.actual = actual
+
+    def __repr__(self):
+        return f'Divergence(step={self.step}, kind={self.kind!r}, cell={self.cell}, expected={self.expected}, actual={self.actual})'
+
+
+class RandomStream:
+    """
+    Context manager giving an engine its own copy of the global numpy random state,
+    so two engines can be stepped in lockstep without consuming each other's numbers
+    """
+    def __init__(self, seed):
+        """
+        Constructs a new random stream
+
+        :param seed: Seed of the stream
+        """
+        previous = np.random.get_state()
+        np.random.seed(seed)
+        self.state = np.random.get_state()
+        np.random.set_state(previous)
+        self.outer = None
+
+    def __enter__(self):
+        self.outer = np.random.get_state()
+        np.random.set_state(self.state)
+        return self
+
+    def __exit__(self, *exc):
+        self.state = np.random.get_state()
+        np.random.set_state(self.outer)
+        return False
+
+
+def reference_engine(initial_states, proto_size=20, star_size=100, steps_dissipating=50):
+    """
+    Builds the object based CellularAutomaton from an initial grid
+
+    :param initial_states: Initial state of each cell
+    :param proto_size: Size of the proto groups before they become a star group
+    :param star_size: Size of the star groups before they dissipate
+    :param steps_dissipating: Steps dissipation
+    :return: Cellular automaton
+    """
+    size = initial_states.shape[0]
+    return CellularAutomaton(size, [1, 0], proto_size, star_size, steps_dissipating, initial_states=initial_states)
+
+
+def canonical_labels(labels):
+    """
+    Relabels each group by the row-major index of its first cell, so group memberships
+    of engines with different group ids can be compared directly
+
+    :param labels: Group id of each cell, -1 for no group
+    :return: Canonical group id of each cell, -1 for no group
+    """
+    flat = np.asarray(labels).ravel()
+    canonical = np.full(flat.shape, -1, dtype=np.int64)
+    member = flat >= 0
+    ids, first = np.unique(flat[member], return_index=True)
+    first_cell = np.flatnonzero(member)[first]
+    canonical[member] = first_cell[np.searchsorted(ids, flat[member])]
+    return canonical.reshape(np.shape(labels))
+
+
+def compare(step, reference, candidate, groups=True):
+    """
+    Compares the current state planes, group memberships and group statistics of two engines.
+    Group statistics (size, state and step counter of each live group) are only compared
+    when both engines provide get_group_statistics().
+
+    :param step: Current step
+    :param reference: Reference engine
+    :param candidate: Candidate engine
+    :param groups: Whether to compare group memberships
+    :return: Divergence or None if the engines agree
+    """
+    expected = np.asarray(reference.get_grid_states())
+    actual = np.asarray(candidate.get_grid_states())
+    if expected.shape != actual.shape:
+        return Divergence(step, 'states', None, expected.shape, actual.shape)
+
+    differ = np.argwhere(expected != actual)
+    if len(differ):
+        i, j = differ[0]
+        return Divergence(step, 'states', (int(i), int(j)), int(expected[i, j]), int(actual[i, j]))
+
+    if groups:
+        expected_labels = canonical_labels(reference.get_group_labels())
+        actual_labels = canonical_labels(candidate.get_group_labels())
+        differ = np.argwhere(expected_labels != actual_labels)
+        if len(differ):
+            i, j = differ[0]
+            return Divergence(step, 'groups', (int(i), int(j)), int(expected_labels[i, j]), int(actual_labels[i, j]))
+
+        if hasattr(reference, 'get_group_statistics') and hasattr(candidate, 'get_group_statistics'):
+            expected_statistics = np.asarray(reference.get_group_statistics())
+            actual_statistics = np.asarray(candidate.get_group_statistics())
+            if expected_statistics.shape != actual_statistics.shape or not np.array_equal(expected_statistics, actual_statistics):
+                return Divergence(step, 'statistics', None, expected_statistics, actual_statistics)
+
+    return None
+
+
+def run_lockstep(reference, candidate, initial_states, steps, seed=0, groups=True):
+    """
+    Runs two engines from the same seed and initial grid and compares them after every step
+
+    :param reference: Function building the reference engine from the initial states
+    :param candidate: Function building the candidate engine from the initial states
+    :param initial_states: Initial state of each cell
+    :param steps: Number of steps to run
+    :param seed: Seed of the global random state each engine is built and stepped with
+    :param groups: Whether to compare group memberships
+    :return: First Divergence or None if the engines agree on every step
+    """
+    streams = [RandomStream(seed), RandomStream(seed)]
+    engines = []
+    for factory, stream in zip([reference, candidate], streams):
+        with stream:
+            engines.append(factory(np.array(initial_states, dtype=np.int64)))
+
+    for step in range(steps + 1):
+        divergence = compare(step, engines[0], engines[1], groups)
+        if divergence or step == steps:
+            return divergence
+
+        for engine, stream in zip(engines, streams):
+            with stream:
+                engine.update(step)
+
+
+def stars_formed(factory, initial_states, steps, seed):
+    """
+    Counts the groups that become a star during a run
+
+    :param factory: Function building the engine from the initial states
+    :param initial_states: Initial state of each cell
+    :param steps: Number of steps to run
+    :param seed: Seed of the global random state the engine is built and stepped with
+    :return: Number of stars formed
+    """
+    with RandomStream(seed):
+        engine = factory(np.array(initial_states, dtype=np.int64))
+        stars = set()
+        formed = 0
+        for step in range(steps):
+            states = engine.update(step)
+            current = set(np.unique(np.asarray(engine.get_group_labels())[states == 3]).tolist())
+            formed += len(current - stars)
+            stars = current
+    return formed
+
+
+def compare_star_distributions(reference, candidate, make_initial_states, steps, seeds, alpha=0.05):
+    """
+    Checks that two engines form stars with the same distribution, for engines that are
+    not bit-identical by design. Both engines run from the same initial grids and seeds.
+
+    :param reference: Function building the reference engine from the initial states
+    :param candidate: Function building the candidate engine from the initial states
+    :param make_initial_states: Function returning the initial grid for a seed
+    :param steps: Number of steps per run
+    :param seeds: Seeds of the runs
+    :param alpha: Significance level of the two sample Kolmogorov-Smirnov test
+    :return: Dictionary with the stars formed per run, the test statistic, p-value and verdict
+    """
+    from scipy.stats import ks_2samp
+
+    expected = []
+    actual = []
+    for seed in seeds:
+        initial_states = make_initial_states(seed)
+        expected.append(stars_formed(reference, initial_states, steps, seed))
+        actual.append(stars_formed(candidate, initial_states, steps, seed))
+
+    expected = np.array(expected)
+    actual = np.array(actual)
+    if np.array_equal(np.sort(expected), np.sort(actual)):
+        statistic, p_value = 0.0, 1.0
+    else:
+        statistic, p_value = ks_2samp(expected, actual)
+
+    return {'reference': expected, 'candidate': actual, 'statistic': statistic, 'p_value': p_value, 'equivalent': p_value >= alpha}
@@ -0,0 +1,219 @@
+import glob
+import os
+
+import numpy as np
+
+# Kinds of events in the life of a group
+FORMED, MERGED, STAR, DISSIPATED, GAS = range(5)
+KINDS = ('formed', 'merged', 'star', 'dissipated', 'gas')
+
+# Columns of the catalog and their types on disk
+COLUMNS = {
+    'run': np.int32,
+    'step': np.int32,
+    'kind': np.int8,
+    'group': np.int64,
+    'size': np.int32,
+    'center_i': np.int32,
+    'center_j': np.int32,
+    'parent': np.int64,
+}
+
+
+class EventLog:
+    """
+    Class collecting the lifecycle events of groups: formation, merges, the proto-star to
+    star transition, dissipation and agents returning to gas. Events are buffered and
+    written in batches of columns to compressed .npz chunks, so the catalog of a whole
+    sweep can be loaded and queried at once with load_events.
+
+    Every event has the run, the step, the kind, the group id, the size and center of the
+    group and a parent id: the group absorbed by a merge, -1 for other events. Agents
+    returning to gas are counted per group and step, the size is the number of agents.
+
+    Attributes
+    ----------
+    path : str
+        Directory of the chunks, None to keep the events in memory
+    run : int
+        Id of the run, to tell the runs of a sweep apart
+    batch : int
+        Number of events buffered before a chunk is written
+    chunks : int
+        Number of chunks written
+    buffer : list
+        Buffered events, one tuple per event
+    memory : list
+        Chunks kept in memory when there is no directory
+
+    Methods
+    -------
+    emit(step, kind, group, size, center, parent=-1)
+        Records an event
+    flush()
+        Writes the buffered events
+    close()
+        Writes the remaining events
+    columns()
+        Returns the events in memory as columns
+    """
+    def __init__(self, path=None, run=0, batch=65536):
+        """
+        Constructs a new event log
+
+        :param path: Directory of the chunks, None to keep the events in memory
+        :param run: Id of the run
+        :param batch: Number of events buffered before a chunk is written
+        """
+        assert isinstance(batch, int) and batch > 0, "Batch must be a positive integer"
+
+        self.path = path
+        self.run = run
+        self.batch = batch
+        self.chunks = 0
+        self.buffer = []
+        self.memory = []
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def emit(self, step, kind, group, size, center, parent=-1):
+        """
+        Records an event
+
+        :param step: Step of the event
+        :param kind: Kind of the event, one of FORMED, MERGED, STAR, DISSIPATED and GAS
+        :param group: Id of the group
+        :param size: Size of the group, or number of agents returning to gas
+        :param center: Center of the group
+        :param parent: Id of the group absorbed by a merge, -1 for other events
+        """
+        self.buffer.append((self.run, step, kind, group, size, center[0], center[1], parent))
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered events as one chunk of columns
+        """
+        if not self.buffer:
+            return
+
+        rows = list(zip(*self.buffer))
+        chunk = {name: np.array(rows[k], dtype=dtype) for k, (name, dtype) in enumerate(COLUMNS.items())}
+        self.buffer = []
+
+        if self.path is None:
+            self.memory.append(chunk)
+        else:
+            np.savez_compressed(os.path.join(self.path, f'run-{self.run:06d}-{self.chunks:05d}.npz'), **chunk)
+        self.chunks += 1
+
+    def close(self):
+        """
+        Writes the remaining events
+        """
+        self.flush()
+
+    def columns(self):
+        """
+        Returns the events kept in memory as columns
+
+        :return: Dictionary mapping each column to an array
+        """
+        self.flush()
+        return _concatenate(self.memory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _concatenate(chunks):
+    """
+    Concatenates chunks of columns
+
+    :param chunks: Dictionaries mapping each column to an array
+    :return: Dictionary mapping each column to an array
+    """
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) if chunks else np.zeros(0, dtype=dtype)
+            for name, dtype in COLUMNS.items()}
+
+
+def load_events(path):
+    """
+    Loads every chunk written to a directory, for example by all runs of a sweep
+
+    :param path: Directory of the chunks
+    :return: Dictionary mapping each column to an array, ordered by run and step
+    """
+    chunks = []
+    for file in sorted(glob.glob(os.path.join(path, 'run-*.npz'))):
+        with np.load(file) as chunk:
+            chunks.append({name: chunk[name] for name in COLUMNS})
+    return _concatenate(chunks)
+
+
+def _group_keys(events):
+    """
+    Returns a key per event that is unique for each group of each run
+
+    :param events: Event columns
+    :return: Keys
+    """
+    return events['run'].astype(np.int64) * (int(events['group'].max(initial=0)) + 1) + events['group']
+
+
+def star_formation_rate(events, steps, runs):
+    """
+    Returns the number of stars formed per step in each run of a sweep. Runs that logged
+    no events, such as low density runs where no group formed, have a rate of zero.
+
+    :param events: Event columns
+    :param steps: Number of steps of each run
+    :param runs: Run ids of the sweep, or their number if the runs are numbered from 0
+    :return: Run ids and their star formation rates
+    """
+    all_runs = np.arange(runs) if np.ndim(runs) == 0 else np.unique(np.asarray(runs, dtype=np.int64))
+    star_runs = events['run'][events['kind'] == STAR]
+    assert np.isin(star_runs, all_runs).all(), "Events of runs outside the sweep"
+
+    star_runs, counts = np.unique(star_runs, return_counts=True)
+    rates = np.zeros(len(all_runs))
+    rates[np.searchsorted(all_runs, star_runs)] = counts
+    return all_runs, rates / steps
+
+
+def lifetimes(events, start=STAR, end=DISSIPATED):
+    """
+    Returns the number of steps between two events of the same group, by default how
+    long stars shine before they dissipate. Groups without both events are left out.
+
+    :param events: Event columns
+    :param start: Kind of the first event
+    :param end: Kind of the second event
+    :return: Lifetime of each group with both events
+    """
+    keys = _group_keys(events)
+    starts, ends = events['kind'] == start, events['kind'] == end
+    start_keys, first = np.unique(keys[starts], return_index=True)
+    end_keys, last = np.unique(keys[ends], return_index=True)
+    _, in_start, in_end = np.intersect1d(start_keys, end_keys, assume_unique=True, return_indices=True)
+    return events['step'][ends][last[in_end]] - events['step'][starts][first[in_start]]
+
+
+def mass_function(events, bins_per_decade=10):
+    """
+    Returns the logarithmic histogram of the sizes of groups when they become a star
+
+    :param events: Event columns
+    :param bins_per_decade: Number of bins per decade
+    :return: Histogram and bin edges, like numpy.histogram
+    """
+    sizes = events['size'][events['kind'] == STAR]
+    if len(sizes) == 0:
+        return np.zeros(0, dtype=np.int64), np.ones(1)
+    bins = int(np.ceil(np.log10(sizes.max() + 1) * bins_per_decade))
+    return np.histogram(sizes, 10 ** (np.arange(bins + 1) / bins_per_decade))
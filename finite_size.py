@@ -0,0 +1,253 @@
+import heapq
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from CellularAutomaton import CellularAutomaton
+from initial_conditions import make_initial_states
+from phase_transitions import emergence_job, coupled_estimates
+from startup import warmup
+
+
+class CostModel:
+    """
+    Class predicting the time of a run from its grid size and gas density. A step costs
+    a fixed amount per cell (densities, the movement scan, the state planes) plus an
+    amount per agent (moves and group checks): time = steps * N^2 * (cell + agent * prob_gas).
+    Runs stop when a star emerges, so the steps are the frames times the expected fraction
+    of the frames a run at that density lasts, measured by pilot_fractions.
+
+    Attributes
+    ----------
+    cell : float
+        Seconds per cell and step
+    agent : float
+        Seconds per gas agent and step
+    probs_gas : numpy.ndarray
+        Increasing gas densities of the step fractions, None if runs last all frames
+    fractions : numpy.ndarray
+        Expected fraction of the frames a run lasts at each density, interpolated in between
+
+    Methods
+    -------
+    predict(N, prob_gas, frames)
+        Returns the predicted seconds of a run
+    """
+    def __init__(self, cell, agent, probs_gas=None, fractions=None):
+        """
+        Constructs a new cost model
+
+        :param cell: Seconds per cell and step
+        :param agent: Seconds per gas agent and step
+        :param probs_gas: Increasing gas densities of the step fractions, None if runs last all frames
+        :param fractions: Expected fraction of the frames a run lasts at each density
+        """
+        assert (probs_gas is None) == (fractions is None), "Step fractions need their densities"
+
+        self.cell = cell
+        self.agent = agent
+        self.probs_gas = None if probs_gas is None else np.asarray(probs_gas, dtype=float)
+        self.fractions = None if fractions is None else np.asarray(fractions, dtype=float)
+
+    def predict(self, N, prob_gas, frames):
+        """
+        Returns the predicted seconds of a run
+
+        :param N: Grid size
+        :param prob_gas: Probability of cell being a gas particle
+        :param frames: Maximum number of steps
+        :return: Predicted seconds
+        """
+        fraction = 1.0 if self.fractions is None else float(np.interp(prob_gas, self.probs_gas, self.fractions))
+        return frames * fraction * N * N * max(self.cell + self.agent * prob_gas, 1e-12)
+
+
+def calibrate(sizes=(16, 32), probs_gas=(0.05, 0.3), steps=5, proto_size=25, star_size=100, steps_dissipating=50, seed=0):
+    """
+    Fits a CostModel to the measured step time of short runs
+
+    :param sizes: Grid sizes to time
+    :param probs_gas: Gas densities to time
+    :param steps: Steps timed per run, after one untimed step
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param seed: Seed of the grids and movement
+    :return: Fitted cost model
+    """
+    features = []
+    times = []
+    for N in sizes:
+        for prob_gas in probs_gas:
+            np.random.seed(seed)
+            automaton = CellularAutomaton(N, [1 - prob_gas, prob_gas], proto_size, star_size, steps_dissipating,
+                                          initial_states=make_initial_states('uniform', N, prob_gas, seed=seed))
+            automaton.update(0)
+            start = time.perf_counter()
+            for frame in range(1, steps + 1):
+                automaton.update(frame)
+            times.append((time.perf_counter() - start) / steps)
+            features.append((N * N, N * N * prob_gas))
+
+    (cell, agent), *_ = np.linalg.lstsq(np.array(features, dtype=float), np.array(times), rcond=None)
+    return CostModel(float(cell), float(agent))
+
+
+def pilot_fractions(N, probs_gas, frames, runs=2, proto_size=25, star_size=100, steps_dissipating=50, seed=0):
+    """
+    Measures the expected fraction of the frames a run lasts at each density, from pilot
+    runs that stop when a star emerges. Larger grids nucleate no later, so fractions from
+    the smallest grid of a study keep its densities in the right order.
+
+    :param N: Grid size of the pilot runs
+    :param probs_gas: Increasing gas densities
+    :param frames: Maximum number of steps per run
+    :param runs: Number of pilot runs per density
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param seed: First seed of the pilot runs
+    :return: Mean fraction of the frames run at each density
+    """
+    assert runs > 0, "Pilot needs at least one run per density"
+    fractions = []
+    for prob_gas in probs_gas:
+        steps = [emergence_job({'N': int(N), 'prob_gas': float(prob_gas), 'proto_size': proto_size, 'star_size': star_size,
+                                'steps_dissipating': steps_dissipating, 'frames': frames, 'seed': seed + run,
+                                'count_steps': True})[2]
+                 for run in range(runs)]
+        fractions.append(np.mean(steps) / frames)
+    return np.array(fractions)
+
+
+def lpt_schedule(costs, workers):
+    """
+    Orders jobs longest first and predicts the makespan of list scheduling them on workers
+    that each take the next job when they become free
+
+    :param costs: Predicted cost of each job
+    :param workers: Number of workers
+    :return: Order of the jobs and the predicted makespan
+    """
+    order = np.argsort(costs, kind='stable')[::-1]
+    finish = [0.0] * workers
+    for job in order:
+        heapq.heapreplace(finish, finish[0] + costs[job])
+    return order, max(finish)
+
+
+def _timed_job(job):
+    """
+    Runs one emergence job in a worker process and times it
+
+    :param job: Parameters of the run
+    :return: Whether a proto-star and a star emerged, and the CPU seconds used
+    """
+    start = time.process_time()
+    outcome = emergence_job(job)
+    return outcome, time.process_time() - start
+
+
+def finite_size_study(sizes, probs_gas, runs=10, frames=1000, proto_size=25, star_size=100, steps_dissipating=50,
+                      workers=None, cost_model=None, pilot_runs=2, z=1.96, telemetry=None):
+    """
+    Estimates the emergence curve at several grid sizes for finite size scaling. The runs
+    of every size, density and replica are scheduled longest first by a calibrated cost
+    model, so the largest grids do not leave the other workers idle at the end. Dense runs
+    stop early when a star emerges, so the model without step fractions is completed by a
+    pilot on the smallest grid. Replicas are coupled across densities like
+    phase_transitions.simulate_coupled.
+
+    :param sizes: Grid sizes
+    :param probs_gas: Increasing gas densities
+    :param runs: Number of replicas per size and density
+    :param frames: Maximum number of steps per run
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param workers: Number of worker processes, all cores if None
+    :param cost_model: CostModel of the runs, calibrated if None
+    :param pilot_runs: Pilot runs per density measuring the step fractions of a model without
+                       them, 0 to assume runs last all frames
+    :param z: Quantile of the normal distribution of the confidence intervals
+    :param telemetry: Directory all runs report their progress to, watch it with python telemetry.py DIR --jobs N
+    :return: Dictionary with the curves per size (outcomes and coupled_estimates of proto-stars
+             and stars), the cost model, and the predicted makespan, pilot time, wall time,
+             CPU time and efficiency
+    """
+    probs_gas = np.asarray(probs_gas, dtype=float)
+    workers = workers or os.cpu_count()
+    cost_model = cost_model or calibrate(proto_size=proto_size, star_size=star_size, steps_dissipating=steps_dissipating)
+
+    start = time.perf_counter()
+    if cost_model.fractions is None and pilot_runs > 0:
+        fractions = pilot_fractions(min(sizes), probs_gas, frames, pilot_runs, proto_size, star_size, steps_dissipating,
+                                    seed=runs)  # Seeds after the replicas of the study
+        cost_model = CostModel(cost_model.cell, cost_model.agent, probs_gas, fractions)
+    pilot = time.perf_counter() - start
+
+    jobs = [{'N': int(N), 'prob_gas': float(prob_gas), 'proto_size': proto_size, 'star_size': star_size,
+             'steps_dissipating': steps_dissipating, 'frames': frames, 'seed': seed}
+            for N in sizes for seed in range(runs) for prob_gas in probs_gas]
+    for run_id, job in enumerate(jobs):
+        job.update(telemetry=telemetry, run_id=run_id)
+    costs = np.array([cost_model.predict(job['N'], job['prob_gas'], frames) for job in jobs])
+    order, makespan = lpt_schedule(costs, workers)
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_timed_job(jobs[k]) for k in order]
+    else:
+        # One job per task, so workers take the jobs in the scheduled order
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=warmup) as executor:
+            results = list(executor.map(_timed_job, [jobs[k] for k in order], chunksize=1))
+    wall = time.perf_counter() - start
+
+    outcomes = np.zeros((len(jobs), 2), dtype=bool)
+    cpu = 0.0
+    for k, (outcome, seconds) in zip(order, results):
+        outcomes[k] = outcome
+        cpu += seconds
+
+    curves = {}
+    outcomes = outcomes.reshape(len(sizes), runs, len(probs_gas), 2)
+    for index, N in enumerate(sizes):
+        curve = {'probs_gas': probs_gas, 'proto': outcomes[index, :, :, 0], 'star': outcomes[index, :, :, 1]}
+        for kind in ('proto', 'star'):
+            curve[f'{kind}_estimates'] = coupled_estimates(probs_gas, curve[kind], z)
+        curves[int(N)] = curve
+
+    return {'curves': curves, 'cost_model': cost_model, 'predicted_makespan': makespan, 'pilot': pilot, 'wall': wall, 'cpu': cpu,
+            'efficiency': cpu / (wall * workers) if wall > 0 else np.nan}
+
+
+def scaling_table(study, kind='star'):
+    """
+    Returns the emergence curves of a study as one table for scaling collapse analysis
+
+    :param study: Result of finite_size_study
+    :param kind: 'proto' or 'star'
+    :return: Array with one (N, prob_gas, probability, low, high) row per size and density
+    """
+    rows = []
+    for N, curve in sorted(study['curves'].items()):
+        estimates = curve[f'{kind}_estimates']
+        for k, prob_gas in enumerate(curve['probs_gas']):
+            rows.append((N, prob_gas, estimates['mean'][k], estimates['low'][k], estimates['high'][k]))
+    return np.array(rows, dtype=float).reshape(-1, 5)
+
+
+def rescale(table, critical, nu):
+    """
+    Rescales the densities of a scaling table as x = (prob_gas - critical) * N^(1/nu), so the
+    curves of all sizes collapse onto one curve for the right critical density and exponent
+
+    :param table: Result of scaling_table
+    :param critical: Critical density
+    :param nu: Correlation length exponent
+    :return: Rescaled densities and probabilities
+    """
+    return (table[:, 1] - critical) * table[:, 0] ** (1 / nu), table[:, 2]
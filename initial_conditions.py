@@ -0,0 +1,156 @@
+import numpy as np
+
+
+def uniform(size, prob_gas, seed=None):
+    """
+    Places gas uniformly, every cell is gas with the same probability
+
+    :param size: Size of the grid
+    :param prob_gas: Probability of cell being a gas particle
+    :param seed: Seed of the random generator
+    :return: Grid of initial states
+    """
+    rng = np.random.default_rng(seed)
+    return (rng.random((size, size), dtype=np.float32) < prob_gas).astype(np.int32)
+
+
+def gradient(size, prob_min, prob_max, axis=0, seed=None):
+    """
+    Places gas with a probability that increases linearly along one axis
+
+    :param size: Size of the grid
+    :param prob_min: Probability of gas at the first row (or column)
+    :param prob_max: Probability of gas at the last row (or column)
+    :param axis: Axis along which the probability increases
+    :param seed: Seed of the random generator
+    :return: Grid of initial states
+    """
+    assert 0 <= prob_min <= 1 and 0 <= prob_max <= 1, "Probabilities must be between 0 and 1"
+    assert axis in (0, 1), "Axis must be 0 or 1"
+
+    rng = np.random.default_rng(seed)
+    probs = np.linspace(prob_min, prob_max, size, dtype=np.float32)
+    probs = probs[:, None] if axis == 0 else probs[None, :]
+    return (rng.random((size, size), dtype=np.float32) < probs).astype(np.int32)
+
+
+def clustered(size, prob_gas, n_clusters=10, cluster_radius=5, seed=None):
+    """
+    Places gas around randomly placed cluster centers. The probability of gas is a sum of
+    periodic Gaussian bumps, scaled so the mean probability equals prob_gas after
+    saturating at 1.
+
+    :param size: Size of the grid
+    :param prob_gas: Mean probability of cell being a gas particle
+    :param n_clusters: Number of clusters
+    :param cluster_radius: Standard deviation of each cluster in cells
+    :param seed: Seed of the random generator
+    :return: Grid of initial states
+    """
+    assert isinstance(n_clusters, int) and n_clusters > 0, "Number of clusters must be a positive integer"
+    assert cluster_radius > 0, "Cluster radius must be positive"
+    from scipy import fft
+
+    rng = np.random.default_rng(seed)
+
+    # Cluster centers as impulses, smoothed with a periodic Gaussian in Fourier space
+    impulses = np.zeros((size, size), dtype=np.float32)
+    np.add.at(impulses, (rng.integers(0, size, n_clusters), rng.integers(0, size, n_clusters)), 1)
+    k = np.fft.fftfreq(size).astype(np.float32)
+    kernel = np.exp(-2 * (np.pi * cluster_radius) ** 2 * (k[:, None] ** 2 + k[None, :size // 2 + 1] ** 2))
+    field = fft.irfft2(fft.rfft2(impulses, workers=-1) * kernel, s=(size, size), workers=-1)
+
+    # Bisect the scale on a sample of cells, the mean of the clipped field grows with the scale
+    sample = np.maximum(rng.choice(field.ravel(), min(field.size, 1 << 16)), 0)
+    low, high = 0.0, prob_gas / max(sample.mean(), np.finfo(np.float32).tiny)
+    while np.minimum(sample * high, 1).mean() < prob_gas and high < 1e30:
+        low, high = high, high * 10
+    for _ in range(40):
+        scale = (low + high) / 2
+        if np.minimum(sample * scale, 1).mean() < prob_gas:
+            low = scale
+        else:
+            high = scale
+
+    probs = np.clip(field * high, 0, 1)
+    return (rng.random((size, size), dtype=np.float32) < probs).astype(np.int32)
+
+
+def gaussian_random_field(size, prob_gas, power=3.0, seed=None):
+    """
+    Places gas where a Gaussian random field with a power-law spectrum P(k) ~ k^-power
+    exceeds the threshold that makes exactly a fraction prob_gas of the cells gas.
+    Larger powers give larger structures.
+
+    :param size: Size of the grid
+    :param prob_gas: Fraction of cells that are gas particles
+    :param power: Spectral index of the field
+    :param seed: Seed of the random generator
+    :return: Grid of initial states
+    """
+    from scipy import fft
+
+    rng = np.random.default_rng(seed)
+
+    # Color white noise with the power spectrum
+    k = np.fft.fftfreq(size).astype(np.float32)
+    k2 = k[:, None] ** 2 + k[None, :size // 2 + 1] ** 2
+    k2[0, 0] = np.inf
+    noise = fft.rfft2(rng.standard_normal((size, size), dtype=np.float32), workers=-1)
+    field = fft.irfft2(noise * k2 ** (-power / 4), s=(size, size), workers=-1).ravel()
+
+    # Occupy the cells with the highest field values
+    n_gas = int(round(prob_gas * size * size))
+    states = np.zeros(size * size, dtype=np.int32)
+    if n_gas > 0:
+        states[np.argpartition(field, -n_gas)[-n_gas:]] = 1
+    return states.reshape(size, size)
+
+
+def from_file(path, size=None):
+    """
+    Loads an initial grid from a .npy file or a delimited text file
+
+    :param path: Path of the file
+    :param size: Expected size of the grid, not checked if None
+    :return: Grid of initial states
+    """
+    if str(path).endswith('.npy'):
+        states = np.load(path)
+    else:
+        states = np.loadtxt(path, delimiter=',')
+
+    states = np.asarray(states).astype(np.int32)
+    assert states.ndim == 2 and states.shape[0] == states.shape[1], "Initial grid must be square"
+    assert size is None or states.shape[0] == size, "Initial grid does not match the grid size"
+    assert np.isin(states, [0, 1]).all(), "Initial grid may only contain states 0 and 1"
+    return states
+
+
+# Available initial conditions, used by make_initial_states
+INITIAL_CONDITIONS = {
+    'uniform': uniform,
+    'gradient': gradient,
+    'clustered': clustered,
+    'grf': gaussian_random_field,
+}
+
+
+def make_initial_states(kind, size, prob_gas, seed=None, **kwargs):
+    """
+    Generates the initial grid of a given kind
+
+    :param kind: 'uniform', 'gradient', 'clustered', 'grf' or the path of a file to load
+    :param size: Size of the grid
+    :param prob_gas: Probability of cell being a gas particle
+    :param seed: Seed of the random generator
+    :param kwargs: Extra parameters of the initial condition
+    :return: Grid of initial states
+    """
+    if kind == 'gradient':
+        # Spread the probability around prob_gas, keeping the mean
+        spread = kwargs.pop('spread', prob_gas)
+        return gradient(size, max(prob_gas - spread, 0), min(prob_gas + spread, 1), seed=seed, **kwargs)
+    if kind in INITIAL_CONDITIONS:
+        return INITIAL_CONDITIONS[kind](size, prob_gas, seed=seed, **kwargs)
+    return from_file(kind, size)
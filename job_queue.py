@@ -0,0 +1,397 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+import numpy as np
+
+# Parameters of sweep.run_single that take integer values
+INTEGER_PARAMETERS = ('N', 'proto_size', 'star_size', 'steps_dissipating', 'seed', 'frames')
+
+# Parameters of jobs that do not set them, the defaults of main.py
+DEFAULTS = {'N': 100, 'prob_gas': 0.1, 'proto_size': 20, 'star_size': 100, 'steps_dissipating': 50, 'seed': 0}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    token TEXT,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+'''
+
+
+def grid_design(space):
+    """
+    Returns every combination of the values of each parameter
+
+    :param space: Dictionary mapping each parameter to its values
+    :return: List of jobs, one dictionary of parameters per job
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def latin_hypercube(space, samples, seed=None):
+    """
+    Returns a Latin hypercube design: each range is split in as many strata as samples
+    and every stratum of every parameter is sampled exactly once. Integer parameters
+    are rounded.
+
+    :param space: Dictionary mapping each parameter to its (low, high) range
+    :param samples: Number of jobs
+    :param seed: Seed of the random generator
+    :return: List of jobs, one dictionary of parameters per job
+    """
+    assert isinstance(samples, int) and samples > 0, "Samples must be a positive integer"
+
+    rng = np.random.default_rng(seed)
+    jobs = [{} for _ in range(samples)]
+    for name, (low, high) in space.items():
+        assert low <= high, "Ranges must have low <= high"
+        strata = (rng.permutation(samples) + rng.random(samples)) / samples
+        values = low + strata * (high - low)
+        for job, value in zip(jobs, values):
+            job[name] = int(round(value)) if name in INTEGER_PARAMETERS else float(value)
+    return jobs
+
+
+class JobQueue:
+    """
+    Class keeping sweep jobs in an SQLite table, so a study survives restarts. Workers
+    lease a job for a limited time; jobs whose lease runs out, because the worker died or
+    hung, and jobs that failed are leased again until they used up their attempts.
+
+    Attributes
+    ----------
+    path : str
+        Path of the database
+    max_attempts : int
+        Number of times a job is leased before it is marked as failed
+    connection : sqlite3.Connection
+        Connection to the database
+
+    Methods
+    -------
+    submit(jobs)
+        Adds jobs, skipping jobs already in the table
+    lease(worker, lease_time)
+        Leases the next job to a worker
+    heartbeat(job_id, token, lease_time)
+        Extends the lease of a running job
+    complete(job_id, token, result)
+        Records the outcome of a job
+    fail(job_id, token, error)
+        Records a failed attempt of a job
+    counts()
+        Returns the number of jobs in each status
+    results()
+        Returns the parameters and outcome of every finished job
+    close()
+        Closes the connection
+    """
+    def __init__(self, path, max_attempts=3):
+        """
+        Opens the job table, creating it if needed
+
+        :param path: Path of the database
+        :param max_attempts: Number of times a job is leased before it is marked as failed
+        """
+        assert isinstance(max_attempts, int) and max_attempts > 0, "Max attempts must be a positive integer"
+
+        self.path = path
+        self.max_attempts = max_attempts
+        # Autocommit, transactions are opened explicitly
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def submit(self, jobs):
+        """
+        Adds jobs, skipping jobs with the same parameters already in the table so a study
+        can be submitted again after a restart
+
+        :param jobs: Dictionaries of keyword arguments of sweep.run_single
+        :return: Number of jobs added
+        """
+        rows = []
+        for job in jobs:
+            params = json.dumps(job, sort_keys=True)
+            rows.append((params, params))
+
+        before = self.connection.total_changes
+        self.connection.execute('BEGIN')
+        try:
+            self.connection.executemany('INSERT OR IGNORE INTO jobs (key, params) VALUES (?, ?)', rows)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return self.connection.total_changes - before
+
+    def lease(self, worker, lease_time=3600):
+        """
+        Leases the next pending job, or a job whose lease ran out, to a worker
+
+        :param worker: Name of the worker
+        :param lease_time: Seconds before the job can be leased to another worker
+        :return: Job id, lease token and parameters, or None if no job is available
+        """
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Jobs that timed out too often are given up
+            self.connection.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', token = NULL "
+                                    "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?", (now, self.max_attempts))
+            row = self.connection.execute("SELECT id, params FROM jobs WHERE status = 'pending' "
+                                          "OR (status = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self.connection.execute('COMMIT')
+                return None
+
+            token = uuid.uuid4().hex
+            self.connection.execute("UPDATE jobs SET status = 'leased', attempts = attempts + 1, token = ?, worker = ?, lease_until = ? "
+                                    "WHERE id = ?", (token, worker, now + lease_time, row[0]))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return row[0], token, json.loads(row[1])
+
+    def heartbeat(self, job_id, token, lease_time=3600):
+        """
+        Extends the lease of a running job
+
+        :param job_id: Id of the job
+        :param token: Token of the lease
+        :param lease_time: Seconds from now before the job can be leased to another worker
+        :return: Whether the worker still holds the lease
+        """
+        with self.connection:
+            cursor = self.connection.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND token = ? AND status = 'leased'",
+                                             (time.time() + lease_time, job_id, token))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, token, result):
+        """
+        Records the outcome of a job, ignored if the lease was taken over by another worker
+
+        :param job_id: Id of the job
+        :param token: Token of the lease
+        :param result: JSON serializable outcome
+        :return: Whether the outcome was recorded
+        """
+        with self.connection:
+            cursor = self.connection.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, token = NULL, finished = ? "
+                                             "WHERE id = ? AND token = ?", (json.dumps(result), time.time(), job_id, token))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, token, error):
+        """
+        Records a failed attempt, the job is retried until it used up its attempts
+
+        :param job_id: Id of the job
+        :param token: Token of the lease
+        :param error: Description of the error
+        :return: Whether the failure was recorded
+        """
+        with self.connection:
+            cursor = self.connection.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                                             "error = ?, token = NULL WHERE id = ? AND token = ?",
+                                             (self.max_attempts, error, job_id, token))
+        return cursor.rowcount == 1
+
+    def counts(self):
+        """
+        Returns the number of jobs in each status
+
+        :return: Dictionary mapping pending, leased, done and failed to a number of jobs
+        """
+        counts = dict.fromkeys(('pending', 'leased', 'done', 'failed'), 0)
+        counts.update(self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return counts
+
+    def results(self):
+        """
+        Returns the parameters and outcome of every finished job
+
+        :return: List of (parameters, outcome) tuples, in submission order
+        """
+        rows = self.connection.execute("SELECT params, result FROM jobs WHERE status = 'done' ORDER BY id").fetchall()
+        return [(json.loads(params), json.loads(result)) for params, result in rows]
+
+    def close(self):
+        """
+        Closes the connection
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def run_job(params, run_id=0, telemetry=None):
+    """
+    Runs one sweep job and summarizes its record
+
+    :param params: Keyword arguments of sweep.run_single, missing parameters take the DEFAULTS
+    :param run_id: Id of the run in the telemetry
+    :param telemetry: Directory the progress of the run is reported to, not reported if None
+    :return: JSON serializable outcome: stars formed and mean and variance of the counts of states 1 to 3
+    """
+    from sweep import run_single
+
+    record = run_single(**dict(DEFAULTS, **params), keep_series=False, run_id=run_id, telemetry=telemetry)
+    return {'stars_formed': int(record['stars_formed']),
+            'mean': {state: float(distribution.mean) for state, distribution in record['distributions'].items()},
+            'variance': {state: float(distribution.variance()) for state, distribution in record['distributions'].items()}}
+
+
+def work(path, lease_time=3600, max_attempts=3, job=run_job, worker=None, telemetry=None):
+    """
+    Leases and runs jobs until none are left, renewing the lease of the running job so
+    jobs longer than the lease time are not taken over by another worker
+
+    :param path: Path of the database
+    :param lease_time: Seconds a job may run before another worker takes it over
+    :param max_attempts: Number of times a job is leased before it is marked as failed
+    :param job: Function running the parameters of a job and returning its outcome
+    :param worker: Name of the worker, the process id if None
+    :param telemetry: Directory the jobs report their progress to, passed to the job function
+                      with the job id as run_id, not reported if None
+    :return: Number of jobs completed
+    """
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    completed = 0
+    with JobQueue(path, max_attempts) as queue:
+        while True:
+            leased = queue.lease(worker, lease_time)
+            if leased is None:
+                return completed
+
+            job_id, token, params = leased
+            stop, lost = threading.Event(), threading.Event()
+            beat = threading.Thread(target=_heartbeat, args=(path, job_id, token, lease_time, stop, lost), daemon=True)
+            beat.start()
+            try:
+                result = job(params, run_id=job_id, telemetry=telemetry) if telemetry else job(params)
+                error = None
+            except Exception:
+                result, error = None, traceback.format_exc()
+            finally:
+                stop.set()
+                beat.join()
+
+            # The lease ran out or was taken over while the job ran, the result is abandoned
+            if lost.is_set():
+                continue
+            if error is not None:
+                queue.fail(job_id, token, error)
+            else:
+                completed += queue.complete(job_id, token, result)
+
+
+def _heartbeat(path, job_id, token, lease_time, stop, lost):
+    """
+    Renews the lease of a running job every third of the lease time until stopped, from
+    a thread with its own connection
+
+    :param path: Path of the database
+    :param job_id: Id of the job
+    :param token: Token of the lease
+    :param lease_time: Seconds a lease lasts
+    :param stop: Event set when the job finished
+    :param lost: Event set if the lease could not be renewed
+    """
+    with JobQueue(path) as queue:
+        while not stop.wait(lease_time / 3):
+            if not queue.heartbeat(job_id, token, lease_time):
+                lost.set()
+                return
+
+
+def run_workers(path, workers=None, lease_time=3600, max_attempts=3, job=run_job, telemetry=None):
+    """
+    Runs jobs of the queue in local worker processes until none are left
+
+    :param path: Path of the database
+    :param workers: Number of worker processes, all cores if None
+    :param lease_time: Seconds a job may run before another worker takes it over
+    :param max_attempts: Number of times a job is leased before it is marked as failed
+    :param job: Function running the parameters of a job, must be importable by the workers
+    :param telemetry: Directory the jobs report their progress to, watch it with python telemetry.py DIR
+    :return: Number of jobs in each status
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        work(path, lease_time, max_attempts, job, telemetry=telemetry)
+    else:
+        # Spawn the workers, like sweep.run_sweep
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_work_process, args=(path, lease_time, max_attempts, job, telemetry)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    with JobQueue(path, max_attempts) as queue:
+        return queue.counts()
+
+
+def _work_process(path, lease_time, max_attempts, job, telemetry):
+    """
+    Entry point of a worker process
+
+    :param path: Path of the database
+    :param lease_time: Seconds a job may run before another worker takes it over
+    :param max_attempts: Number of times a job is leased before it is marked as failed
+    :param job: Function running the parameters of a job
+    :param telemetry: Directory the jobs report their progress to, None to not report
+    """
+    from startup import warmup
+
+    warmup()
+    work(path, lease_time, max_attempts, job, telemetry=telemetry)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Persistent parameter sweep of the star formation model', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('database', type=str, help='SQLite file of the job table, created if needed')
+    parser.add_argument('--grid', type=str, default=None, help='JSON object mapping each parameter to its values')
+    parser.add_argument('--lhs', type=str, default=None, help='JSON object mapping each parameter to its [low, high] range')
+    parser.add_argument('--samples', type=int, default=100, help='Number of Latin hypercube samples')
+    parser.add_argument('--seeds', type=int, default=1, help='Seeds per parameter combination')
+    parser.add_argument('--frames', type=int, default=1000, help='Steps per run')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--lease', type=float, default=3600, help='Seconds a job may run before it is retried')
+    parser.add_argument('--attempts', type=int, default=3, help='Attempts per job')
+    parser.add_argument('--telemetry', type=str, default=None, help='Directory to report the progress of the jobs to, watch it with telemetry.py')
+    args = parser.parse_args()
+
+    # Submitting the same design again after a restart adds no jobs
+    if args.grid or args.lhs:
+        design = grid_design(json.loads(args.grid)) if args.grid else latin_hypercube(json.loads(args.lhs), args.samples, seed=0)
+        jobs = [dict(job, seed=seed, frames=args.frames) for job in design for seed in range(args.seeds)]
+        with JobQueue(args.database, args.attempts) as queue:
+            print('Added', queue.submit(jobs), 'of', len(jobs), 'jobs')
+
+    print(run_workers(args.database, args.workers, args.lease, args.attempts, telemetry=args.telemetry))
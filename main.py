@@ -1,25 +1,33 @@
 import argparse, time
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import matplotlib.colors as mcolors
 import numpy as np
-from scipy.stats import powerlaw, expon, pearsonr
 
 from CellularAutomaton import CellularAutomaton
+from events import EventLog
+from initial_conditions import make_initial_states
+from rendering import FrameRenderer
+from streaming_fit import StreamingDistribution
+from telemetry import Telemetry
+from autotune import AutoTuner
+from sweep import run, run_sweep, aggregate
 
 # Initialize the argument parser
 parser = argparse.ArgumentParser(description='2D Cellular Automaton Star Formation Simulation', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument('--one', type=bool, default=True, help='Run one sim or run all sims')
+parser.add_argument('--one', type=lambda value: value.lower() in ('true', '1', 'yes'), default=True, help='Run one sim or run all sims')
 parser.add_argument('--N', type=int, default=100, help='Grid size')
 parser.add_argument('--prob_gas', type=float, default=0.1, help='Probability of cell being a gas particle')
 parser.add_argument('--proto_size', type=int, default=20, help='Size needed to form proto star')
 parser.add_argument('--star_size', type=int, default=100, help='Size needed to form star')
 parser.add_argument('--steps_dissipating', type=int, default=50, help='Steps dissipation')
-
-# Parse the arguments
-args = parser.parse_args()
-
-def simulate(N, prob_gas, proto_size, star_size, steps_dissipating):
+parser.add_argument('--frame_stride', type=int, default=1, help='Only save every n-th frame to the gif')
+parser.add_argument('--frame_scale', type=int, default=1, help='Downscaling factor of the gif')
+parser.add_argument('--runs', type=int, default=10, help='Seeds per density when running all sims')
+parser.add_argument('--workers', type=int, default=None, help='Worker processes when running all sims (default: all cores)')
+parser.add_argument('--init', type=str, default='uniform', help='Initial condition: uniform, gradient, clustered, grf or a file to load')
+parser.add_argument('--events', type=str, default=None, help='Directory to write the star lifecycle event catalog to')
+parser.add_argument('--telemetry', type=str, default=None, help='Directory to report the progress of the runs to, watch it with telemetry.py')
+parser.add_argument('--tune', type=lambda value: value.lower() in ('true', '1', 'yes'), default=False, help='Choose the fastest density backends, plans are cached per machine')
+
+def simulate(N, prob_gas, proto_size, star_size, steps_dissipating, init='uniform', frame_stride=1, frame_scale=1, events=None, telemetry=None, tune=False):
     assert isinstance(N, int) and N > 0, "Grid size N must be a positive integer."
     assert isinstance(prob_gas, float) and 0 <= prob_gas <= 1, "Probability of gas must be a float between 0 and 1."
     assert isinstance(proto_size, int) and 0 < proto_size <= N*N, "Proto size must be a positive integer and less than or equal to N."
@@ -29,81 +37,56 @@ def simulate(N, prob_gas, proto_size, star_size, steps_dissipating):
 
     p = [1-prob_gas, prob_gas]
 
-    # Initialize the cellular automaton
-    automaton = CellularAutomaton(N, p, proto_size, star_size, steps_dissipating)
-
-    global counts
-    global star_formations
-    time_step_counter = 0
-    state_3_groups = set()
-    star_formation_counter = 0
-
-    counts = {1: [], 2: [], 3: []}  # Dictionary of lists for each state
-
-    # Define colors for each state
-    colors = {0: 'white',  # Color for state 0
-            1: 'green',   # Color for state 1
-            2: 'orange',    # Color for state 2
-            3: 'yellow',
-            4: 'blue'}  # Color for state 3
-
-    # Create a color map from the defined colors
-    cmap = mcolors.ListedColormap([colors[i] for i in range(len(colors))])
-
-    # Set up the figure for visualization
-    fig, ax = plt.subplots()
-    mat = ax.matshow(automaton.get_grid_states(), cmap=cmap, vmin=0, vmax=len(colors))
-
-    # Update function for the animation
-    def update(frame):
-        nonlocal time_step_counter, state_3_groups, star_formation_counter
-        # print(time_step_counter)
-        if time_step_counter >= 1000:
-            star_formations.append(star_formation_counter)
-            plt.close()  # Closes the plot and ends the animation
-            return
-                
-        current_state_3_groups = {group for group in automaton.groups if group.state == 3}
-        new_state_3_groups = current_state_3_groups - state_3_groups
-        if new_state_3_groups:
-            # For each new group of state 3, update the counter
-            star_formation_counter += len(new_state_3_groups)
-        
-        # Update the tracking set to the current set of groups in state 3
-        state_3_groups = current_state_3_groups
-
-        counts[1].append(sum(agent.state == 1 for row in automaton.grid for agent in row))
-        counts[2].append(sum(agent.state == 2 for row in automaton.grid for agent in row))
-        counts[3].append(sum(agent.state == 3 for row in automaton.grid for agent in row))
-
-        mat.set_data(automaton.update(frame))
-
-        time_step_counter += 1
-        return [mat]
-
-    ani = animation.FuncAnimation(fig, update, interval=1/120, save_count=1000)
-    
-    # To save the animation using Pillow as a gif
-    ani.save(f'results/gifs/density_{prob_gas}.gif', writer=animation.PillowWriter(fps=15))
-
-def check_dist(prob_gas):
-    data = counts[3]
+    # Initialize the cellular automaton, logging the star lifecycle events if asked
+    log = EventLog(events) if events else None
+    reporter = Telemetry(telemetry, steps=1000, cells=N * N) if telemetry else None
+    automaton = CellularAutomaton(N, p, proto_size, star_size, steps_dissipating, initial_states=make_initial_states(init, N, prob_gas), events=log, telemetry=reporter,
+                                  tuner=AutoTuner() if tune else None)
+
+    # Frames are encoded in a background thread while the automaton keeps stepping
+    with FrameRenderer(f'results/gifs/density_{prob_gas}.gif', fps=15, stride=frame_stride, scale=frame_scale) as renderer:
+        result = run(automaton, 1000, renderer)
+
+    if log:
+        log.close()
+    if reporter:
+        reporter.close()
+    return result
+
+def check_dist(prob_gas, data):
+    # Plotting and fitting libraries are only imported when needed
+    import matplotlib.pyplot as plt
+    from scipy.stats import powerlaw, expon
+
+    # Streaming statistics, so long runs and ensembles never need their full series
+    if not isinstance(data, StreamingDistribution):
+        distribution = StreamingDistribution()
+        distribution.update(data)
+        data = distribution
+
+    # Nothing to plot without values
+    if data.n == 0:
+        return
 
     # Prepare data for analysis
-    hist, bin_edges = np.histogram(data, bins='auto', density=True)
-    bin_centers = 0.5 * (bin_edges[:-1] + bin_edges[1:])
-
-    # Fit the data to a power-law distribution
-    a, loc, scale = powerlaw.fit(data)
-
-    # Fit the data to an exponential distribution
-    param = expon.fit(data, floc=0)
-    exponential_pdf = expon.pdf(bin_centers, *param)
+    hist, bin_edges = data.histogram(density=True)
+    bin_centers = np.sqrt(bin_edges[:-1] * bin_edges[1:])
+    bin_centers[0] = 0.5 * bin_edges[1]
 
     # Plot the data on a log-log scale
     plt.loglog(bin_centers, hist, 'o', label='bin_centers')
-    plt.loglog(bin_centers, powerlaw.pdf(bin_centers, a, loc, scale), '-', label='powerlaw fit')    # Plot the powerlaw fit
-    plt.loglog(bin_centers, exponential_pdf, '-', label='Exponential fit')                          # Plot the exponential fit
+
+    # The fits need positive counts, runs without stars only plot the histogram
+    if data.n_positive:
+        # Fit the data to a power-law distribution
+        a, loc, scale = data.powerlaw_fit()
+
+        # Fit the data to an exponential distribution
+        param = data.expon_fit()
+        exponential_pdf = expon.pdf(bin_centers, *param)
+
+        plt.loglog(bin_centers, powerlaw.pdf(bin_centers, a, loc, scale), '-', label='powerlaw fit')    # Plot the powerlaw fit
+        plt.loglog(bin_centers, exponential_pdf, '-', label='Exponential fit')                          # Plot the exponential fit
     plt.xlabel('Count')
     plt.ylabel('Probability Density')
     plt.title(f'Log-Log Plot with fit (Gas Density {prob_gas})')
@@ -112,23 +95,28 @@ def check_dist(prob_gas):
     plt.close()
 
 
-def check_pearson(probs_gas):
-    stars_formed = np.array(star_formations)
+def check_pearson(probs_gas, stars_formed):
+    from scipy.stats import pearsonr
+
+    stars_formed = np.array(stars_formed)
     print(probs_gas, stars_formed)
     correlation_coefficient, p_value = pearsonr(probs_gas, stars_formed)
     print(correlation_coefficient, p_value)
 
 
 if __name__ == "__main__":
-    if args.one == True:
-        probs_gas = [args.prob_gas]
+    # Parse the arguments
+    args = parser.parse_args()
+
+    if args.one:
+        # Call the simulate function with arguments from the command line
+        result = simulate(args.N, args.prob_gas, args.proto_size, args.star_size, args.steps_dissipating, args.init, args.frame_stride, args.frame_scale, args.events, args.telemetry, args.tune)
+        check_dist(args.prob_gas, result['distributions'][3])
     else:
+        # Run every density for every seed in parallel and check the pooled ensemble
         probs_gas = np.arange(0.02, 0.21, 0.045)
+        records = run_sweep(probs_gas, range(args.runs), args.N, args.proto_size, args.star_size, args.steps_dissipating, init=args.init, workers=args.workers, keep_series=False, events=args.events, telemetry=args.telemetry, tune=args.tune)
+        for prob_gas, runs in aggregate(records).items():
+            check_dist(prob_gas, runs['distributions'][3])
 
-    star_formations = []
-    for prob_gas in probs_gas:
-        # Call the simulate function with arguments from the command line
-        simulate(args.N, prob_gas, args.proto_size, args.star_size, args.steps_dissipating)
-        check_dist(prob_gas)
-    
-    check_pearson(probs_gas)
+        check_pearson([record['prob_gas'] for record in records], [record['stars_formed'] for record in records])
@@ -1,19 +1,23 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from CellularAutomaton import CellularAutomaton
+from initial_conditions import make_initial_states
+from startup import warmup
+from telemetry import Telemetry
 import numpy as np
-import matplotlib.pyplot as plt
 
 
-def simulate(N, probs_gas, frames=1000, runs=10, proto_size=25, star_size=100, steps_dissipating=50):
+def simulate(N, probs_gas, frames=1000, runs=10, proto_size=25, star_size=100, steps_dissipating=50, telemetry=None):
     results = []
-    for prob_gas in probs_gas:
-        print('Simulating for prob_gas =', prob_gas)
+    for k, prob_gas in enumerate(probs_gas):
         emergence = [prob_gas, 0, 0]
         for i in range(runs):
-            print('Run', i+1, 'of', runs)
             p = [1 - prob_gas, prob_gas]
 
-            # Initialize the cellular automaton
-            automaton = CellularAutomaton(N, p, proto_size, star_size, steps_dissipating)
+            # Initialize the cellular automaton, reporting its progress if asked
+            reporter = Telemetry(telemetry, job=k * runs + i, steps=frames, cells=N * N) if telemetry else None
+            automaton = CellularAutomaton(N, p, proto_size, star_size, steps_dissipating, telemetry=reporter)
 
             proto = False
             star = False
@@ -25,6 +29,8 @@ def simulate(N, probs_gas, frames=1000, runs=10, proto_size=25, star_size=100, s
                 if 3 in states:
                     star = True
                     break
+            if reporter:
+                reporter.close()
 
             # Add to emergence
             emergence[1] += int(proto)
@@ -47,7 +53,203 @@ def simulate(N, probs_gas, frames=1000, runs=10, proto_size=25, star_size=100, s
     # Plot results
     plot_transitions(results)
 
+def emergence_run(initial_states, proto_size, star_size, steps_dissipating, frames, seed, count_steps=False, telemetry=None, run_id=0):
+    """
+    Runs the automaton from an initial grid until a star emerges
+
+    :param initial_states: Initial state of each cell
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param frames: Maximum number of steps
+    :param seed: Seed of the movement stream
+    :param count_steps: Whether to also return the number of steps run
+    :param telemetry: Directory the progress of the run is reported to, not reported if None
+    :param run_id: Id of the run in the telemetry
+    :return: Whether a proto-star and a star emerged, and the number of steps if count_steps
+    """
+    np.random.seed(seed)
+    N = initial_states.shape[0]
+    reporter = Telemetry(telemetry, job=run_id, steps=frames, cells=N * N) if telemetry else None
+    automaton = CellularAutomaton(N, [1, 0], proto_size, star_size, steps_dissipating, initial_states=initial_states,
+                                  telemetry=reporter)
+
+    proto = False
+    star = False
+    steps = 0
+    for j in range(frames):
+        states = automaton.update(j)
+        steps += 1
+        if 2 in states:
+            proto = True
+        if 3 in states:
+            proto = star = True
+            break
+    if reporter:
+        reporter.close()
+    return (proto, star, steps) if count_steps else (proto, star)
+
+
+def emergence_job(job):
+    """
+    Runs one replica at one density in a worker process
+
+    :param job: Parameters of the run, with 'count_steps' to also return the number of steps, and
+                'telemetry' and 'run_id' to report its progress
+    :return: Whether a proto-star and a star emerged, and the number of steps if counted
+    """
+    # Every density of a replica thresholds the same uniform field
+    initial_states = make_initial_states('uniform', job['N'], job['prob_gas'], seed=job['seed'])
+    return emergence_run(initial_states, job['proto_size'], job['star_size'], job['steps_dissipating'], job['frames'], job['seed'],
+                         job.get('count_steps', False), job.get('telemetry'), job.get('run_id', 0))
+
+
+def simulate_coupled(N, probs_gas, frames=1000, runs=10, proto_size=25, star_size=100, steps_dissipating=50, workers=1, z=1.96,
+                     telemetry=None):
+    """
+    Estimates the emergence probabilities with common random numbers: replica r runs every
+    density from the same uniform field, thresholded at each density, and the same movement
+    seed. Outcomes of neighbouring densities are then strongly correlated, so differences
+    and the transition are estimated from far fewer runs than with independent grids.
+
+    :param N: Grid size
+    :param probs_gas: Increasing gas densities
+    :param frames: Maximum number of steps per run
+    :param runs: Number of replicas
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param workers: Number of worker processes, all cores if None
+    :param z: Quantile of the normal distribution of the confidence intervals
+    :param telemetry: Directory all runs report their progress to, watch it with python telemetry.py DIR --jobs N
+    :return: Dictionary with the outcomes per replica and density ('proto' and 'star', runs x densities)
+             and the estimates of coupled_estimates for each
+    """
+    probs_gas = np.asarray(probs_gas, dtype=float)
+    assert np.all(np.diff(probs_gas) > 0), "Gas densities must be increasing"
+
+    jobs = [{'N': N, 'prob_gas': float(prob_gas), 'proto_size': proto_size, 'star_size': star_size,
+             'steps_dissipating': steps_dissipating, 'frames': frames, 'seed': seed}
+            for seed in range(runs) for prob_gas in probs_gas]
+    for run_id, job in enumerate(jobs):
+        job.update(telemetry=telemetry, run_id=run_id)
+
+    if workers == 1:
+        outcomes = [emergence_job(job) for job in jobs]
+    else:
+        # Spawn the workers, like sweep.run_sweep
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=warmup) as executor:
+            outcomes = list(executor.map(emergence_job, jobs))
+
+    outcomes = np.array(outcomes, dtype=bool).reshape(runs, len(probs_gas), 2)
+    result = {'probs_gas': probs_gas, 'proto': outcomes[:, :, 0], 'star': outcomes[:, :, 1]}
+    for kind in ('proto', 'star'):
+        result[f'{kind}_estimates'] = coupled_estimates(probs_gas, result[kind], z)
+    return result
+
+
+def wilson_interval(successes, n, z=1.96):
+    """
+    Returns the Wilson score interval of a binomial proportion
+
+    :param successes: Number of successes
+    :param n: Number of trials
+    :param z: Quantile of the normal distribution
+    :return: Lower and upper bound
+    """
+    successes = np.asarray(successes, dtype=float)
+    p = successes / n
+    center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+
+def isotonic(values, weights=None):
+    """
+    Returns the non-decreasing sequence closest to values in weighted least squares,
+    with the pool adjacent violators algorithm
+
+    :param values: Values
+    :param weights: Weights of the values, equal if None
+    :return: Non-decreasing fit
+    """
+    values = np.asarray(values, dtype=float)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)
+
+    # Blocks of pooled values: mean, weight and number of values
+    blocks = []
+    for value, weight in zip(values, weights):
+        blocks.append([value, weight, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean, weight, count = blocks.pop()
+            total = blocks[-1][1] + weight
+            blocks[-1] = [(blocks[-1][0] * blocks[-1][1] + mean * weight) / total, total, blocks[-1][2] + count]
+    return np.concatenate([np.full(count, mean) for mean, weight, count in blocks])
+
+
+def coupled_estimates(probs_gas, outcomes, z=1.96):
+    """
+    Estimates an emergence curve from coupled replicas
+
+    - 'mean' with Wilson intervals 'low' and 'high': the plain estimate per density,
+      as from independent runs
+    - 'monotone': isotonic fit of the means, the curve is non-decreasing in the density
+    - 'threshold': per replica, the lowest density from which the event always occurs,
+      infinite for replicas where it does not settle up to the highest density. These
+      replicas are right-censored, 'censored' counts them.
+    - 'threshold_curve' with Wilson intervals 'threshold_low' and 'threshold_high': fraction
+      of replicas whose threshold is at most each density. It uses the whole path of each
+      replica, so it is monotone, and with every replica censored at the highest density it
+      is the Kaplan-Meier estimate of the threshold distribution.
+    - 'critical' with interval 'critical_low' and 'critical_high': median threshold, the
+      lowest density where the threshold curve reaches one half, and the densities where the
+      upper and lower bound of the curve do. Censored replicas only count as not settled, so
+      bounds the data cannot identify are infinite.
+    - 'differences' with intervals 'differences_low' and 'differences_high': change of the
+      probability between neighbouring densities from paired replicas, much narrower than
+      the difference of two independent estimates
+
+    :param probs_gas: Increasing gas densities
+    :param outcomes: Outcome of each replica (rows) at each density (columns)
+    :param z: Quantile of the normal distribution of the confidence intervals
+    :return: Dictionary of estimates
+    """
+    probs_gas = np.asarray(probs_gas, dtype=float)
+    outcomes = np.asarray(outcomes, dtype=float)
+    runs = outcomes.shape[0]
+
+    mean = outcomes.mean(axis=0)
+    low, high = wilson_interval(outcomes.sum(axis=0), runs, z)
+
+    # Lowest density from which the event occurs at every higher density
+    settled = np.flip(np.cumprod(np.flip(outcomes, axis=1), axis=1), axis=1).astype(bool)
+    first = np.where(settled.any(axis=1), settled.argmax(axis=1), len(probs_gas))
+    threshold = np.where(first < len(probs_gas), probs_gas[np.minimum(first, len(probs_gas) - 1)], np.inf)
+    settled_count = (threshold[:, None] <= probs_gas[None, :]).sum(axis=0)
+    threshold_curve = settled_count / runs
+    threshold_low, threshold_high = wilson_interval(settled_count, runs, z)
+
+    def median(curve):
+        # Lowest density where a curve reaches one half, infinite if it does not
+        reached = np.flatnonzero(curve >= 0.5)
+        return probs_gas[reached[0]] if len(reached) else np.inf
+
+    # Paired differences between neighbouring densities
+    steps = np.diff(outcomes, axis=1)
+    differences = steps.mean(axis=0)
+    differences_error = z * steps.std(axis=0, ddof=1) / np.sqrt(runs) if runs > 1 else np.full(len(differences), np.inf)
+
+    return {'mean': mean, 'low': low, 'high': high, 'monotone': isotonic(mean),
+            'threshold': threshold, 'censored': int(np.isinf(threshold).sum()), 'threshold_curve': threshold_curve,
+            'threshold_low': threshold_low, 'threshold_high': threshold_high,
+            'critical': median(threshold_curve), 'critical_low': median(threshold_high), 'critical_high': median(threshold_low),
+            'differences': differences, 'differences_low': differences - differences_error, 'differences_high': differences + differences_error}
+
+
 def plot_transitions(data):
+    # Only the plots need matplotlib, worker processes importing this module do not
+    import matplotlib.pyplot as plt
+
     # Create figure
     fig, ax = plt.subplots(2)
 
@@ -0,0 +1,151 @@
+import copy
+
+import numpy as np
+
+from CellularAutomaton import CellularAutomaton
+from initial_conditions import make_initial_states
+from telemetry import Telemetry
+
+
+def largest_proto_size(automaton):
+    """
+    Order parameter of star emergence: the size of the largest proto-star group, infinite
+    once a star exists
+
+    :param automaton: Cellular automaton
+    :return: Size of the largest proto-star group
+    """
+    largest = 0
+    for group in automaton.groups:
+        if group.state == 3:
+            return np.inf
+        if group.state == 2:
+            largest = max(largest, group.size)
+    return largest
+
+
+class Snapshot:
+    """
+    Class holding the state of a run when it first crossed an interface
+
+    Attributes
+    ----------
+    automaton : CellularAutomaton
+        Automaton after the crossing step, branches step copies of it
+    frame : int
+        Step at which the interface was crossed
+    """
+    def __init__(self, automaton, frame):
+        """
+        Constructs a new snapshot
+
+        :param automaton: Automaton that is no longer stepped
+        :param frame: Step at which the interface was crossed
+        """
+        self.automaton = automaton
+        self.frame = frame
+
+
+def _advance(automaton, start, frames, level, order_parameter):
+    """
+    Steps an automaton until its order parameter reaches a level or the run ends. Group
+    formation and merges make the order parameter jump, so a snapshot may already be past
+    the next level, it reaches it without stepping.
+
+    :param automaton: Cellular automaton
+    :param start: First step to run
+    :param frames: Number of steps of a whole run
+    :param level: Level to reach
+    :param order_parameter: Function returning the order parameter of an automaton
+    :return: Step at which the level was reached or None, and the number of steps run
+    """
+    if order_parameter(automaton) >= level:
+        return start - 1, 0
+    for frame in range(start, frames):
+        automaton.update(frame)
+        if order_parameter(automaton) >= level:
+            return frame, frame - start + 1
+    return None, frames - start
+
+
+def forward_flux(N, prob_gas, interfaces, frames=1000, trials=100, proto_size=25, star_size=100, steps_dissipating=50,
+                 seed=0, order_parameter=largest_proto_size, z=1.96, telemetry=None):
+    """
+    Estimates the probability that a star emerges within a number of steps by forward flux
+    sampling. Runs from fresh grids are stopped when they first cross the first interface of
+    the order parameter, and their snapshots are branched with fresh random streams towards
+    the next interface, and so on until a star emerges. The probability is the product of
+    the fractions of branches reaching each next interface, so rare emergence is estimated
+    without running the many runs that never nucleate to the end.
+
+    :param N: Grid size
+    :param prob_gas: Probability of cell being a gas particle
+    :param interfaces: Increasing levels of the order parameter, star emergence is the last level
+    :param frames: Number of steps of a run, snapshots keep the step at which they were taken
+    :param trials: Runs per stage, one number for all stages or one per stage (len(interfaces) + 1)
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param seed: Seed of the grids and random streams
+    :param order_parameter: Function returning the order parameter of an automaton
+    :param z: Quantile of the normal distribution of the confidence interval
+    :param telemetry: Directory every run and branch reports its progress to, numbered in the
+                      order they run, not reported if None
+    :return: Dictionary with the probability and its interval, the fraction, trials and hits of
+             each stage and the number of steps simulated
+    """
+    levels = [float(level) for level in interfaces] + [np.inf]
+    assert all(a < b for a, b in zip(levels, levels[1:])), "Interfaces must be increasing"
+    trials = [trials] * len(levels) if isinstance(trials, int) else list(trials)
+    assert len(trials) == len(levels) and all(t > 0 for t in trials), "Trials must be positive, one per stage"
+
+    # One independent stream per run and branch
+    streams = iter(np.random.SeedSequence(seed).generate_state(sum(trials)))
+    steps = 0
+    hits = []
+    snapshots = []
+    for stage, level in enumerate(levels):
+        reached = []
+        for trial in range(trials[stage]):
+            stream = int(next(streams))
+            if stage == 0:
+                initial_states = make_initial_states('uniform', N, prob_gas, seed=stream)
+                np.random.seed(stream)
+                automaton = CellularAutomaton(N, [1 - prob_gas, prob_gas], proto_size, star_size, steps_dissipating, initial_states=initial_states)
+                start = 0
+            else:
+                # Branch the snapshots in turn with a fresh random stream
+                snapshot = snapshots[trial % len(snapshots)]
+                automaton = copy.deepcopy(snapshot.automaton)
+                np.random.seed(stream)
+                start = snapshot.frame + 1
+
+            # Snapshots are copied, so the reporter is detached once the branch ends
+            if telemetry:
+                automaton.telemetry = Telemetry(telemetry, job=sum(trials[:stage]) + trial, steps=frames - start, cells=N * N)
+            frame, run = _advance(automaton, start, frames, level, order_parameter)
+            if telemetry:
+                automaton.telemetry.close()
+                automaton.telemetry = None
+            steps += run
+            if frame is not None:
+                reached.append(Snapshot(automaton, frame) if stage < len(levels) - 1 else None)
+
+        hits.append(len(reached))
+        snapshots = reached
+        if not reached:
+            break
+
+    fractions = np.array(hits) / np.array(trials[:len(hits)])
+    probability = float(np.prod(fractions)) if len(hits) == len(levels) else 0.0
+
+    # Relative variance of a product of independent binomial fractions
+    if probability > 0:
+        relative = np.sqrt(np.sum((1 - fractions) / (fractions * np.array(trials[:len(hits)]))))
+        low, high = probability * np.exp(-z * relative), probability * np.exp(z * relative)
+    else:
+        # Wilson upper bound of the stage without hits
+        low, high = 0.0, float(np.prod(fractions[:-1]) * z ** 2 / (trials[len(hits) - 1] + z ** 2))
+
+    return {'probability': probability, 'low': low, 'high': high, 'fractions': fractions,
+            'trials': trials[:len(hits)], 'hits': hits, 'steps': steps}
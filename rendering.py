@@ -0,0 +1,175 @@
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+# Colour of each state: gas free space, gas, proto-star, star and dissipating
+PALETTE = np.array([
+    [255, 255, 255],  # 0 white
+    [0, 128, 0],      # 1 green
+    [255, 165, 0],    # 2 orange
+    [255, 255, 0],    # 3 yellow
+    [0, 0, 255],      # 4 blue
+], dtype=np.uint8)
+
+
+def downscale(states, scale):
+    """
+    Downscales a state grid by keeping every scale-th cell in both directions
+
+    :param states: State of each cell
+    :param scale: Downscaling factor
+    :return: Downscaled state grid
+    """
+    return states[::scale, ::scale] if scale > 1 else states
+
+
+def states_to_rgb(states, scale=1):
+    """
+    Maps a state grid to RGB pixels through the palette lookup table
+
+    :param states: State of each cell
+    :param scale: Downscaling factor
+    :return: Array of shape (rows, columns, 3) with the colour of each cell
+    """
+    return PALETTE[downscale(np.asarray(states), scale)]
+
+
+class FrameRenderer:
+    """
+    Class encoding state grids to a GIF (or a video through ffmpeg) in a background
+    thread while the simulation keeps stepping. GIF frames use the states directly as
+    palette indices, videos are converted to RGB with the palette lookup table.
+
+    Attributes
+    ----------
+    path : str
+        Output file, '.gif' or any video format ffmpeg understands
+    fps : int
+        Frames per second of the output
+    stride : int
+        Only every stride-th added frame is encoded
+    scale : int
+        Downscaling factor of the frames
+    frames : int
+        Number of frames encoded
+
+    Methods
+    -------
+    add(states)
+        Queues a state grid for encoding
+    close()
+        Encodes the remaining frames and closes the output file
+    """
+    def __init__(self, path, fps=15, stride=1, scale=1, max_queued=64):
+        """
+        Constructs a new frame renderer and starts its encoding thread
+
+        :param path: Output file
+        :param fps: Frames per second of the output
+        :param stride: Only every stride-th added frame is encoded
+        :param scale: Downscaling factor of the frames
+        :param max_queued: Maximum number of frames waiting to be encoded
+        """
+        assert isinstance(stride, int) and stride > 0, "Stride must be a positive integer"
+        assert isinstance(scale, int) and scale > 0, "Scale must be a positive integer"
+        assert path.endswith('.gif') or shutil.which('ffmpeg'), "Video output needs ffmpeg on the path"
+
+        self.path = path
+        self.fps = fps
+        self.stride = stride
+        self.scale = scale
+        self.frames = 0
+        self.added = 0
+        self.error = None
+        self.queue = queue.Queue(max_queued)
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+
+    def add(self, states):
+        """
+        Queues a state grid for encoding, blocks only if the encoder falls far behind
+
+        :param states: State of each cell
+        """
+        if self.added % self.stride == 0:
+            # Copy, the simulation may reuse the array
+            self.queue.put(downscale(np.asarray(states), self.scale).astype(np.uint8))
+        self.added += 1
+
+    def close(self, raise_error=True):
+        """
+        Encodes the remaining frames and closes the output file
+
+        :param raise_error: Whether to raise the error of the encoder, if any
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error and raise_error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Never mask an exception raised inside the with block
+        self.close(raise_error=exc[0] is None)
+        return False
+
+    def _encode(self):
+        """
+        Encoding loop of the background thread
+        """
+        try:
+            if self.path.endswith('.gif'):
+                self._encode_gif()
+            else:
+                self._encode_video()
+        except Exception as error:
+            self.error = error
+            # Keep draining so add() never blocks on a dead encoder
+            while self.queue.get() is not None:
+                pass
+
+    def _encode_gif(self):
+        """
+        Writes the GIF one frame at a time, so frames never pile up in memory
+        """
+        from PIL import Image, GifImagePlugin
+
+        palette = PALETTE.tobytes()
+        duration = 1000 / self.fps
+        with open(self.path, 'wb') as fp:
+            header_written = False
+            while (states := self.queue.get()) is not None:
+                image = Image.frombytes('P', states.shape[::-1], states.tobytes())
+                image.putpalette(palette)
+                if not header_written:
+                    header, _ = GifImagePlugin.getheader(image, palette, {'loop': 0, 'duration': duration, 'optimize': False})
+                    fp.write(b''.join(header))
+                    header_written = True
+                fp.write(b''.join(GifImagePlugin.getdata(image, duration=duration)))
+                self.frames += 1
+            fp.write(b';')
+
+    def _encode_video(self):
+        """
+        Pipes RGB frames to ffmpeg
+        """
+        process = None
+        try:
+            while (states := self.queue.get()) is not None:
+                if process is None:
+                    height, width = states.shape
+                    process = subprocess.Popen(
+                        ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                         '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-', '-pix_fmt', 'yuv420p', self.path],
+                        stdin=subprocess.PIPE)
+                process.stdin.write(PALETTE[states].tobytes())
+                self.frames += 1
+        finally:
+            if process:
+                process.stdin.close()
+                process.wait()
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Kernels declared with lazy_jit, compiled by warmup()
+KERNELS = []
+
+
+class LazyKernel:
+    """
+    Class wrapping a function that is only compiled with numba on its first call, so
+    importing a module does not import numba. Compiled kernels are cached on disk, later
+    processes load them instead of compiling again.
+
+    Attributes
+    ----------
+    func : function
+        Python function to compile
+    options : dict
+        Options passed to numba.jit
+    warmup_args : function
+        Returns example arguments used to compile the kernel ahead of its first call
+    compiled : function
+        Compiled kernel, None until compiled
+
+    Methods
+    -------
+    compile()
+        Compiles the kernel, or loads it from the on-disk cache
+    """
+    def __init__(self, func, options, warmup_args=None):
+        """
+        Constructs a new lazy kernel
+
+        :param func: Python function to compile
+        :param options: Options passed to numba.jit
+        :param warmup_args: Returns example arguments used to compile the kernel in warmup()
+        """
+        self.func = func
+        self.options = options
+        self.warmup_args = warmup_args
+        self.compiled = None
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def compile(self):
+        """
+        Compiles the kernel, or loads it from the on-disk cache
+
+        :return: Compiled kernel
+        """
+        if self.compiled is None:
+            from numba import jit, prange
+
+            # Kernels called from this kernel must be compiled first, numba can only call compiled functions
+            for name in self.func.__code__.co_names:
+                kernel = self.func.__globals__.get(name)
+                if isinstance(kernel, LazyKernel):
+                    self.func.__globals__[name] = kernel.compile()
+
+            # Parallel loops are written with prange, which is range until numba compiles them
+            if 'prange' in self.func.__code__.co_names:
+                self.func.__globals__['prange'] = prange
+
+            self.compiled = jit(**self.options)(self.func)
+        return self.compiled
+
+    def __call__(self, *args, **kwargs):
+        return (self.compiled or self.compile())(*args, **kwargs)
+
+
+def lazy_jit(warmup_args=None, **options):
+    """
+    Decorator declaring a numba kernel that is compiled on first use and cached on disk
+
+    :param warmup_args: Returns example arguments used to compile the kernel in warmup()
+    :param options: Options passed to numba.jit
+    :return: Decorator returning a LazyKernel
+    """
+    options.setdefault('cache', True)
+
+    def decorator(func):
+        kernel = LazyKernel(func, options, warmup_args)
+        KERNELS.append(kernel)
+        return kernel
+    return decorator
+
+
+def warmup():
+    """
+    Compiles (or loads from the cache) every kernel declared so far. Worker pools call this
+    once per worker so runs do not pay for compilation.
+    """
+    # Import the modules declaring kernels
+    import CellularAutomaton
+    import cluster_analysis
+    import autotune
+    from ArrayAutomaton import ArrayAutomaton
+
+    for kernel in KERNELS:
+        if kernel.warmup_args:
+            kernel(*kernel.warmup_args())
+        else:
+            kernel.compile()
+
+    # The fused step compiles its helpers for the argument types it is called with
+    ArrayAutomaton(4, [0, 1], 1, 1, 1).run(1)
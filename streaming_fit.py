@@ -0,0 +1,197 @@
+import numpy as np
+
+
+class StreamingDistribution:
+    """
+    Class keeping sufficient statistics of a stream of non-negative counts, so histograms,
+    moments and maximum likelihood fits are available at any point in constant memory and
+    can be merged across runs and workers
+
+    Attributes
+    ----------
+    bins_per_decade : int
+        Number of logarithmic histogram bins per decade
+    xmin : float
+        Lower bound of the tail used for the Pareto exponent
+    n : int
+        Number of values seen
+    n_zero : int
+        Number of zeros seen
+    mean : float
+        Running mean
+    m2 : float
+        Running sum of squared deviations from the mean
+    n_positive : int
+        Number of positive values seen
+    sum_log : float
+        Sum of the logarithms of the positive values
+    maximum : float
+        Largest value seen
+    n_tail : int
+        Number of values of at least xmin
+    sum_log_tail : float
+        Sum of log(x / xmin) over the values of at least xmin
+    counts : numpy.ndarray
+        Number of positive values in each logarithmic bin
+
+    Methods
+    -------
+    update(values)
+        Adds values to the statistics
+    merge(other)
+        Adds the statistics of another distribution
+    variance()
+        Returns the variance of the values
+    histogram(density=True)
+        Returns the logarithmic histogram of the values
+    expon_fit()
+        Returns the exponential fit in scipy.stats.expon convention
+    powerlaw_fit()
+        Returns the power law fit in scipy.stats.powerlaw convention
+    pareto_exponent()
+        Returns the exponent of a power law tail p(x) ~ x^-alpha above xmin
+    """
+    def __init__(self, bins_per_decade=10, xmin=1):
+        """
+        Constructs a new, empty distribution
+
+        :param bins_per_decade: Number of logarithmic histogram bins per decade
+        :param xmin: Lower bound of the tail used for the Pareto exponent
+        """
+        assert isinstance(bins_per_decade, int) and bins_per_decade > 0, "Bins per decade must be a positive integer"
+        assert xmin > 0, "xmin must be positive"
+
+        self.bins_per_decade = bins_per_decade
+        self.xmin = xmin
+        self.n = 0
+        self.n_zero = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.n_positive = 0
+        self.sum_log = 0.0
+        self.maximum = 0.0
+        self.n_tail = 0
+        self.sum_log_tail = 0.0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def update(self, values):
+        """
+        Adds values to the statistics
+
+        :param values: Non-negative values
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        assert values.min() >= 0, "Values must be non-negative"
+
+        chunk = StreamingDistribution(self.bins_per_decade, self.xmin)
+        chunk.n = len(values)
+        chunk.mean = values.mean()
+        chunk.m2 = ((values - chunk.mean) ** 2).sum()
+        chunk.maximum = values.max()
+
+        positive = values[values > 0]
+        chunk.n_zero = chunk.n - len(positive)
+        chunk.n_positive = len(positive)
+        logs = np.log(positive)
+        chunk.sum_log = logs.sum()
+
+        tail = positive >= self.xmin
+        chunk.n_tail = int(tail.sum())
+        chunk.sum_log_tail = (logs[tail] - np.log(self.xmin)).sum()
+
+        # Bins start at 1, values below 1 go to the first bin
+        bins = np.maximum(np.floor(logs / np.log(10) * self.bins_per_decade), 0).astype(np.int64)
+        chunk.counts = np.bincount(bins)
+
+        self.merge(chunk)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another distribution with the same binning
+
+        :param other: Distribution to add
+        """
+        assert other.bins_per_decade == self.bins_per_decade and other.xmin == self.xmin, "Distributions must have the same binning"
+        if other.n == 0:
+            return
+
+        # Combine the moments with the parallel algorithm of Chan et al.
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n = n
+
+        self.n_zero += other.n_zero
+        self.n_positive += other.n_positive
+        self.sum_log += other.sum_log
+        self.maximum = max(self.maximum, other.maximum)
+        self.n_tail += other.n_tail
+        self.sum_log_tail += other.sum_log_tail
+
+        if len(other.counts) > len(self.counts):
+            self.counts = np.pad(self.counts, (0, len(other.counts) - len(self.counts)))
+        self.counts[:len(other.counts)] += other.counts
+
+    def variance(self):
+        """
+        Returns the variance of the values
+
+        :return: Population variance
+        """
+        return self.m2 / self.n if self.n else np.nan
+
+    def histogram(self, density=True):
+        """
+        Returns the logarithmic histogram of the values. The first bin starts at 0 and also
+        holds the zeros, so the density is normalised over all values like numpy.histogram.
+
+        :param density: Whether to normalise the histogram to a probability density
+        :return: Histogram and bin edges, like numpy.histogram, both empty without values
+        """
+        if self.n == 0:
+            return np.zeros(0), np.zeros(1)
+
+        counts = np.zeros(max(len(self.counts), 1), dtype=np.int64)
+        counts[:len(self.counts)] = self.counts
+        counts[0] += self.n_zero
+        edges = 10 ** (np.arange(len(counts) + 1) / self.bins_per_decade)
+        edges[0] = 0
+        if not density:
+            return counts, edges
+        return counts / (self.n * np.diff(edges)), edges
+
+    def expon_fit(self):
+        """
+        Returns the maximum likelihood exponential fit with the location fixed at 0,
+        like scipy.stats.expon.fit(data, floc=0)
+
+        :return: Location and scale
+        """
+        return 0.0, self.mean
+
+    def powerlaw_fit(self):
+        """
+        Returns the maximum likelihood fit of scipy.stats.powerlaw to the positive values,
+        with the location fixed at 0 and the scale at the largest value
+
+        :return: Shape, location and scale
+        """
+        if self.n_positive == 0:
+            return np.nan, 0.0, 0.0
+        log_ratio = self.n_positive * np.log(self.maximum) - self.sum_log
+        a = self.n_positive / log_ratio if log_ratio > 0 else np.inf
+        return a, 0.0, self.maximum
+
+    def pareto_exponent(self):
+        """
+        Returns the maximum likelihood exponent of a power law tail p(x) ~ x^-alpha
+        over the values of at least xmin
+
+        :return: Exponent alpha
+        """
+        if self.sum_log_tail <= 0:
+            return np.nan
+        return 1 + self.n_tail / self.sum_log_tail
@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from autotune import AutoTuner, SERIAL_BACKENDS
+from CellularAutomaton import CellularAutomaton
+from cluster_analysis import ClusterAnalyzer, cluster_columns
+from events import EventLog
+from initial_conditions import make_initial_states
+from startup import warmup
+from streaming_fit import StreamingDistribution
+from telemetry import Telemetry
+
+
+def run(automaton, frames=1000, renderer=None, keep_series=True, chunk=1024, clusters_every=0):
+    """
+    Steps an automaton, counting the cells in each state and the stars formed
+
+    :param automaton: Cellular automaton to step
+    :param frames: Number of steps
+    :param renderer: Optional FrameRenderer receiving the state grid of every step
+    :param keep_series: Whether to return the full count series, the streaming distributions are always returned
+    :param chunk: Number of steps buffered before the distributions are updated
+    :param clusters_every: Steps between two cluster labelings of the occupied cells, 0 to not label clusters
+    :return: Dictionary with the count series and distributions of states 1, 2 and 3, number of stars formed
+             and, if labeled, one row of cluster statistics per step (-1 for steps not labeled)
+    """
+    state_3_groups = set()
+    star_formation_counter = 0
+
+    distributions = {1: StreamingDistribution(), 2: StreamingDistribution(), 3: StreamingDistribution()}
+    buffer = np.zeros((3, frames if keep_series else min(chunk, frames)), dtype=np.int64)
+
+    if clusters_every:
+        analyzer = ClusterAnalyzer(automaton.size)
+        clusters = np.full((frames, cluster_columns(automaton.size)), -1, dtype=np.int64)
+
+    states = automaton.get_grid_states()
+    for frame in range(frames):
+        current_state_3_groups = {group for group in automaton.groups if group.state == 3}
+
+        # For each new group of state 3, update the counter
+        star_formation_counter += len(current_state_3_groups - state_3_groups)
+
+        # Update the tracking set to the current set of groups in state 3
+        state_3_groups = current_state_3_groups
+
+        column = frame % buffer.shape[1]
+        for state in distributions:
+            buffer[state - 1, column] = np.count_nonzero(states == state)
+
+        # Flush a full buffer into the distributions
+        if column == buffer.shape[1] - 1 or frame == frames - 1:
+            for state, distribution in distributions.items():
+                distribution.update(buffer[state - 1, :column + 1])
+
+        if clusters_every and frame % clusters_every == 0:
+            clusters[frame] = analyzer.analyze(states)
+
+        if renderer:
+            renderer.add(states)
+        states = automaton.update(frame)
+
+    result = {'distributions': distributions, 'stars_formed': star_formation_counter}
+    if keep_series:
+        result['counts'] = {state: buffer[state - 1] for state in distributions}
+    if clusters_every:
+        result['clusters'] = clusters
+    return result
+
+
+def run_single(N, prob_gas, proto_size, star_size, steps_dissipating, seed, frames=1000, init='uniform', keep_series=True, events=None, run_id=0, telemetry=None, tune=False):
+    """
+    Runs one simulation from a seed, the result only depends on the arguments
+
+    :param N: Grid size
+    :param prob_gas: Probability of cell being a gas particle
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param seed: Seed of the initial grid and the movement
+    :param frames: Number of steps
+    :param init: Initial condition, see initial_conditions.make_initial_states
+    :param keep_series: Whether to keep the full count series besides the streaming distributions
+    :param events: Directory the group lifecycle events are written to, not logged if None
+    :param run_id: Id of the run in the event catalog and the telemetry
+    :param telemetry: Directory the progress of the run is reported to, see telemetry.Monitor, not reported if None
+    :param tune: Whether the density backends are chosen by an AutoTuner with the plan cache of the machine,
+                 or the names of the backends it chooses from
+    :return: Record with the parameters, the count series and distributions, and the number of stars formed
+    """
+    np.random.seed(seed)
+    initial_states = make_initial_states(init, N, prob_gas, seed=seed)
+    log = EventLog(events, run=run_id) if events else None
+    reporter = Telemetry(telemetry, job=run_id, steps=frames, cells=N * N) if telemetry else None
+    automaton = CellularAutomaton(N, [1 - prob_gas, prob_gas], proto_size, star_size, steps_dissipating, initial_states=initial_states,
+                                  events=log, telemetry=reporter, tuner=AutoTuner(backends=None if tune is True else tune) if tune else None)
+
+    record = {'N': N, 'prob_gas': prob_gas, 'proto_size': proto_size, 'star_size': star_size,
+              'steps_dissipating': steps_dissipating, 'seed': seed, 'frames': frames, 'init': init, 'run_id': run_id}
+    record.update(run(automaton, frames, keep_series=keep_series))
+    if log:
+        log.close()
+    if reporter:
+        reporter.close()
+    return record
+
+
+def _run_job(job):
+    """
+    Runs a job in a worker process
+
+    :param job: Keyword arguments of run_single
+    :return: Record of the run
+    """
+    return run_single(**job)
+
+
+def run_sweep(probs_gas, seeds, N=100, proto_size=20, star_size=100, steps_dissipating=50, frames=1000, init='uniform', workers=None, keep_series=True, events=None, telemetry=None, tune=False):
+    """
+    Runs every combination of gas density and seed in parallel worker processes
+
+    :param probs_gas: Gas densities
+    :param seeds: Seeds, each density is run once per seed
+    :param N: Grid size
+    :param proto_size: Size needed to form proto star
+    :param star_size: Size needed to form star
+    :param steps_dissipating: Steps dissipation
+    :param frames: Number of steps per run
+    :param init: Initial condition, see initial_conditions.make_initial_states
+    :param workers: Number of worker processes, all cores if None
+    :param keep_series: Whether runs keep their full count series besides the streaming distributions
+    :param events: Directory all runs write their group lifecycle events to, see events.load_events
+    :param telemetry: Directory all runs report their progress to, watch it with python telemetry.py DIR --jobs N
+    :param tune: Whether the runs choose their density backends with an AutoTuner, results are unchanged,
+                 or the names of the backends they choose from. With several workers the threaded
+                 backend is left out by default, it would oversubscribe the cores.
+    :return: List of run records, ordered by density and then seed
+    """
+    if tune is True and (workers or os.cpu_count()) > 1:
+        tune = SERIAL_BACKENDS
+    jobs = [{'N': N, 'prob_gas': float(prob_gas), 'proto_size': proto_size, 'star_size': star_size,
+             'steps_dissipating': steps_dissipating, 'seed': int(seed), 'frames': frames, 'init': init, 'keep_series': keep_series}
+            for prob_gas in probs_gas for seed in seeds]
+    for run_id, job in enumerate(jobs):
+        job.update(events=events, run_id=run_id, telemetry=telemetry, tune=tune)
+
+    if workers == 1:
+        return [_run_job(job) for job in jobs]
+
+    # Spawn the workers, forking after numba started its thread pool deadlocks them.
+    # Each worker loads the cached kernels once before its first job.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=warmup) as executor:
+        return list(executor.map(_run_job, jobs))
+
+
+def aggregate(records):
+    """
+    Groups run records by gas density
+
+    :param records: Run records
+    :return: Dictionary mapping each density to its stars formed per run, merged distributions
+             and, if the runs kept them, pooled count series
+    """
+    ensemble = {}
+    for record in records:
+        runs = ensemble.setdefault(record['prob_gas'], {'stars_formed': [], 'counts': {1: [], 2: [], 3: []},
+                                                        'distributions': {state: StreamingDistribution() for state in (1, 2, 3)}})
+        runs['stars_formed'].append(record['stars_formed'])
+        for state in runs['counts']:
+            runs['distributions'][state].merge(record['distributions'][state])
+            if 'counts' in record:
+                runs['counts'][state].append(record['counts'][state])
+
+    for runs in ensemble.values():
+        runs['stars_formed'] = np.array(runs['stars_formed'])
+        if runs['counts'][1]:
+            runs['counts'] = {state: np.concatenate(series) for state, series in runs['counts'].items()}
+        else:
+            del runs['counts']
+
+    return ensemble
@@ -0,0 +1,267 @@
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+
+class Telemetry:
+    """
+    Class reporting the progress of one run to a directory shared by all workers. Each
+    worker process appends JSON lines to its own file, at most once per interval, so a
+    step only costs a counter increment and a clock read. Every line is a snapshot of the
+    run: the steps done and the seconds spent in each phase of a step so far.
+
+    Attributes
+    ----------
+    path : str
+        Directory of the telemetry files
+    job : int
+        Id of the run, to tell the runs of a sweep apart
+    steps : int
+        Maximum number of steps of the run
+    cells : int
+        Number of cells of the grid
+    interval : float
+        Minimum seconds between two snapshots
+    worker : int
+        Process id of the worker
+    count : int
+        Number of steps done
+    phases : dict
+        Seconds spent in each phase of a step
+
+    Methods
+    -------
+    lap(phase, mark)
+        Adds the time since a mark to a phase and returns a new mark
+    step()
+        Counts a step and writes a snapshot if the interval passed
+    write(done=False)
+        Writes a snapshot
+    close()
+        Writes the last snapshot
+    """
+    def __init__(self, path, job=0, steps=0, cells=0, interval=1.0):
+        """
+        Constructs a new telemetry reporter and writes the first snapshot
+
+        :param path: Directory of the telemetry files
+        :param job: Id of the run
+        :param steps: Maximum number of steps of the run
+        :param cells: Number of cells of the grid
+        :param interval: Minimum seconds between two snapshots
+        """
+        assert interval >= 0, "Interval must not be negative"
+
+        self.path = path
+        self.job = job
+        self.steps = steps
+        self.cells = cells
+        self.interval = interval
+        self.worker = os.getpid()
+        self.count = 0
+        self.phases = {}
+        os.makedirs(path, exist_ok=True)
+        self.file = open(os.path.join(path, f'worker-{self.worker}.jsonl'), 'a')
+        self.start = time.perf_counter()
+        self.write()
+
+    def lap(self, phase, mark):
+        """
+        Adds the time since a mark to a phase
+
+        :param phase: Name of the phase
+        :param mark: Value of time.perf_counter at the start of the phase
+        :return: Value of time.perf_counter now, the mark of the next phase
+        """
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - mark
+        return now
+
+    def step(self):
+        """
+        Counts a step and writes a snapshot if the interval passed since the last one
+        """
+        self.count += 1
+        if time.perf_counter() >= self.next_write:
+            self.write()
+
+    def write(self, done=False):
+        """
+        Writes a snapshot of the run
+
+        :param done: Whether the run ended
+        """
+        now = time.perf_counter()
+        record = {'worker': self.worker, 'job': self.job, 'step': self.count, 'steps': self.steps, 'cells': self.cells,
+                  'time': time.time(), 'elapsed': now - self.start, 'phases': self.phases, 'done': done}
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        self.next_write = now + self.interval
+
+    def close(self):
+        """
+        Writes the last snapshot, marking the run as done
+        """
+        if not self.file.closed:
+            self.write(done=True)
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class Monitor:
+    """
+    Class aggregating the telemetry files of a sweep while it runs. Every poll only reads
+    the lines appended since the previous poll, and keeps the last two snapshots of each
+    run to measure its current speed.
+
+    Attributes
+    ----------
+    path : str
+        Directory of the telemetry files
+    jobs : int
+        Number of runs of the sweep, None if unknown
+    stale : float
+        Seconds without a snapshot after which a running run is reported as stalled
+    runs : dict
+        Previous and last snapshot of each (worker, job)
+
+    Methods
+    -------
+    poll()
+        Reads the new snapshots and returns the status of the sweep
+    status()
+        Returns the status of the sweep
+    """
+    def __init__(self, path, jobs=None, stale=30.0):
+        """
+        Constructs a new monitor
+
+        :param path: Directory of the telemetry files
+        :param jobs: Number of runs of the sweep, to count the runs not started in the ETA
+        :param stale: Seconds without a snapshot after which a run is reported as stalled
+        """
+        self.path = path
+        self.jobs = jobs
+        self.stale = stale
+        self.runs = {}
+        self.offsets = {}
+
+    def poll(self):
+        """
+        Reads the snapshots appended since the last poll, a line still being written is
+        left for the next poll
+
+        :return: Status of the sweep, see status()
+        """
+        for file in sorted(glob.glob(os.path.join(self.path, 'worker-*.jsonl'))):
+            offset = self.offsets.get(file, 0)
+            with open(file, 'rb') as handle:
+                handle.seek(offset)
+                data = handle.read()
+            end = data.rfind(b'\n') + 1
+            self.offsets[file] = offset + end
+
+            for line in data[:end].splitlines():
+                record = json.loads(line)
+                key = (record['worker'], record['job'])
+                self.runs[key] = (self.runs.get(key, (None, None))[1], record)
+        return self.status()
+
+    def status(self, now=None):
+        """
+        Returns the status of the sweep from the snapshots read so far. Speeds are measured
+        between the last two snapshots of each running run, the ETA assumes runs take all
+        their steps and is an upper bound for runs that stop early.
+
+        :param now: Current time.time(), the clock is read if None
+        :return: Dictionary with the number of runs done, running and stalled, the steps and
+                 cells per second, the ETA in seconds, the progress of each worker and the
+                 phases sorted by total time as (phase, seconds, fraction)
+        """
+        now = time.time() if now is None else now
+        done = 0
+        stalled = []
+        steps_per_second = 0.0
+        cells_per_second = 0.0
+        remaining = 0
+        workers = {}
+        phases = {}
+        for (worker, job), (previous, last) in self.runs.items():
+            for phase, seconds in last['phases'].items():
+                phases[phase] = phases.get(phase, 0.0) + seconds
+            if last['done']:
+                done += 1
+                continue
+
+            remaining += last['steps'] - last['step']
+            if now - last['time'] > self.stale:
+                stalled.append(job)
+                rate = 0.0
+            elif previous is not None and last['elapsed'] > previous['elapsed']:
+                rate = (last['step'] - previous['step']) / (last['elapsed'] - previous['elapsed'])
+            else:
+                rate = last['step'] / last['elapsed'] if last['elapsed'] > 0 else 0.0
+            steps_per_second += rate
+            cells_per_second += rate * last['cells']
+            workers[worker] = {'job': job, 'step': last['step'], 'steps': last['steps'], 'steps_per_second': rate}
+
+        # Runs not started yet are assumed as long as the runs seen
+        if self.jobs is not None and self.runs:
+            remaining += max(self.jobs - len(self.runs), 0) * np.mean([last['steps'] for _, last in self.runs.values()])
+
+        total = sum(phases.values())
+        breakdown = sorted(((phase, seconds, seconds / total if total > 0 else 0.0) for phase, seconds in phases.items()),
+                           key=lambda row: -row[1])
+        return {'done': done, 'running': len(self.runs) - done - len(stalled), 'stalled': sorted(stalled),
+                'jobs': self.jobs, 'steps_per_second': steps_per_second, 'cells_per_second': cells_per_second,
+                'eta': remaining / steps_per_second if steps_per_second > 0 else (0.0 if remaining == 0 else np.inf),
+                'workers': workers, 'phases': breakdown}
+
+
+def format_status(status):
+    """
+    Returns the status of a sweep as one line
+
+    :param status: Result of Monitor.status
+    :return: Line with the runs done, the speeds, the ETA and the slowest phases
+    """
+    jobs = '?' if status['jobs'] is None else status['jobs']
+    eta = 'unknown' if np.isinf(status['eta']) else time.strftime('%H:%M:%S', time.gmtime(status['eta']))
+    line = (f"{status['done']}/{jobs} done, {status['running']} running, {len(status['stalled'])} stalled | "
+            f"{status['steps_per_second']:.1f} steps/s, {status['cells_per_second']:.3g} cells/s | ETA {eta}")
+    if status['phases']:
+        line += ' | ' + ', '.join(f'{phase} {fraction:.0%}' for phase, _, fraction in status['phases'])
+    if status['stalled']:
+        line += f" | stalled runs {status['stalled']}"
+    return line
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Live progress of a sweep writing telemetry')
+    parser.add_argument('path', type=str, help='Directory of the telemetry files')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of runs of the sweep')
+    parser.add_argument('--interval', type=float, default=2.0, help='Seconds between two updates')
+    parser.add_argument('--stale', type=float, default=30.0, help='Seconds without progress before a run is stalled')
+    args = parser.parse_args()
+
+    monitor = Monitor(args.path, args.jobs, args.stale)
+    try:
+        while True:
+            status = monitor.poll()
+            print(format_status(status), flush=True)
+            if args.jobs is not None and status['done'] >= args.jobs:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from ArrayAutomaton import ArrayAutomaton, STAT_GROUPS, STAT_BORN
+from equivalence import compare_star_distributions, reference_engine
+
+
+def initial_states(seed, size=20, prob_gas=0.3):
+    return (np.random.default_rng(seed).random((size, size)) < prob_gas).astype(np.int64)
+
+def test_initialization():
+    states = initial_states(0)
+    automaton = ArrayAutomaton(20, [0.7, 0.3], 5, 20, 5, initial_states=states)
+    assert np.array_equal(automaton.get_grid_states(), states)
+    assert automaton.groups == []
+    assert automaton.star == 10
+
+def test_run_conserves_gas():
+    states = initial_states(1)
+    automaton = ArrayAutomaton(20, [0.7, 0.3], 5, 20, 5, initial_states=states, seed=1)
+    stats = automaton.run(30)
+    assert stats.shape == (30, 7)
+    assert (stats[:, :5].sum(axis=1) == 400).all()
+    assert (stats[:, 0] == 400 - states.sum()).all()
+    assert stats[-1, STAT_GROUPS] == len(automaton.groups)
+    assert np.array_equal(np.bincount(automaton.get_grid_states().ravel(), minlength=5), stats[-1, :5])
+
+def test_run_matches_single_steps():
+    states = initial_states(2)
+    batched = ArrayAutomaton(20, [0.7, 0.3], 5, 20, 5, initial_states=states, seed=3)
+    batched.run(25)
+    stepped = ArrayAutomaton(20, [0.7, 0.3], 5, 20, 5, initial_states=states, seed=3)
+    for frame in range(25):
+        stepped.update(frame)
+    assert np.array_equal(batched.get_grid_states(), stepped.get_grid_states())
+    assert np.array_equal(batched.get_group_statistics(), stepped.get_group_statistics())
+
+def test_group_labels():
+    automaton = ArrayAutomaton(20, [0.7, 0.3], 5, 20, 5, initial_states=initial_states(4, prob_gas=0.5), seed=0)
+    automaton.run(3)
+    states = automaton.get_grid_states()
+    labels = automaton.get_group_labels()
+    assert ((labels >= 0) == (states >= 2)).all()
+
+def test_star_formation_matches_reference():
+    reference = lambda states: reference_engine(states, 5, 20, 5)
+    candidate = lambda states: ArrayAutomaton(states.shape[0], [1, 0], 5, 20, 5, initial_states=states)
+    result = compare_star_distributions(reference, candidate, initial_states, 40, range(8))
+    assert result['equivalent']
@@ -47,5 +47,56 @@ class TestCellularAutomaton:
         grid_states = automaton.get_grid_states()
         assert isinstance(grid_states, np.ndarray)  
 
+    def test_interaction_candidates(self):
+        initial_states = np.zeros((10, 10), dtype=np.int64)
+        initial_states[3:6, 3:6] = 1
+        automaton = CellularAutomaton(10, [1, 0], 5, 100, 50, initial_states=initial_states)
+        automaton.interact(4, 4)
+
+        candidates = automaton.interaction_candidates()
+        group = automaton.groups[0]
+        # The center of the group is not on its frontier
+        assert 4 * 10 + 4 not in candidates
+        assert (4, 4) not in group.frontier
+        assert len(group.frontier) == 8
+        assert group.bbox == (3, 5, 3, 5)
+
+    def test_near_other_group(self):
+        initial_states = np.zeros((10, 10), dtype=np.int64)
+        initial_states[1:4, 1:4] = 1
+        initial_states[1:4, 6:9] = 1
+        automaton = CellularAutomaton(10, [1, 0], 5, 100, 50, initial_states=initial_states)
+        automaton.interact(2, 2)
+        automaton.interact(2, 7)
+        first, second = automaton.groups
+        # The boxes are two cells apart
+        assert not automaton.near_other_group(first)
+
+        automaton.extend_bbox(second, 2, 4)
+        assert automaton.near_other_group(first)
+
+    def test_incremental_frontiers(self):
+        # Candidates from the maintained frontiers match a scan of the whole grid
+        np.random.seed(4)
+        automaton = CellularAutomaton(30, [0.8, 0.2], 6, 30, 10)
+        for frame in range(40):
+            automaton.update(frame)
+            states = automaton.get_grid_states()
+            labels = automaton.get_group_labels()
+            grouped = (states == 2) | (states == 3)
+            assert np.array_equal(automaton.labels[grouped], labels[grouped])
+
+            interior = grouped.copy()
+            touching = np.zeros_like(grouped)
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    if di or dj:
+                        interior &= np.roll(np.where(grouped, labels, -1), (-di, -dj), (0, 1)) == labels
+                        touching |= np.roll(grouped, (-di, -dj), (0, 1))
+            gas = (states == 1).astype(np.int64)
+            crowded = sum(np.roll(gas, (di, dj), (0, 1)) for di in range(-3, 4) for dj in range(-3, 4)) - gas > 6
+            expected = np.flatnonzero((grouped & ~interior) | ((states == 1) & (crowded | touching))).tolist()
+            assert automaton.interaction_candidates() == expected
+
 if __name__ == "__main__":
     pytest.main()
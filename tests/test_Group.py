@@ -57,4 +57,53 @@ def test_group_merge():
     group1.merge(group2)
     assert len(group1.agents) == 2
     assert group2.merged
-    assert agent2.group is group1
\ No newline at end of file
+    assert agent2.group is group1
+
+def test_group_merge_bbox():
+    agent1 = Agent(np.int32(2))
+    agent1.position = (0, 0)
+    group1 = Group(agent1, 10, 5, 15)
+    group1.frontier, group1.bbox = {(1, 1)}, (1, 1, 1, 1)
+
+    agent2 = Agent(np.int32(2))
+    agent2.position = (5, 6)
+    group2 = Group(agent2, 10, 5, 15)
+    group2.frontier, group2.bbox = {(5, 6)}, (5, 5, 6, 6)
+
+    group1.merge(group2)
+    assert group1.frontier == {(1, 1), (5, 6)}
+    assert group1.bbox == (1, 5, 1, 6)
+
+def test_group_transition_by_indirection():
+    agents = [Agent(np.int32(1)) for _ in range(3)]
+    for k, agent in enumerate(agents):
+        agent.position = (k, 0)
+    group = Group(agents[0], 3, 0, 0)
+    group.append(agents[1])
+    group.append(agents[2])
+
+    group.update()
+    assert [agent.state for agent in agents] == [3, 3, 3]
+    assert agents[2].center_group == (1, 0)
+
+    # Dissipating only changes the group, an agent reverting to gas leaves it
+    assert not group.update()
+    assert [agent.state for agent in agents] == [4, 4, 4]
+    agents[0].state = np.int32(1)
+    assert agents[0].state == 1 and agents[0].group is None
+    assert agents[1].state == 4
+
+def test_group_merge_chain():
+    groups = []
+    for k in range(3):
+        agent = Agent(np.int32(1))
+        agent.position = (k, k)
+        groups.append(Group(agent, 10, 5, 15))
+    groups[2].state = 3
+
+    groups[1].merge(groups[0])
+    groups[2].merge(groups[1])
+    assert groups[2].size == 3
+    for agent in groups[2].agents:
+        assert agent.group is groups[2]
+        assert agent.state == 3
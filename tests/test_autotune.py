@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+from autotune import AutoTuner, BACKENDS, SERIAL_BACKENDS, occupancy_bucket
+from CellularAutomaton import CellularAutomaton, density_grid
+from initial_conditions import make_initial_states
+
+
+def test_backends_agree():
+    rng = np.random.default_rng(0)
+    for shape, radius in (((12, 12), 3), ((9, 14), 5), ((4, 4), 5)):
+        values = (rng.random(shape) < 0.3) * rng.integers(1, 5, shape)
+        reference = BACKENDS['direct'](values, radius)
+        for backend, function in BACKENDS.items():
+            assert np.array_equal(function(values, radius), reference), backend
+    assert np.array_equal(AutoTuner(path=False).density(values), density_grid(values))
+
+def test_plan_cache(tmp_path):
+    path = tmp_path / 'plans.json'
+    values = np.zeros((16, 16), dtype=np.int64)
+    values[::4, ::4] = 1
+    tuner = AutoTuner(str(path), repeats=1)
+    tuner.box_sum('gas', values, 3)
+    assert path.exists() and set(tuner.plans['gas:16x16:3:-4']['times']) == set(BACKENDS)
+
+    # A new process reuses the plan without timing the backends again
+    again = AutoTuner(str(path))
+    again.benchmark = None
+    assert again.plan('gas', values, 3) == tuner.plans['gas:16x16:3:-4']['backend']
+
+def test_concurrent_saves(tmp_path):
+    # Tuners that loaded the cache before any of them saved keep every plan
+    path = str(tmp_path / 'plans.json')
+    tuners = [AutoTuner(path, repeats=1, backends=['prefix']) for _ in range(8)]
+    threads = [threading.Thread(target=tuner.plan, args=('gas', np.ones((4 + k, 4), dtype=np.int64), 1)) for k, tuner in enumerate(tuners)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(AutoTuner(path).plans) == 8
+
+def test_restricted_backends(tmp_path):
+    path = str(tmp_path / 'plans.json')
+    values = np.ones((8, 8), dtype=np.int64)
+    tuner = AutoTuner(path, repeats=1)
+    tuner.plans['gas:8x8:1:0'] = {'backend': 'threaded', 'times': {'threaded': 1.0, 'fft': 3.0, 'prefix': 2.0}}
+
+    # Workers leaving out the threaded backend pick the fastest of theirs without timing again
+    serial = AutoTuner(path, backends=SERIAL_BACKENDS)
+    serial.plans = tuner.plans
+    serial.benchmark = None
+    assert 'threaded' not in SERIAL_BACKENDS and serial.plan('gas', values, 1) == 'prefix'
+
+    # Backends without times are timed and added to the plan
+    sparse = AutoTuner(path, repeats=1, backends=['sparse'])
+    sparse.plans = dict(tuner.plans)
+    assert sparse.plan('gas', values, 1) == 'sparse'
+    assert set(sparse.plans['gas:8x8:1:0']['times']) == {'threaded', 'fft', 'prefix', 'sparse'}
+
+def test_replan_on_occupancy_shift():
+    tuner = AutoTuner(path=False, repeats=1)
+    values = np.zeros((16, 16), dtype=np.int64)
+    values[:2] = 1
+    tuner.box_sum('gas', values, 3)
+    tuner.box_sum('gas', values, 3)
+    assert len(tuner.selected) == 1
+    values[:10] = 1
+    tuner.box_sum('gas', values, 3)
+    assert [key for _, key, _ in tuner.selected] == ['gas:16x16:3:-3', 'gas:16x16:3:-1']
+    assert occupancy_bucket(np.zeros((4, 4))) < occupancy_bucket(values)
+
+def test_automaton_with_tuner():
+    grids = []
+    for tuner in (None, AutoTuner(path=False, repeats=1)):
+        np.random.seed(2)
+        automaton = CellularAutomaton(20, [0.6, 0.4], 5, 20, 5, initial_states=make_initial_states('uniform', 20, 0.4, seed=2), tuner=tuner)
+        grids.append([automaton.update(frame) for frame in range(15)])
+    assert np.array_equal(grids[0], grids[1])
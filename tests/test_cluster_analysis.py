@@ -0,0 +1,65 @@
+import numpy as np
+from ArrayAutomaton import ArrayAutomaton, STAT_CLUSTERS
+from CellularAutomaton import CellularAutomaton
+from cluster_analysis import ClusterAnalyzer, CLUSTER_COUNT, CLUSTER_LARGEST, CLUSTER_PERCOLATES, CLUSTER_HISTOGRAM
+from initial_conditions import make_initial_states
+from sweep import run
+
+
+def flood_fill_sizes(states):
+    # Sizes of the 8-connected clusters on the torus, by breadth first search
+    n = states.shape[0]
+    seen = np.zeros_like(states, dtype=bool)
+    sizes = []
+    for i, j in zip(*np.nonzero(states)):
+        if seen[i, j]:
+            continue
+        seen[i, j] = True
+        queue, size = [(i, j)], 0
+        while queue:
+            ci, cj = queue.pop()
+            size += 1
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    ni, nj = (ci + di) % n, (cj + dj) % n
+                    if states[ni, nj] and not seen[ni, nj]:
+                        seen[ni, nj] = True
+                        queue.append((ni, nj))
+        sizes.append(size)
+    return sizes
+
+def test_matches_flood_fill():
+    analyzer = ClusterAnalyzer(30)
+    for seed in range(5):
+        states = make_initial_states('uniform', 30, 0.4, seed=seed)
+        sizes = flood_fill_sizes(states)
+        row = analyzer.analyze(states)
+        assert row[CLUSTER_COUNT] == len(sizes)
+        assert row[CLUSTER_LARGEST] == max(sizes)
+        assert np.array_equal(row[CLUSTER_HISTOGRAM:], np.bincount(np.log2(sizes).astype(int), minlength=len(row) - CLUSTER_HISTOGRAM))
+
+def test_percolation():
+    analyzer = ClusterAnalyzer(8)
+    states = np.zeros((8, 8), dtype=np.int64)
+    states[0:7, 3] = 1
+    assert analyzer.analyze(states)[CLUSTER_PERCOLATES] == 0
+    states[7, 4] = 1
+    assert analyzer.analyze(states)[CLUSTER_PERCOLATES] == 1
+
+    # Joined across the periodic edge, but spanning no edge to edge
+    states = np.zeros((8, 8), dtype=np.int64)
+    states[[0, 7], 2] = 1
+    row = analyzer.analyze(states)
+    assert row[CLUSTER_COUNT] == 1 and row[CLUSTER_LARGEST] == 2 and row[CLUSTER_PERCOLATES] == 0
+
+def test_engines_report_clusters():
+    initial_states = make_initial_states('uniform', 20, 0.4, seed=0)
+    automaton = ArrayAutomaton(20, [1, 0], 8, 30, 20, initial_states=initial_states, seed=0, cluster_every=2)
+    stats = automaton.run(4)
+    assert (stats[1::2, STAT_CLUSTERS:] == -1).all()
+    # The step counter carries over between runs, the fifth step is labeled
+    assert np.array_equal(automaton.run(1)[0, STAT_CLUSTERS:], ClusterAnalyzer(20).analyze(automaton.get_grid_states()))
+
+    np.random.seed(0)
+    result = run(CellularAutomaton(20, [1, 0], 8, 30, 20, initial_states=initial_states), 3, clusters_every=1)
+    assert np.array_equal(result['clusters'][0], ClusterAnalyzer(20).analyze(initial_states))
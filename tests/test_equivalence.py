@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from equivalence import canonical_labels, run_lockstep, reference_engine, compare_star_distributions, RandomStream
+
+
+def initial_states(seed, size=12, prob_gas=0.3):
+    rng = np.random.default_rng(seed)
+    return (rng.random((size, size)) < prob_gas).astype(np.int64)
+
+
+def small_reference(states):
+    return reference_engine(states, proto_size=5, star_size=10, steps_dissipating=5)
+
+
+def test_canonical_labels():
+    labels = np.array([[-1, 7, 7], [3, -1, 7], [3, 3, -1]])
+    expected = np.array([[-1, 1, 1], [3, -1, 1], [3, 3, -1]])
+    assert np.array_equal(canonical_labels(labels), expected)
+
+
+def test_random_stream_isolated():
+    np.random.seed(1)
+    outer = np.random.random()
+    np.random.seed(1)
+    with RandomStream(5):
+        np.random.random()
+    assert np.random.random() == outer
+
+
+def test_reference_matches_itself():
+    assert run_lockstep(small_reference, small_reference, initial_states(0), 15, seed=3) is None
+
+
+def test_reports_first_divergence():
+    class Perturbed:
+        def __init__(self, states):
+            self.engine = small_reference(states)
+            self.step = 0
+
+        def update(self, frame):
+            self.step += 1
+            return self.engine.update(frame)
+
+        def get_grid_states(self):
+            states = self.engine.get_grid_states()
+            if self.step >= 2:
+                states[4, 5] = 4
+            return states
+
+        def get_group_labels(self):
+            return self.engine.get_group_labels()
+
+    divergence = run_lockstep(small_reference, Perturbed, initial_states(0), 5, seed=3)
+    assert divergence.step == 2
+    assert divergence.kind == 'states'
+    assert divergence.cell == (4, 5)
+
+
+def test_star_distributions_equivalent():
+    result = compare_star_distributions(small_reference, small_reference, initial_states, 10, range(3))
+    assert result['equivalent']
+    assert np.array_equal(result['reference'], result['candidate'])
+
+
+def test_reports_group_statistics():
+    class Older:
+        def __init__(self, states):
+            self.engine = small_reference(states)
+
+        def update(self, frame):
+            return self.engine.update(frame)
+
+        def get_grid_states(self):
+            return self.engine.get_grid_states()
+
+        def get_group_labels(self):
+            return self.engine.get_group_labels()
+
+        def get_group_statistics(self):
+            statistics = self.engine.get_group_statistics()
+            statistics[:, 2] += 1
+            return statistics
+
+    divergence = run_lockstep(small_reference, Older, initial_states(0, prob_gas=0.5), 15, seed=3)
+    assert divergence.kind == 'statistics'
+    assert divergence.cell is None
@@ -0,0 +1,66 @@
+import numpy as np
+from CellularAutomaton import CellularAutomaton
+from events import EventLog, load_events, star_formation_rate, lifetimes, mass_function, FORMED, MERGED, STAR, DISSIPATED, GAS
+from initial_conditions import make_initial_states
+from sweep import run_sweep
+
+
+def catalog(**columns):
+    events = {'run': [0], 'step': [0], 'kind': [FORMED], 'group': [0], 'size': [1], 'center_i': [0], 'center_j': [0], 'parent': [-1]}
+    events.update(columns)
+    return {name: np.array(values) for name, values in events.items()}
+
+def test_batches_roundtrip(tmp_path):
+    with EventLog(tmp_path, run=3, batch=2) as log:
+        for step in range(5):
+            log.emit(step, FORMED, step, 10 + step, (step, 2 * step))
+    assert log.chunks == 3
+
+    events = load_events(tmp_path)
+    assert np.array_equal(events['step'], np.arange(5))
+    assert np.array_equal(events['size'], 10 + np.arange(5))
+    assert np.array_equal(events['center_j'], 2 * np.arange(5))
+    assert (events['run'] == 3).all() and (events['parent'] == -1).all()
+
+def test_queries():
+    events = catalog(run=[0, 0, 1, 1, 1, 1], step=[2, 7, 1, 4, 5, 9], kind=[STAR, DISSIPATED, STAR, STAR, DISSIPATED, DISSIPATED],
+                     group=[0, 0, 0, 1, 1, 0], size=[120, 120, 100, 1000, 1000, 100], center_i=[0] * 6, center_j=[0] * 6, parent=[-1] * 6)
+    runs, rates = star_formation_rate(events, 10, 2)
+    assert np.array_equal(runs, [0, 1]) and np.allclose(rates, [0.1, 0.2])
+    # Runs without events count as runs without stars
+    runs, rates = star_formation_rate(events, 10, [0, 1, 2, 3])
+    assert np.array_equal(runs, [0, 1, 2, 3]) and np.allclose(rates, [0.1, 0.2, 0, 0])
+    assert sorted(lifetimes(events).tolist()) == [1, 5, 8]
+
+    hist, edges = mass_function(events, bins_per_decade=1)
+    assert np.array_equal(hist, [0, 0, 2, 1]) and edges[-1] >= 1000
+
+def test_automaton_lifecycle():
+    initial_states = make_initial_states('uniform', 20, 0.6, seed=0)
+    np.random.seed(0)
+    log = EventLog()
+    automaton = CellularAutomaton(20, [1, 0], 8, 30, 5, initial_states=initial_states, events=log)
+    stars = set()
+    for frame in range(40):
+        states = automaton.update(frame)
+        stars |= set(np.unique(automaton.get_group_labels()[states == 3]).tolist())
+
+    events = log.columns()
+    kinds = set(events['kind'].tolist())
+    assert {FORMED, MERGED, STAR, DISSIPATED, GAS} <= kinds
+    # Every star seen on the grid has exactly one transition event
+    star_groups = events['group'][events['kind'] == STAR]
+    assert len(star_groups) == len(set(star_groups.tolist()))
+    assert stars <= set(star_groups.tolist())
+    # Merges name the absorbed group, and every group formed before its other events
+    assert (events['parent'][events['kind'] == MERGED] >= 0).all()
+    formed = dict(zip(events['group'][events['kind'] == FORMED].tolist(), events['step'][events['kind'] == FORMED].tolist()))
+    assert all(formed[group] <= step for group, step in zip(events['group'].tolist(), events['step'].tolist()))
+
+def test_sweep_catalog(tmp_path):
+    records = run_sweep([0.5], [0, 1], N=16, proto_size=8, star_size=30, steps_dissipating=5, frames=20, workers=1, events=str(tmp_path))
+    events = load_events(tmp_path)
+    runs, rates = star_formation_rate(events, 20, [record['run_id'] for record in records])
+    assert [record['run_id'] for record in records] == [0, 1]
+    # The transitions of the last step are not counted by the run itself
+    assert (np.rint(rates * 20) >= [record['stars_formed'] for record in records]).all()
@@ -0,0 +1,51 @@
+import threading
+
+import numpy as np
+from finite_size import CostModel, lpt_schedule, pilot_fractions, finite_size_study, scaling_table, rescale
+
+
+def test_lpt_schedule():
+    order, makespan = lpt_schedule(np.array([2, 5, 3, 2, 3, 2]), 2)
+    assert list(order[:3]) == [1, 4, 2]
+    assert makespan == 9
+    _, makespan = lpt_schedule(np.array([4, 1, 1]), 3)
+    assert makespan == 4
+
+def test_cost_model():
+    model = CostModel(1e-6, 1e-5)
+    assert np.isclose(model.predict(20, 0.1, 10), 4 * model.predict(10, 0.1, 10))
+    assert model.predict(10, 0.5, 10) > model.predict(10, 0.1, 10)
+
+    # Dense runs stopping early are predicted shorter
+    model = CostModel(1e-6, 1e-5, [0.1, 0.5], [1.0, 0.1])
+    assert model.predict(10, 0.5, 10) < model.predict(10, 0.1, 10)
+    assert np.isclose(model.predict(10, 0.3, 10), 0.55 * CostModel(1e-6, 1e-5).predict(10, 0.3, 10))
+
+def test_pilot_fractions():
+    fractions = pilot_fractions(10, [0.0, 0.8], 20, runs=2, proto_size=5, star_size=10, steps_dissipating=5)
+    assert fractions[0] == 1.0
+    assert 0 < fractions[1] < 1
+
+def test_finite_size_study():
+    kwargs = dict(probs_gas=[0.05, 0.6], runs=2, frames=15, proto_size=5, star_size=10, steps_dissipating=5,
+                  cost_model=CostModel(1e-6, 1e-5))
+    study = finite_size_study([8, 12], workers=1, **kwargs)
+    assert set(study['curves']) == {8, 12}
+    assert study['curves'][12]['star'].shape == (2, 2)
+    assert study['predicted_makespan'] > 0 and study['cpu'] > 0
+    assert study['cost_model'].fractions.shape == (2,)
+
+    table = scaling_table(study)
+    assert table.shape == (4, 5)
+    assert np.array_equal(table[:, 0], [8, 8, 12, 12])
+    x, y = rescale(table, 0.3, 1)
+    assert np.allclose(x, (table[:, 1] - 0.3) * table[:, 0])
+
+    # Workers return the same outcomes as the serial study
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(study=finite_size_study([8, 12], workers=2, **kwargs)), daemon=True)
+    thread.start()
+    thread.join(timeout=300)
+    assert 'study' in result, "Study with workers did not finish"
+    for N in (8, 12):
+        assert np.array_equal(result['study']['curves'][N]['star'], study['curves'][N]['star'])
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from initial_conditions import uniform, gradient, clustered, gaussian_random_field, from_file, make_initial_states
+from CellularAutomaton import CellularAutomaton
+
+
+@pytest.mark.parametrize('kind', ['uniform', 'gradient', 'clustered', 'grf'])
+def test_make_initial_states(kind):
+    states = make_initial_states(kind, 64, 0.2, seed=0)
+    assert states.shape == (64, 64)
+    assert np.isin(states, [0, 1]).all()
+    assert abs(states.mean() - 0.2) < 0.05
+
+def test_seed_reproducible():
+    assert np.array_equal(uniform(32, 0.3, seed=4), uniform(32, 0.3, seed=4))
+
+def test_gradient_increases():
+    states = gradient(200, 0.0, 1.0, axis=1, seed=0)
+    assert states[:, :50].mean() < states[:, -50:].mean()
+
+def test_grf_exact_fraction():
+    states = gaussian_random_field(50, 0.1, seed=0)
+    assert states.sum() == 250
+
+def test_clustered_is_clustered():
+    states = clustered(100, 0.1, n_clusters=3, cluster_radius=4, seed=0)
+    # Gas cells have far more gas neighbours than under uniform placement
+    neighbours = sum(np.roll(states, (di, dj), (0, 1)) for di in (-1, 0, 1) for dj in (-1, 0, 1)) - states
+    assert neighbours[states == 1].mean() > 8 * 0.1 * 2
+
+def test_from_file(tmp_path):
+    states = uniform(10, 0.5, seed=1)
+    path = tmp_path / 'grid.npy'
+    np.save(path, states)
+    assert np.array_equal(from_file(str(path)), states)
+    with pytest.raises(AssertionError):
+        from_file(str(path), size=11)
+
+def test_automaton_initial_states():
+    states = uniform(10, 0.5, seed=1)
+    automaton = CellularAutomaton(10, [0.5, 0.5], 20, 100, 50, initial_states=states)
+    assert np.array_equal(automaton.get_grid_states(), states)
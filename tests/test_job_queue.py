@@ -0,0 +1,97 @@
+import threading
+import time
+
+import numpy as np
+from job_queue import JobQueue, grid_design, latin_hypercube, run_workers, work
+
+
+def flaky(params):
+    if params['fail']:
+        raise ValueError('broken job')
+    return {'double': 2 * params['x']}
+
+def test_designs():
+    grid = grid_design({'N': [10, 20], 'prob_gas': [0.1, 0.2, 0.3]})
+    assert len(grid) == 6 and {'N': 20, 'prob_gas': 0.3} in grid
+
+    lhs = latin_hypercube({'prob_gas': (0.0, 1.0), 'star_size': (10, 100)}, 20, seed=0)
+    # Every stratum of every parameter is sampled once
+    assert sorted(int(job['prob_gas'] * 20) for job in lhs) == list(range(20))
+    assert all(isinstance(job['star_size'], int) and 10 <= job['star_size'] <= 100 for job in lhs)
+
+def test_submit_is_idempotent(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    jobs = grid_design({'x': [1, 2, 3], 'fail': [False]})
+    with JobQueue(path) as queue:
+        assert queue.submit(jobs) == 3
+    # Reopening after a restart finds the same jobs
+    with JobQueue(path) as queue:
+        assert queue.submit(jobs) == 0
+        assert queue.counts()['pending'] == 3
+
+def test_retries_and_outcomes(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    with JobQueue(path, max_attempts=2) as queue:
+        queue.submit([{'x': 1, 'fail': False}, {'x': 2, 'fail': True}])
+    assert work(path, max_attempts=2, job=flaky) == 1
+
+    with JobQueue(path, max_attempts=2) as queue:
+        assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 1, 'failed': 1}
+        assert queue.results() == [({'fail': False, 'x': 1}, {'double': 2})]
+        attempts, error = queue.connection.execute("SELECT attempts, error FROM jobs WHERE status = 'failed'").fetchone()
+        assert attempts == 2 and 'broken job' in error
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    with JobQueue(path) as queue:
+        queue.submit([{'x': 1, 'fail': False}])
+        job_id, token, params = queue.lease('hung', lease_time=-1)
+        assert queue.lease('other', lease_time=60)[0] == job_id
+        # The hung worker no longer holds the lease
+        assert not queue.complete(job_id, token, {'double': 0})
+
+def test_workers_run_simulations(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    with JobQueue(path) as queue:
+        queue.submit(grid_design({'N': [10], 'prob_gas': [0.3], 'proto_size': [5], 'star_size': [10],
+                                  'steps_dissipating': [5], 'seed': [0, 1], 'frames': [5]}))
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(counts=run_workers(path, workers=2)), daemon=True)
+    thread.start()
+    thread.join(timeout=300)
+    assert not thread.is_alive(), "Workers timed out"
+    assert result['counts']['done'] == 2
+    with JobQueue(path) as queue:
+        for params, outcome in queue.results():
+            assert outcome['stars_formed'] >= 0 and set(outcome['mean']) == {'1', '2', '3'}
+
+def slow(params):
+    time.sleep(params['seconds'])
+    return {'slept': params['seconds']}
+
+def test_heartbeat_keeps_long_jobs(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    with JobQueue(path, max_attempts=1) as queue:
+        queue.submit([{'seconds': 1.0}])
+    # The job runs for several lease times, the heartbeat keeps it leased by this worker
+    assert work(path, lease_time=0.3, max_attempts=1, job=slow) == 1
+    with JobQueue(path) as queue:
+        assert queue.counts()['done'] == 1
+        assert queue.connection.execute('SELECT attempts FROM jobs').fetchone()[0] == 1
+
+def test_lost_lease_is_abandoned(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+
+    def stolen(params):
+        # Another worker takes the job over while it runs
+        with JobQueue(path) as queue:
+            queue.connection.execute("UPDATE jobs SET token = 'other'")
+        time.sleep(0.5)
+        return {}
+
+    with JobQueue(path) as queue:
+        queue.submit([{'x': 1}])
+    assert work(path, lease_time=0.3, max_attempts=1, job=stolen) == 0
+    with JobQueue(path) as queue:
+        assert queue.connection.execute('SELECT result FROM jobs').fetchone()[0] is None
@@ -0,0 +1,46 @@
+import numpy as np
+from initial_conditions import make_initial_states
+from phase_transitions import wilson_interval, isotonic, coupled_estimates, simulate_coupled
+
+
+def test_wilson_interval():
+    low, high = wilson_interval(np.array([0, 5, 10]), 10)
+    assert low[0] == 0 and 0 < high[0] < 0.35
+    assert low[1] < 0.5 < high[1] and np.isclose(0.5 - low[1], high[1] - 0.5)
+    assert high[2] == 1 and 0.65 < low[2] < 1
+
+def test_isotonic():
+    assert np.allclose(isotonic([0.1, 0.3, 0.2, 0.6, 0.5, 0.9]), [0.1, 0.25, 0.25, 0.55, 0.55, 0.9])
+    assert np.allclose(isotonic([1, 0], [3, 1]), [0.75, 0.75])
+
+def test_coupled_estimates():
+    probs_gas = np.array([0.1, 0.2, 0.3, 0.4])
+    outcomes = np.array([[0, 0, 1, 1],
+                         [0, 1, 0, 1],
+                         [0, 1, 1, 1],
+                         [0, 0, 0, 0]])
+    estimates = coupled_estimates(probs_gas, outcomes)
+    assert np.allclose(estimates['mean'], [0, 0.5, 0.5, 0.75])
+    assert np.allclose(estimates['threshold'], [0.3, 0.4, 0.2, np.inf])
+    assert np.allclose(estimates['threshold_curve'], [0, 0.25, 0.5, 0.75])
+    assert estimates['censored'] == 1
+    assert np.isclose(estimates['critical'], 0.3)
+    assert estimates['critical_low'] <= estimates['critical'] <= estimates['critical_high']
+    assert (np.diff(estimates['threshold_low']) >= 0).all() and (np.diff(estimates['threshold_high']) >= 0).all()
+
+    # Censored replicas are not treated as settling at the highest density
+    censored = coupled_estimates(probs_gas, np.array([[0, 0, 0, 1], [0, 0, 0, 0], [0, 0, 0, 0]]))
+    assert censored['censored'] == 2 and np.isinf(censored['critical'])
+    assert np.allclose(estimates['differences'], [0.5, 0, 0.25])
+    assert (np.diff(estimates['monotone']) >= 0).all()
+
+def test_simulate_coupled():
+    # Grids of one replica are nested, higher densities only add gas
+    low, high = (make_initial_states('uniform', 20, p, seed=3) for p in (0.1, 0.3))
+    assert (low <= high).all()
+
+    result = simulate_coupled(12, [0.1, 0.6], frames=20, runs=3, proto_size=5, star_size=10, steps_dissipating=5)
+    assert result['star'].shape == (3, 2)
+    again = simulate_coupled(12, [0.1, 0.6], frames=20, runs=3, proto_size=5, star_size=10, steps_dissipating=5)
+    assert np.array_equal(result['star'], again['star'])
+    assert set(result['star_estimates']) >= {'mean', 'low', 'high', 'critical', 'differences'}
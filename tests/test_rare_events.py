@@ -0,0 +1,41 @@
+import numpy as np
+from CellularAutomaton import CellularAutomaton
+from rare_events import largest_proto_size, forward_flux, _advance
+
+
+def test_largest_proto_size():
+    initial_states = np.zeros((14, 14), dtype=np.int64)
+    initial_states[1:4, 1:4] = 1
+    initial_states[7:11, 7:11] = 1
+    automaton = CellularAutomaton(14, [1, 0], 5, 100, 50, initial_states=initial_states)
+    assert largest_proto_size(automaton) == 0
+
+    automaton.interact(2, 2)
+    automaton.interact(8, 8)
+    assert largest_proto_size(automaton) == 16
+
+    automaton.groups[0].state = 3
+    assert largest_proto_size(automaton) == np.inf
+
+def test_forward_flux():
+    kwargs = dict(frames=15, trials=[6, 4, 4], proto_size=5, star_size=15, steps_dissipating=5, seed=2)
+    result = forward_flux(14, 0.3, [6, 10], **kwargs)
+    assert len(result['fractions']) == len(result['hits']) == len(result['trials'])
+    assert np.isclose(result['probability'], np.prod(result['fractions'])) or result['probability'] == 0
+    assert result['low'] <= result['probability'] <= result['high']
+    assert forward_flux(14, 0.3, [6, 10], **kwargs)['hits'] == result['hits']
+
+def test_forward_flux_unreachable():
+    # Without gas nothing nucleates, the bound comes from the first stage
+    result = forward_flux(10, 0.0, [5], frames=5, trials=10, proto_size=5, star_size=15, steps_dissipating=5)
+    assert result['probability'] == 0 and result['hits'] == [0]
+    assert 0 < result['high'] < 0.3
+
+def test_advance_already_crossed():
+    # A snapshot past the next level reaches it without a step, even at the end of the run
+    initial_states = np.zeros((14, 14), dtype=np.int64)
+    initial_states[7:11, 7:11] = 1
+    automaton = CellularAutomaton(14, [1, 0], 5, 100, 50, initial_states=initial_states)
+    automaton.interact(8, 8)
+    assert _advance(automaton, 10, 10, 10, largest_proto_size) == (9, 0)
+    assert _advance(automaton, 10, 10, 20, largest_proto_size) == (None, 0)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from PIL import Image
+from rendering import PALETTE, states_to_rgb, FrameRenderer
+
+
+def test_states_to_rgb():
+    states = np.array([[0, 1], [3, 4]])
+    rgb = states_to_rgb(states)
+    assert rgb.shape == (2, 2, 3)
+    assert np.array_equal(rgb[1, 0], PALETTE[3])
+
+def test_states_to_rgb_downscale():
+    states = np.zeros((10, 10), dtype=int)
+    assert states_to_rgb(states, scale=2).shape == (5, 5, 3)
+
+def test_gif_frames(tmp_path):
+    path = str(tmp_path / 'out.gif')
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 5, (12, 16)) for _ in range(7)]
+    with FrameRenderer(path, stride=3) as renderer:
+        for states in frames:
+            renderer.add(states)
+
+    gif = Image.open(path)
+    assert gif.n_frames == 3
+    assert gif.size == (16, 12)
+    gif.seek(2)
+    assert np.array_equal(np.array(gif.convert('RGB')), states_to_rgb(frames[6]))
+
+def test_invalid_stride(tmp_path):
+    with pytest.raises(AssertionError):
+        FrameRenderer(str(tmp_path / 'out.gif'), stride=0)
+
+def test_body_exception_not_masked(tmp_path):
+    # The encoder fails on the 3D frame, the error of the with block must still propagate
+    with pytest.raises(KeyError):
+        with FrameRenderer(str(tmp_path / 'out.gif')) as renderer:
+            renderer.add(np.zeros((2, 2, 2)))
+            renderer.thread.join(timeout=0.1)
+            raise KeyError('body')
+
+def test_encoder_error_raised(tmp_path):
+    with pytest.raises(Exception):
+        with FrameRenderer(str(tmp_path / 'missing' / 'out.gif')) as renderer:
+            renderer.add(np.zeros((2, 2)))
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from startup import lazy_jit, warmup, KERNELS
+from CellularAutomaton import density_grid
+
+
+def test_import_does_not_load_heavy_modules():
+    code = "import sys, main, sweep; print(sorted(m for m in ('numba', 'matplotlib', 'scipy') if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
+
+def test_lazy_kernel_compiles_on_first_call():
+    @lazy_jit(nopython=True, cache=False)
+    def add(a, b):
+        return a + b
+
+    assert add.compiled is None
+    assert add(2, 3) == 5
+    assert add.compiled is not None
+    KERNELS.remove(add)
+
+def test_warmup():
+    warmup()
+    assert density_grid.compiled is not None
+    states = np.ones((12, 12), dtype=np.int64)
+    assert density_grid(states)[0, 0] == 120 * 100
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from scipy.stats import expon
+from streaming_fit import StreamingDistribution
+
+
+def test_moments_match_numpy():
+    data = np.random.default_rng(0).poisson(20, 1000)
+    distribution = StreamingDistribution()
+    for chunk in np.array_split(data, 7):
+        distribution.update(chunk)
+    assert distribution.n == 1000
+    assert np.isclose(distribution.mean, data.mean())
+    assert np.isclose(distribution.variance(), data.var())
+    assert distribution.maximum == data.max()
+
+def test_merge_equals_single_stream():
+    rng = np.random.default_rng(1)
+    a, b = rng.integers(0, 500, 300), rng.integers(0, 50, 200)
+    merged = StreamingDistribution()
+    merged.update(a)
+    other = StreamingDistribution()
+    other.update(b)
+    merged.merge(other)
+    single = StreamingDistribution()
+    single.update(np.concatenate([a, b]))
+    assert np.isclose(merged.mean, single.mean)
+    assert np.isclose(merged.m2, single.m2)
+    assert np.array_equal(merged.counts, single.counts)
+    assert merged.powerlaw_fit() == pytest.approx(single.powerlaw_fit())
+
+def test_expon_fit_matches_scipy():
+    data = np.random.default_rng(2).exponential(30, 2000)
+    distribution = StreamingDistribution()
+    distribution.update(data)
+    assert distribution.expon_fit() == pytest.approx(expon.fit(data, floc=0))
+
+def test_pareto_exponent():
+    data = np.random.default_rng(3).pareto(1.5, 20000) + 1
+    distribution = StreamingDistribution()
+    distribution.update(data)
+    assert distribution.pareto_exponent() == pytest.approx(2.5, abs=0.05)
+
+def test_histogram_density():
+    distribution = StreamingDistribution(bins_per_decade=5)
+    distribution.update(np.arange(1, 1000))
+    hist, edges = distribution.histogram()
+    assert len(edges) == len(hist) + 1
+    assert np.isclose((hist * np.diff(edges)).sum(), 1)
+
+def test_histogram_zeros():
+    distribution = StreamingDistribution(bins_per_decade=5)
+    distribution.update(np.array([0, 0, 1, 10, 100]))
+    hist, edges = distribution.histogram(density=False)
+    assert hist[0] == 3 and hist.sum() == 5 and edges[0] == 0
+    hist, edges = distribution.histogram()
+    assert np.isclose((hist * np.diff(edges)).sum(), 1)
+
+    # Only zeros, like the star counts of a low density run
+    distribution = StreamingDistribution()
+    distribution.update(np.zeros(1000))
+    hist, edges = distribution.histogram()
+    assert len(hist) == 1 and np.isclose(hist[0] * edges[1], 1)
+    assert len(StreamingDistribution().histogram()[0]) == 0
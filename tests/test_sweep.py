@@ -0,0 +1,44 @@
+import threading
+
+import numpy as np
+import pytest
+from sweep import run_single, run_sweep, aggregate
+
+
+def test_run_single_reproducible():
+    first = run_single(12, 0.3, 5, 10, 5, seed=1, frames=15)
+    second = run_single(12, 0.3, 5, 10, 5, seed=1, frames=15)
+    assert first['stars_formed'] == second['stars_formed']
+    for state in (1, 2, 3):
+        assert len(first['counts'][state]) == 15
+        assert np.array_equal(first['counts'][state], second['counts'][state])
+
+def test_parallel_matches_serial():
+    kwargs = dict(N=12, proto_size=5, star_size=10, steps_dissipating=5, frames=10)
+    serial = run_sweep([0.2, 0.3], [0, 1], workers=1, **kwargs)
+
+    # Guard against workers deadlocking after the parent already ran numba kernels
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(records=run_sweep([0.2, 0.3], [0, 1], workers=2, **kwargs)), daemon=True)
+    thread.start()
+    thread.join(timeout=300)
+    assert not thread.is_alive(), "Parallel sweep timed out"
+    parallel = result['records']
+    assert [(r['prob_gas'], r['seed']) for r in serial] == [(0.2, 0), (0.2, 1), (0.3, 0), (0.3, 1)]
+    for a, b in zip(serial, parallel):
+        assert a['stars_formed'] == b['stars_formed']
+        assert np.array_equal(a['counts'][3], b['counts'][3])
+
+def test_aggregate():
+    records = run_sweep([0.2, 0.3], [0, 1, 2], N=10, proto_size=5, star_size=10, steps_dissipating=5, frames=8, workers=1)
+    ensemble = aggregate(records)
+    assert sorted(ensemble) == [0.2, 0.3]
+    assert len(ensemble[0.2]['stars_formed']) == 3
+    assert len(ensemble[0.3]['counts'][3]) == 24
+
+def test_streaming_without_series():
+    records = run_sweep([0.3], [0, 1], N=10, proto_size=5, star_size=10, steps_dissipating=5, frames=9, workers=1, keep_series=False)
+    assert 'counts' not in records[0]
+    ensemble = aggregate(records)
+    assert ensemble[0.3]['distributions'][3].n == 18
+    assert 'counts' not in ensemble[0.3]
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+from telemetry import Telemetry, Monitor, format_status
+from sweep import run_single
+from ArrayAutomaton import ArrayAutomaton
+from phase_transitions import simulate_coupled
+from rare_events import forward_flux
+from job_queue import JobQueue, work
+
+
+def snapshot(worker, job, step, elapsed, time, done=False, phases=None):
+    return {'worker': worker, 'job': job, 'step': step, 'steps': 100, 'cells': 400, 'time': time, 'elapsed': elapsed,
+            'phases': phases or {}, 'done': done}
+
+def test_reporter_snapshots(tmp_path):
+    with Telemetry(tmp_path, job=4, steps=10, cells=25, interval=0) as reporter:
+        mark = reporter.lap('density', 0.0)
+        reporter.lap('movement', mark)
+        reporter.step()
+        reporter.step()
+
+    lines = [json.loads(line) for line in open(tmp_path / f'worker-{reporter.worker}.jsonl')]
+    assert [line['step'] for line in lines] == [0, 1, 2, 2]
+    assert [line['done'] for line in lines] == [False, False, False, True]
+    assert lines[-1]['job'] == 4 and set(lines[-1]['phases']) == {'density', 'movement'}
+
+def test_monitor_status(tmp_path):
+    records = [snapshot(1, 0, 0, 0, 100), snapshot(1, 0, 10, 1, 101, phases={'movement': 0.75, 'groups': 0.25}),
+               snapshot(2, 1, 50, 5, 40), snapshot(3, 2, 100, 3, 100, done=True, phases={'movement': 1.0})]
+    # The last line is still being written
+    with open(tmp_path / 'worker-1.jsonl', 'w') as file:
+        file.write(''.join(json.dumps(record) + '\n' for record in records) + '{"worker": 1')
+
+    monitor = Monitor(tmp_path, jobs=4, stale=30)
+    status = monitor.status(now=0)
+    assert status['done'] == 0
+    monitor.poll()
+    status = monitor.status(now=101)
+    assert status['done'] == 1 and status['running'] == 1 and status['stalled'] == [1]
+    assert np.isclose(status['steps_per_second'], 10) and np.isclose(status['cells_per_second'], 4000)
+    # Remaining steps of the two unfinished runs and of one run not started
+    assert np.isclose(status['eta'], (90 + 50 + 100) / 10)
+    assert status['phases'][0][0] == 'movement' and np.isclose(status['phases'][0][2], 0.875)
+    assert status['workers'][1]['step'] == 10
+    assert '1/4 done' in format_status(status)
+
+def test_run_single_telemetry(tmp_path):
+    run_single(12, 0.3, 5, 10, 5, seed=0, frames=6, run_id=2, telemetry=str(tmp_path))
+    status = Monitor(tmp_path).poll()
+    assert status['done'] == 1 and status['eta'] == 0
+    assert {phase for phase, _, _ in status['phases']} == {'density', 'movement', 'interaction', 'groups'}
+    assert np.isclose(sum(fraction for _, _, fraction in status['phases']), 1)
+
+def test_array_automaton_telemetry(tmp_path):
+    # Timing the phases runs the same steps as the fused kernel
+    initial_states = (np.random.RandomState(0).rand(16, 16) < 0.3).astype(np.int64)
+    fused = ArrayAutomaton(16, [0.7, 0.3], 5, 10, 5, initial_states=initial_states, seed=1, cluster_every=2)
+    stats = fused.run(20)
+    with Telemetry(tmp_path, steps=20, cells=256, interval=0) as reporter:
+        timed = ArrayAutomaton(16, [0.7, 0.3], 5, 10, 5, initial_states=initial_states, seed=1, cluster_every=2, telemetry=reporter)
+        assert np.array_equal(timed.run(20), stats)
+    assert np.array_equal(timed.get_grid_states(), fused.get_grid_states())
+    assert reporter.count == 20 and set(reporter.phases) == {'density', 'movement', 'interaction', 'groups'}
+
+def test_drivers_telemetry(tmp_path):
+    simulate_coupled(10, [0.1, 0.3], frames=5, runs=2, proto_size=5, star_size=10, steps_dissipating=5,
+                     telemetry=str(tmp_path / 'coupled'))
+    assert Monitor(tmp_path / 'coupled').poll()['done'] == 4
+
+    result = forward_flux(10, 0.3, [4], frames=5, trials=3, proto_size=5, star_size=10, steps_dissipating=5,
+                          telemetry=str(tmp_path / 'flux'))
+    assert Monitor(tmp_path / 'flux').poll()['done'] == sum(result['trials'])
+
+    with JobQueue(str(tmp_path / 'jobs.db')) as queue:
+        queue.submit([{'N': 10, 'prob_gas': 0.2, 'seed': seed, 'frames': 5} for seed in range(2)])
+    assert work(str(tmp_path / 'jobs.db'), telemetry=str(tmp_path / 'queue')) == 2
+    assert Monitor(tmp_path / 'queue').poll()['done'] == 2